@@ -0,0 +1,298 @@
+"""Benchmarks for the codec, file I/O and rendering hot paths of main4.py
+
+Synthetic SPR, ASF and TGA files are generated in a temporary directory and
+every benchmark runs on the offscreen Qt platform, so no display is needed.
+
+    python benchmarks/bench_main4.py                        # run, print JSON
+    python benchmarks/bench_main4.py -o results.json        # also save results
+    python benchmarks/bench_main4.py --save-baseline baseline.json
+    python benchmarks/bench_main4.py --baseline baseline.json --threshold 0.25
+
+With --baseline the exit status is 1 when any benchmark's median time is
+more than threshold slower than the baseline's. The startup benchmark times a
+fresh interpreter from launch to the editor window's first paint and also
+fails the run when its median exceeds --startup-target.
+"""
+import os
+import sys
+import io
+import json
+import time
+import struct
+import platform
+import argparse
+import tempfile
+import statistics
+import subprocess
+from contextlib import redirect_stdout
+from unittest import mock
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import main4
+from main4 import (ASFHeader, ASFFrame, QApplication, decode_tga, decode_rle_tga,
+                   encode_tga, array_to_qimage, image_to_png_bytes, write_asf_document)
+
+
+def sprite_pixels(size, index):
+    """BGRA pixels of a synthetic sprite: a shaded disc moving over transparency"""
+    y, x = np.mgrid[0:size, 0:size]
+    angle = index * 0.4
+    cx = size / 2 + size / 5 * np.cos(angle)
+    cy = size / 2 + size / 5 * np.sin(angle)
+    inside = (x - cx) ** 2 + (y - cy) ** 2 < (size / 3) ** 2
+    pixels = np.zeros((size, size, 4), np.uint8)
+    pixels[..., 0] = (x * 255 // size).astype(np.uint8)
+    pixels[..., 1] = (y * 255 // size).astype(np.uint8)
+    pixels[..., 2] = (index * 37) % 256
+    pixels[..., 3] = np.where(inside, 255, 0)
+    pixels[~inside, :3] = 0
+    return pixels
+
+
+def build_documents(directory, frame_count, size, directions=8):
+    """Write synthetic SPR, ASF and TGA files; returns the SPR/ASF paths and TGA pixel data"""
+    pixels = [sprite_pixels(size, i) for i in range(frame_count)]
+    frames = []
+    for i, frame_pixels in enumerate(pixels):
+        frame = ASFFrame()
+        frame.direction = i * directions // frame_count
+        frame.delay = 100
+        frame.x_offset, frame.y_offset = i % 5, -(i % 3)
+        frame.image_data = image_to_png_bytes(array_to_qimage(frame_pixels))
+        frames.append(frame)
+
+    asf_header = ASFHeader()
+    asf_header.width = asf_header.height = size
+    asf_header.direction_count = directions
+    asf_path = os.path.join(directory, "bench.asf")
+    write_asf_document(asf_path, asf_header, frames)
+
+    # SPR frames are raw bottom-up BGRA scanlines
+    spr_path = os.path.join(directory, "bench.spr")
+    with open(spr_path, "wb") as f:
+        f.write(b"SPR")
+        f.write(struct.pack("<fIIII", 1.0, frame_count, size, size, directions))
+        for frame, frame_pixels in zip(frames, pixels):
+            raw = frame_pixels[::-1].tobytes()
+            f.write(struct.pack("<II", frame.direction, len(raw)))
+            f.write(raw)
+
+    # Uncompressed and RLE TGA; the decoders take the pixel data after the 18-byte header
+    tga_data = {}
+    for name, rle in (("tga", False), ("rle_tga", True)):
+        path = os.path.join(directory, f"bench_{name}.tga")
+        with open(path, "wb") as f:
+            f.write(encode_tga(array_to_qimage(pixels[0]), rle=rle))
+        with open(path, "rb") as f:
+            tga_data[name] = f.read()[18:]
+
+    return {"asf": asf_path, "spr": spr_path, **tga_data}
+
+
+def quiet(func):
+    """Run func with the decoders' progress prints discarded"""
+    def run():
+        with redirect_stdout(io.StringIO()):
+            return func()
+    return run
+
+
+def build_benchmarks(tool, files, directory, size):
+    """Map benchmark names to zero-argument callables"""
+    def load_spr():
+        tool.load_spr_file(files["spr"])
+        for frame in tool.frames:
+            frame.image_data  # Frames decode on first access
+
+    def load_asf():
+        tool.load_asf_file(files["asf"])
+        for frame in tool.frames:
+            tool.frame_cache.get(frame.image_data)
+
+    def load_document():
+        tool.load_asf_file(files["asf"])
+
+    def save_spr():
+        tool.save_spr_file(os.path.join(directory, "saved.spr"))
+
+    def save_asf():
+        tool.save_asf_file(os.path.join(directory, "saved.asf"))
+
+    image = array_to_qimage(sprite_pixels(size, 0))
+
+    def export_tga():
+        tool.export_manual_tga(image, os.path.join(directory, "manual.tga"))
+
+    sheet_path = os.path.join(directory, "sheet.png")
+
+    def export_sheet():
+        with mock.patch.object(main4.QFileDialog, "getSaveFileName", return_value=(sheet_path, "")), \
+                mock.patch.object(main4.QMessageBox, "information"):
+            tool.export_sprite_sheet()
+
+    def display_frames():
+        for i in range(len(tool.frames)):
+            tool.display_frame(i)
+
+    def prepare_display():
+        tool.load_asf_file(files["asf"])
+        tool.frame_cache.clear()
+
+    return {
+        "decode_tga": (None, quiet(lambda: decode_tga(files["tga"], size, size, 32, 0x28))),
+        "decode_rle_tga": (None, quiet(lambda: decode_rle_tga(files["rle_tga"], size, size, 32, 0x28))),
+        "load_spr_file": (None, quiet(load_spr)),
+        "load_asf_file": (None, load_asf),
+        "save_spr_file": (load_document, save_spr),
+        "save_asf_file": (load_document, save_asf),
+        "export_manual_tga": (None, export_tga),
+        "export_sprite_sheet": (load_document, export_sheet),
+        "display_frame": (prepare_display, display_frames),
+    }
+
+
+# Child process for the startup benchmark: reports the wall-clock time of the
+# first paint and which optional modules had been imported by then
+STARTUP_SCRIPT = """
+import sys, time, json
+sys.path.insert(0, sys.argv[1])
+import main4
+app = main4.QApplication(sys.argv[:1])
+window = main4.EnhancedPyAsfTool()
+window.show()
+window.repaint()
+app.processEvents()
+print(json.dumps({"painted": time.time(),
+                  "loaded": [name for name in ("numpy", "PIL.Image") if name in sys.modules]}))
+"""
+
+
+def time_startup():
+    """Seconds from launching a fresh interpreter to the editor's first paint"""
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    start = time.time()
+    output = subprocess.run([sys.executable, "-c", STARTUP_SCRIPT, root], check=True,
+                            capture_output=True, text=True).stdout
+    report = json.loads(output.strip().splitlines()[-1])
+    return report["painted"] - start, report["loaded"]
+
+
+def time_benchmark(setup, func, repeat):
+    """Return the wall-clock seconds of each of repeat runs of func"""
+    times = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def run_benchmarks(frame_count, size, repeat, only=None):
+    """Run every benchmark (or those named in only) and return the results dict"""
+    # Held until the run ends: the tool and every benchmark need an application
+    _ = QApplication.instance() or QApplication(sys.argv[:1])
+    tool = main4.EnhancedPyAsfTool()
+    tool.disk_cache.enabled = False  # Measure decoding, not the cache of an earlier run
+
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        files = build_documents(directory, frame_count, size)
+        for name, (setup, func) in build_benchmarks(tool, files, directory, size).items():
+            if only and name not in only:
+                continue
+            times = time_benchmark(setup, func, repeat)
+            results[name] = {
+                "min": min(times),
+                "median": statistics.median(times),
+                "runs": len(times),
+            }
+            print(f"{name:<22} median {results[name]['median'] * 1000:9.2f} ms", file=sys.stderr)
+    tool.close()
+
+    if not only or "startup" in only:
+        runs = [time_startup() for _ in range(repeat)]
+        times = [seconds for seconds, _ in runs]
+        results["startup"] = {
+            "min": min(times),
+            "median": statistics.median(times),
+            "runs": len(times),
+            "loaded_at_first_paint": runs[-1][1],
+        }
+        print(f"{'startup':<22} median {results['startup']['median'] * 1000:9.2f} ms", file=sys.stderr)
+
+    return {
+        "meta": {
+            "frames": frame_count,
+            "size": size,
+            "repeat": repeat,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+        },
+        "results": results,
+    }
+
+
+def compare(results, baseline, threshold):
+    """Return the names of benchmarks more than threshold slower than the baseline"""
+    regressions = []
+    for name, result in results["results"].items():
+        base = baseline["results"].get(name)
+        if base is None or base["median"] <= 0:
+            continue
+        ratio = result["median"] / base["median"]
+        status = "REGRESSED" if ratio > 1 + threshold else "ok"
+        print(f"{name:<22} {ratio:6.2f}x baseline  {status}", file=sys.stderr)
+        if ratio > 1 + threshold:
+            regressions.append(name)
+    if results["meta"]["frames"] != baseline["meta"]["frames"] or \
+            results["meta"]["size"] != baseline["meta"]["size"]:
+        print("Warning: baseline was measured with a different frame count or size", file=sys.stderr)
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--frames", type=int, default=32, help="Frames per synthetic file (default 32)")
+    parser.add_argument("--size", type=int, default=96, help="Frame width and height (default 96)")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per benchmark (default 5)")
+    parser.add_argument("--only", nargs="+", help="Run only these benchmarks")
+    parser.add_argument("-o", "--output", help="Write the results JSON here")
+    parser.add_argument("--baseline", help="Compare against this results JSON")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="Allowed slowdown against the baseline (default 0.2 = 20%%)")
+    parser.add_argument("--save-baseline", help="Write the results as a new baseline")
+    parser.add_argument("--startup-target", type=float, default=1000,
+                        help="Maximum median cold start to first paint in ms (default 1000)")
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.frames, args.size, args.repeat, args.only)
+    text = json.dumps(results, indent=2)
+    print(text)
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, "w") as f:
+                f.write(text + "\n")
+
+    status = 0
+    startup = results["results"].get("startup")
+    if startup and startup["median"] * 1000 > args.startup_target:
+        print(f"Startup {startup['median'] * 1000:.0f} ms is over the "
+              f"{args.startup_target:.0f} ms target", file=sys.stderr)
+        status = 1
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"Regressed: {', '.join(regressions)}", file=sys.stderr)
+            status = 1
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,19 +1,37 @@
 # -*- coding: utf-8 -*-
 import sys
 import os
+import re
 import struct
+import io
+import json
+import zlib
+import hashlib
+import tempfile
+import shutil
+import threading
+import weakref
+import time
+import math
+import itertools
+from bisect import bisect_right
+from collections import OrderedDict, deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, 
                             QLabel, QPushButton, QFileDialog, QListWidget, QMessageBox,
-                            QTabWidget, QScrollArea, QSplitter, QAction, QMenu, QToolBar,
+                            QTabWidget, QSplitter, QAction, QMenu, QToolBar,
                             QSpinBox, QGridLayout, QGroupBox, QStatusBar, QLineEdit,
                             QRadioButton, QButtonGroup, QCheckBox, QSlider, QColorDialog,
-                            QDialog, QFormLayout)
-from PyQt5.QtGui import QPixmap, QImage, QIcon, QPainter, QColor, QPen, QBrush
-from PyQt5.QtCore import Qt, QSize, QTimer, QByteArray, QBuffer, QIODevice
+                            QDialog, QFormLayout, QProgressDialog, QAbstractItemView,
+                            QComboBox, QListView, QAbstractScrollArea, QInputDialog,
+                            QDockWidget, QTableWidget, QTableWidgetItem, QHeaderView)
+from PyQt5.QtGui import QPixmap, QImage, QIcon, QPainter, QColor, QPen, QBrush, QGuiApplication
+from PyQt5.QtCore import (Qt, QSize, QTimer, QByteArray, QBuffer, QIODevice, QObject,
+                          QElapsedTimer, QRect, QRectF, QAbstractListModel, QModelIndex,
+                          QStandardPaths, pyqtSignal)
 from PyQt5.QtGui import qRgba
 # hoặc
 from PyQt5.QtGui import *
-from PIL import Image
 
 class ASFHeader:
     """Structure for ASF file header"""
@@ -37,14 +55,29 @@ class SPRHeader:
         self.direction_count = 0  # Number of directions
 
 
+# Immutable copy of a frame's state; payload is held by reference, never copied
+FrameState = namedtuple("FrameState", [
+    "image_data", "loader", "revision", "direction", "delay", "x_offset", "y_offset",
+    "shadow_enabled", "shadow_x_offset", "shadow_y_offset", "shadow_transparency",
+    "shadow_color", "trim", "source_data"])
+
+
 class ASFFrame:
     """Information for a frame in ASF file"""
+    _revisions = itertools.count(1)  # Shared so a revision never names two images
+    _publish_lock = threading.Lock()  # Orders loader results against edits from other threads
+    
     def __init__(self):
         self.direction = 0      # Frame direction (0-7)
+        self._loader = None     # Produces image data on first access (lazy readers)
+        self._source_data = None  # Payload as read from the file, while image_data is a trimmed copy
+        self.revision = 0       # Bumped whenever image data is replaced
+        self.last_access = 0.0  # Monotonic time image data was last read
         self.image_data = None  # Image data
         self.delay = 100        # Display time (ms)
         self.x_offset = 0       # X offset
         self.y_offset = 0       # Y offset
+        self.trim = None        # (x, y, canvas width, canvas height) if image_data is trimmed
         # Additional properties from screenshot
         self.shadow_enabled = False  # Enable shadow
         self.shadow_x_offset = 0     # Shadow X offset
@@ -52,50 +85,4536 @@ class ASFFrame:
         self.shadow_transparency = 120   # Shadow transparency (0-255)
         self.shadow_color = QColor(0, 0, 0, 128)  # Shadow color
 
+    @property
+    def image_data(self):
+        """Encoded image data, produced by the loader on first access"""
+        self.last_access = time.monotonic()
+        loader = self._loader
+        if loader is not None:
+            image_data = loader()
+            with ASFFrame._publish_lock:
+                # An edit (or another loader) may have replaced the image while
+                # the loader ran; its result is then stale and is dropped
+                if self._loader is not loader:
+                    return self._image_data if self._loader is None else image_data
+                # Trimming loaders report the origin once they have run; set it
+                # before the data so other threads never see a trimmed image without it
+                trim = getattr(loader, "trim", None)
+                if trim is not None:
+                    self.trim = trim
+                    self._source_data = getattr(loader, "source", None)
+                self._image_data = image_data
+                self._loader = None
+        return self._image_data
 
-class FrameAdjustmentDialog(QDialog):
-    """Dialog for advanced frame adjustments"""
-    def __init__(self, parent=None, frame=None):
-        super().__init__(parent)
-        self.frame = frame
-        self.setWindowTitle("Frame Details")
-        self.setMinimumWidth(400)
-        self.init_ui()
-        
-    def init_ui(self):
-        layout = QFormLayout(self)
-        
-        # Transparency slider
-        self.transparency_slider = QSlider(Qt.Horizontal)
-        self.transparency_slider.setRange(0, 255)
-        self.transparency_slider.setValue(self.frame.shadow_transparency if self.frame else 120)
-        layout.addRow("Transparency:", self.transparency_slider)
-        
-        # Shadow color picker
-        self.color_btn = QPushButton("Choose Shadow Color")
-        self.color_btn.clicked.connect(self.choose_shadow_color)
-        layout.addRow("Shadow Color:", self.color_btn)
-        
-        # Lock offset checkbox
-        self.lock_offset = QCheckBox("Lock Offset")
-        layout.addRow("", self.lock_offset)
-        
-        # Buttons
-        buttons_layout = QHBoxLayout()
-        self.ok_btn = QPushButton("OK")
-        self.ok_btn.clicked.connect(self.accept)
-        self.cancel_btn = QPushButton("Cancel")
-        self.cancel_btn.clicked.connect(self.reject)
-        
-        buttons_layout.addWidget(self.ok_btn)
-        buttons_layout.addWidget(self.cancel_btn)
-        layout.addRow("", buttons_layout)
+    @image_data.setter
+    def image_data(self, value):
+        with ASFFrame._publish_lock:
+            self._loader = None
+            self._image_data = value
+            self._source_data = None
+            self.revision = next(ASFFrame._revisions)
+
+    @property
+    def source_data(self):
+        """Payload the frame was read with, if trimmed on load and not edited since (else None)"""
+        loader = self._loader
+        if loader is not None and hasattr(loader, "source"):
+            return loader.source
+        return self._source_data
+
+    @property
+    def is_loaded(self):
+        """Whether image_data can be read without decoding or reloading"""
+        return self._loader is None
+
+    @property
+    def loaded_data(self):
+        """Image data if loaded, without running the loader (else None)"""
+        return self._image_data if self._loader is None else None
+
+    @property
+    def is_empty(self):
+        """Whether the frame is loaded and has no image data"""
+        return self._loader is None and not self._image_data
+
+    def set_loader(self, loader):
+        """Defer image data to loader(), called on first access
+        
+        The image is unchanged from the frame's point of view, so the
+        revision is kept; this is also how cold frames are spilled to disk.
+        """
+        with ASFFrame._publish_lock:
+            self._image_data = None
+            self._loader = loader
+
+    def resident_bytes(self):
+        """Bytes of encoded data this frame keeps in memory"""
+        if self._loader is not None:
+            size = getattr(self._loader, "resident_bytes", 0)
+        else:
+            size = len(self._image_data) if self._image_data else 0
+        if self._source_data is not None and self._source_data is not self._image_data:
+            size += len(self._source_data)
+        return size
+
+    def snapshot(self):
+        """Return the frame's state without loading its image data"""
+        return FrameState(self._image_data, self._loader, self.revision, self.direction,
+                          self.delay, self.x_offset, self.y_offset, self.shadow_enabled,
+                          self.shadow_x_offset, self.shadow_y_offset,
+                          self.shadow_transparency, QColor(self.shadow_color), self.trim,
+                          self._source_data)
+
+    def restore(self, state):
+        """Put back a state taken with snapshot()"""
+        with ASFFrame._publish_lock:
+            self._image_data = state.image_data
+            self._loader = state.loader
+            self._source_data = state.source_data
+            self.revision = state.revision
+        self.direction = state.direction
+        self.delay = state.delay
+        self.x_offset = state.x_offset
+        self.y_offset = state.y_offset
+        self.shadow_enabled = state.shadow_enabled
+        self.shadow_x_offset = state.shadow_x_offset
+        self.shadow_y_offset = state.shadow_y_offset
+        self.shadow_transparency = state.shadow_transparency
+        self.shadow_color = QColor(state.shadow_color)
+        self.trim = state.trim
+
+
+def qimage_to_array(image):
+    """Return a writable HxWx4 uint8 copy of a QImage in BGRA byte order"""
+    import numpy as np
+    image = image.convertToFormat(QImage.Format_ARGB32)
+    width, height = image.width(), image.height()
+    ptr = image.constBits()
+    ptr.setsize(image.sizeInBytes())
+    rows = np.frombuffer(ptr, np.uint8).reshape(height, image.bytesPerLine())
+    return rows[:, :width * 4].reshape(height, width, 4).copy()
+
+
+def array_to_qimage(pixels):
+    """Create a QImage (ARGB32) from an HxWx4 uint8 BGRA array"""
+    import numpy as np
+    pixels = np.ascontiguousarray(pixels, dtype=np.uint8)
+    height, width = pixels.shape[:2]
+    # copy() detaches the image from the temporary bytes buffer
+    return QImage(pixels.tobytes(), width, height, width * 4, QImage.Format_ARGB32).copy()
+
+
+def image_to_png_bytes(image, quality=-1):
+    """Encode a QImage as PNG bytes (a higher quality compresses less, but faster)"""
+    ba = QByteArray()
+    buffer = QBuffer(ba)
+    buffer.open(QIODevice.WriteOnly)
+    image.save(buffer, "PNG", quality)
+    return ba.data()
+
+
+def encode_tga(image, rle=False):
+    """Encode a QImage as a 32-bit top-down TGA, optionally RLE compressed"""
+    import numpy as np
+    pixels = qimage_to_array(image)
+    height, width = pixels.shape[:2]
+    # Image descriptor 0x28: 8 alpha bits, origin at the top left
+    header = struct.pack("<BBBHHBHHHHBB", 0, 0, 10 if rle else 2, 0, 0, 0,
+                         0, 0, width, height, 32, 0x28)
+    if not rle:
+        return header + pixels.tobytes()
+        
+    chunks = [header]
+    rows = pixels.view(np.uint32).reshape(height, width)
+    for y in range(height):
+        row = rows[y]
+        row_bytes = pixels[y].tobytes()
+        # Runs of identical pixels; packets never cross a scanline
+        bounds = np.concatenate(([0], np.flatnonzero(np.diff(row)) + 1, [width])).tolist()
+        literal = 0
+        for start, end in zip(bounds[:-1], bounds[1:]):
+            if end - start < 2:
+                continue
+            for chunk in range(literal, start, 128):
+                count = min(128, start - chunk)
+                chunks.append(bytes((count - 1,)) + row_bytes[chunk * 4:(chunk + count) * 4])
+            pixel = row_bytes[start * 4:start * 4 + 4]
+            for chunk in range(start, end, 128):
+                chunks.append(bytes((0x80 | (min(128, end - chunk) - 1),)) + pixel)
+            literal = end
+        for chunk in range(literal, width, 128):
+            count = min(128, width - chunk)
+            chunks.append(bytes((count - 1,)) + row_bytes[chunk * 4:(chunk + count) * 4])
+    return b"".join(chunks)
+
+
+class PngStreamWriter:
+    """Write an 8-bit RGBA PNG row band by row band through one zlib stream"""
+    CHUNK_SIZE = 256 * 1024
+    
+    def __init__(self, file, width, height, compression=6):
+        self.file = file
+        self.width = width
+        self.height = height
+        self.rows_written = 0
+        self.compressor = zlib.compressobj(compression)
+        self.pending = []
+        self.pending_size = 0
+        file.write(b"\x89PNG\r\n\x1a\n")
+        self.write_chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 6, 0, 0, 0))
+    
+    def write_chunk(self, kind, data):
+        self.file.write(struct.pack(">I", len(data)) + kind + data)
+        self.file.write(struct.pack(">I", zlib.crc32(kind + data) & 0xFFFFFFFF))
+    
+    def write_rows(self, pixels):
+        """Append an HxWx4 BGRA band below the rows already written"""
+        import numpy as np
+        rgba = pixels[..., [2, 1, 0, 3]]
+        # Filter type 0 (None) in front of every scanline
+        rows = np.empty((rgba.shape[0], self.width * 4 + 1), np.uint8)
+        rows[:, 0] = 0
+        rows[:, 1:] = rgba.reshape(rgba.shape[0], -1)
+        self.add(self.compressor.compress(rows.tobytes()))
+        self.rows_written += rgba.shape[0]
+    
+    def add(self, data):
+        if data:
+            self.pending.append(data)
+            self.pending_size += len(data)
+        if self.pending_size >= self.CHUNK_SIZE:
+            self.write_chunk(b"IDAT", b"".join(self.pending))
+            self.pending, self.pending_size = [], 0
+    
+    def close(self):
+        if self.rows_written != self.height:
+            raise ValueError(f"PNG has {self.rows_written} of {self.height} rows")
+        self.add(self.compressor.flush())
+        if self.pending:
+            self.write_chunk(b"IDAT", b"".join(self.pending))
+        self.write_chunk(b"IEND", b"")
+
+
+class TgaStreamWriter:
+    """Write an uncompressed 32-bit top-down TGA row band by row band"""
+    def __init__(self, file, width, height):
+        self.file = file
+        self.height = height
+        self.rows_written = 0
+        file.write(struct.pack("<BBBHHBHHHHBB", 0, 0, 2, 0, 0, 0, 0, 0, width, height, 32, 0x28))
+    
+    def write_rows(self, pixels):
+        """Append an HxWx4 BGRA band below the rows already written"""
+        import numpy as np
+        self.file.write(np.ascontiguousarray(pixels).tobytes())
+        self.rows_written += pixels.shape[0]
+    
+    def close(self):
+        if self.rows_written != self.height:
+            raise ValueError(f"TGA has {self.rows_written} of {self.height} rows")
+
+
+def sprite_sheet_band(images, cols, cell_width, cell_height):
+    """Lay one grid row of decoded frames (QImage or None) into a BGRA band
+    
+    Frames are copied to the top left of their cell and clipped to it, so a
+    sheet built band by band matches one built in a single image.
+    """
+    import numpy as np
+    band = np.zeros((cell_height, cols * cell_width, 4), np.uint8)
+    for col, image in enumerate(images):
+        if image is None or image.isNull():
+            continue
+        pixels = qimage_to_array(image)[:cell_height, :cell_width]
+        x = col * cell_width
+        band[:pixels.shape[0], x:x + pixels.shape[1]] = pixels
+    return band
+
+
+def animation_frame_pixels(frame, image, width, height):
+    """Composite a frame's decoded image (as stored, or None) onto a width x height canvas
+    
+    The frame is drawn as playback draws it (see draw_frame) and the result
+    is returned as an HxWx4 BGRA array.
+    """
+    canvas = QImage(width, height, QImage.Format_ARGB32)
+    canvas.fill(Qt.transparent)
+    if image is not None and not image.isNull():
+        painter = QPainter(canvas)
+        draw_frame(painter, frame, image)
+        painter.end()
+    return qimage_to_array(canvas)
+
+
+# Animation export formats: name -> extension
+ANIMATION_FORMATS = OrderedDict([("GIF", "gif"), ("APNG", "png"), ("WebP", "webp")])
+
+
+def build_global_palette(frames, colours=255, sample_pixels=262144):
+    """Quantise a sample of every frame's opaque pixels into one shared palette
+    
+    frames are HxWx4 BGRA arrays. Returns a "P" image holding at most
+    colours entries, for use with Image.quantize(palette=...).
+    """
+    import numpy as np
+    from PIL import Image
+    per_frame = max(1, sample_pixels // max(1, len(frames)))
+    samples = []
+    for pixels in frames:
+        opaque = pixels[pixels[..., 3] >= 128][:, 2::-1]
+        samples.append(opaque[::max(1, len(opaque) // per_frame)])
+    sample = np.ascontiguousarray(np.concatenate(samples) if samples else np.zeros((0, 3), np.uint8))
+    if not len(sample):
+        sample = np.zeros((1, 3), np.uint8)
+    strip = Image.frombytes("RGB", (len(sample), 1), sample.tobytes())
+    palette = strip.quantize(min(colours, 256), method=Image.Quantize.MEDIANCUT)
+    # Keep only the entries in use so nothing maps past them
+    used = len(palette.getcolors(256) or ()) or 1
+    palette_image = Image.new("P", (1, 1))
+    palette_image.putpalette(palette.getpalette()[:used * 3])
+    return palette_image
+
+
+def quantize_frame(pixels, palette_image, transparent_index):
+    """Map a BGRA array onto a shared palette; alpha below 128 becomes transparent_index"""
+    import numpy as np
+    from PIL import Image
+    height, width = pixels.shape[:2]
+    rgb = Image.frombytes("RGB", (width, height), np.ascontiguousarray(pixels[..., 2::-1]).tobytes())
+    indices = np.array(rgb.quantize(palette=palette_image, dither=Image.Dither.NONE))
+    indices[pixels[..., 3] < 128] = transparent_index
+    return Image.fromarray(indices, "P")
+
+
+def encode_animation(frames, delays, format_name, background=None, loop=True,
+                     progress=None, cancelled=None):
+    """Encode equally sized BGRA arrays as an animated GIF, APNG or WebP
+    
+    With a background colour (r, g, b) frames are flattened onto it;
+    otherwise transparency is kept. Each frame is stored as the rectangle that
+    changed since the previous one: GIF frames share one global palette and
+    keep unchanged pixels transparent, APNG and WebP are diffed by their
+    encoders. progress(done) is called per prepared frame and the encode
+    stops early, returning None, once cancelled() is true.
+    """
+    import numpy as np
+    from PIL import Image
+    if background is not None:
+        colour = np.array(background[::-1], np.float32)
+        flattened = []
+        for pixels in frames:
+            alpha = pixels[..., 3:4].astype(np.float32) / 255
+            bgr = pixels[..., :3] * alpha + colour * (1 - alpha)
+            flattened.append(np.dstack([np.rint(bgr).astype(np.uint8),
+                                        np.full(pixels.shape[:2], 255, np.uint8)]))
+        frames = flattened
+        
+    output = io.BytesIO()
+    durations = [max(10, int(delay)) for delay in delays]
+    # GIF plays once when the loop extension is absent; APNG/WebP count plays
+    loop_options = {"loop": 0} if loop else ({} if format_name == "GIF" else {"loop": 1})
+    if format_name == "GIF":
+        palette_image = build_global_palette(frames)
+        palette = palette_image.getpalette()
+        transparent_index = len(palette) // 3
+        palette = palette + [0, 0, 0]
+        images = []
+        for done, pixels in enumerate(frames, 1):
+            if cancelled is not None and cancelled():
+                return None
+            image = quantize_frame(pixels, palette_image, transparent_index)
+            image.putpalette(palette)
+            images.append(image)
+            if progress is not None:
+                progress(done)
+        # Opaque frames only ever add pixels, so each can be a delta over the
+        # last (disposal 1). A pixel can only turn transparent by clearing the
+        # previous frame's rectangle, so transparent animations restore to
+        # background (disposal 2) and store each frame's own bounding box.
+        images[0].save(output, "GIF", save_all=True, append_images=images[1:],
+                       duration=durations, palette=bytes(palette), **loop_options,
+                       transparency=transparent_index, optimize=True,
+                       disposal=1 if background is not None else 2)
+    else:
+        images = []
+        for done, pixels in enumerate(frames, 1):
+            if cancelled is not None and cancelled():
+                return None
+            height, width = pixels.shape[:2]
+            images.append(Image.frombytes("RGBA", (width, height), np.ascontiguousarray(pixels).tobytes(),
+                                          "raw", "BGRA"))
+            if progress is not None:
+                progress(done)
+        if format_name == "APNG":
+            # Source blending lets a changed rectangle also clear pixels
+            images[0].save(output, "PNG", save_all=True, append_images=images[1:],
+                           duration=durations, default_image=False, **loop_options,
+                           disposal=0, blend=0)
+        else:
+            images[0].save(output, "WEBP", save_all=True, append_images=images[1:],
+                           duration=durations, lossless=True, method=4, **loop_options,
+                           minimize_size=True)
+    return output.getvalue()
+
+
+# Frame export encoders: name -> (extension, encoder family)
+EXPORT_FORMATS = OrderedDict([
+    ("PNG", ("png", "png")),
+    ("TGA", ("tga", "tga")),
+    ("TGA (RLE)", ("tga", "tga_rle")),
+    ("BMP", ("bmp", "qt")),
+    ("JPG", ("jpg", "qt")),
+    ("WebP", ("webp", "webp")),
+])
+
+
+def encode_image(image, format_name, compression=6, quality=90):
+    """Encode a QImage with one of the EXPORT_FORMATS encoders
+    
+    compression is the PNG zlib level (0-9); quality applies to JPG and
+    WebP, where 100 means lossless WebP.
+    """
+    from PIL import Image
+    extension, family = EXPORT_FORMATS[format_name]
+    if family == "tga":
+        return encode_tga(image)
+    if family == "tga_rle":
+        return encode_tga(image, rle=True)
+    if family == "qt":
+        ba = QByteArray()
+        buffer = QBuffer(ba)
+        buffer.open(QIODevice.WriteOnly)
+        if not image.save(buffer, extension.upper(), quality):
+            raise ValueError(f"Qt cannot write {format_name} images")
+        return ba.data()
+        
+    pixels = qimage_to_array(image)
+    height, width = pixels.shape[:2]
+    pil_image = Image.frombytes("RGBA", (width, height), pixels.tobytes(), "raw", "BGRA")
+    output = io.BytesIO()
+    if family == "png":
+        pil_image.save(output, "PNG", compress_level=compression)
+    else:
+        pil_image.save(output, "WEBP", quality=quality, lossless=quality >= 100)
+    return output.getvalue()
+
+
+def export_file_name(template, frame, index, name):
+    """Expand a frame file name template such as "{name}_{index:04d}_dir_{direction}"
+    
+    Fields: name (document name), index (0-based), number (1-based),
+    direction, delay, x and y (offsets).
+    """
+    return template.format(name=name, index=index, number=index + 1, direction=frame.direction,
+                           delay=frame.delay, x=frame.x_offset, y=frame.y_offset)
+
+
+def alpha_bounds(pixels):
+    """Return (x, y, width, height) of the non-transparent part of a BGRA array, or None"""
+    import numpy as np
+    alpha = pixels[..., 3]
+    columns = np.flatnonzero(alpha.any(axis=0))
+    if not len(columns):
+        return None
+    rows = np.flatnonzero(alpha.any(axis=1))
+    return (int(columns[0]), int(rows[0]),
+            int(columns[-1] - columns[0] + 1), int(rows[-1] - rows[0] + 1))
+
+
+def trim_bounds(pixels):
+    """Bounds a BGRA array can be trimmed to without losing a single byte, or None
+    
+    Only all-zero pixels are cut, so padding the trimmed image back with
+    zeros restores it exactly.
+    """
+    import numpy as np
+    words = np.ascontiguousarray(pixels).view(np.uint32)[..., 0]
+    height, width = words.shape
+    if not words.any():
+        return (0, 0, 1, 1) if (width, height) != (1, 1) else None
+    bounds = alpha_bounds(pixels)
+    if bounds is None or bounds[2:] == (width, height):
+        return None
+    x, y, w, h = bounds
+    if np.count_nonzero(words) != np.count_nonzero(words[y:y + h, x:x + w]):
+        return None
+    return bounds
+
+
+def trim_image(image):
+    """Trim a QImage to its visible bounds
+    
+    Returns (image, trim) where trim is (x, y, canvas width, canvas height), or
+    the image unchanged and None if nothing can be cut.
+    """
+    pixels = qimage_to_array(image)
+    bounds = trim_bounds(pixels)
+    if bounds is None:
+        return image, None
+    x, y, w, h = bounds
+    return array_to_qimage(pixels[y:y + h, x:x + w]), (x, y, image.width(), image.height())
+
+
+def untrim_image(image, trim):
+    """Place a trimmed image back on its full, zero-filled canvas"""
+    import numpy as np
+    x, y, width, height = trim
+    canvas = np.zeros((height, width, 4), np.uint8)
+    pixels = qimage_to_array(image)[:height - y, :width - x]
+    canvas[y:y + pixels.shape[0], x:x + pixels.shape[1]] = pixels
+    return array_to_qimage(canvas)
+
+
+def trimming_loader(image_data):
+    """Return a loader that trims encoded image data on first access"""
+    def load():
+        image = QImage.fromData(image_data)
+        if image.isNull():
+            return image_data
+        trimmed, load.trim = trim_image(image)
+        return image_data if load.trim is None else image_to_png_bytes(trimmed)
+    load.trim = None
+    load.source = image_data  # Written back as is while the frame is unedited
+    load.resident_bytes = len(image_data)
+    return load
+
+
+def disk_cached_loader(load, kind, payload, file_path, mtime, disk_cache=None):
+    """Wrap a frame loader so its result and trim origin are kept in the disk cache
+    
+    payload is the file data the loader decodes, or a callable returning it;
+    it is hashed with the file path and mtime (see DiskCache.key) on first access.
+    """
+    if disk_cache is None:
+        return load
+        
+    def cached():
+        key = None
+        if disk_cache.enabled:
+            key = DiskCache.key(kind, payload() if callable(payload) else payload, file_path, mtime)
+            data = disk_cache.get(key)
+            if data is not None:
+                # Entries start with the trim rectangle (all zero if untrimmed)
+                bounds = struct.unpack("<4I", data[:16])
+                cached.trim = bounds if bounds[2] else None
+                return data[16:] or getattr(load, "source", None)
+                
+        image_data = load()
+        cached.trim = load.trim
+        if key is not None and image_data is not None:
+            # A loader that kept its source unchanged stores only the trim
+            unchanged = image_data is getattr(load, "source", None)
+            disk_cache.put(key, struct.pack("<4I", *(load.trim or (0, 0, 0, 0))) +
+                           (b"" if unchanged else image_data))
+        return image_data
+    cached.trim = None
+    if hasattr(load, "source"):
+        cached.source = load.source
+    cached.resident_bytes = load.resident_bytes
+    return cached
+
+
+def decode_frame(frame, frame_cache=None):
+    """Decode a frame's image on its full canvas (undoing any trim), or None
+    
+    With a FrameCache the decoded image is shared; it must not be modified.
+    """
+    image_data = frame.image_data
+    if not image_data:
+        return None
+    if frame_cache is not None:
+        image = frame_cache.get(image_data)
+    else:
+        with PROFILER.span("decode", bytes=len(image_data)):
+            image = QImage.fromData(image_data)
+    trim = frame.trim
+    if trim is not None and not image.isNull():
+        image = untrim_image(image, trim)
+    return image
+
+
+def frame_canvas_size(frame, image):
+    """Full canvas size of a frame whose decoded (possibly trimmed) image is image"""
+    trim = frame.trim
+    return QSize(trim[2], trim[3]) if trim is not None else image.size()
+
+
+def frame_origin(frame):
+    """Where the stored image sits on the frame's canvas"""
+    trim = frame.trim
+    return (trim[0], trim[1]) if trim is not None else (0, 0)
+
+
+def composite_frame(frame, image, background, ghosts=None):
+    """Composite a frame's decoded image over a background colour on its full canvas
+    
+    ghosts is an optional onion skin overlay drawn beneath the frame. Only
+    the arguments are read, so this is safe on worker threads.
+    """
+    # Create final image with background color, at the untrimmed canvas size
+    final_image = QImage(frame_canvas_size(frame, image), QImage.Format_ARGB32)
+    final_image.fill(background)
+    
+    painter = QPainter(final_image)
+    
+    if ghosts is not None:
+        painter.drawImage(0, 0, ghosts)
+    
+    # Draw shadow if enabled, then the image, at their offsets
+    draw_frame(painter, frame, image)
+    painter.end()
+    
+    return final_image
+
+
+def draw_frame(painter, frame, image):
+    """Draw a frame's decoded image (as stored) and its shadow at their offsets
+    
+    This is the one place frames are composited, so the editor, the
+    direction preview and exports all place them identically.
+    """
+    trim_x, trim_y = frame_origin(frame)
+    if frame.shadow_enabled:
+        painter.setOpacity(frame.shadow_transparency / 255.0)
+        painter.drawImage(frame.shadow_x_offset + trim_x, frame.shadow_y_offset + trim_y, image)
+        painter.setOpacity(1.0)
+    painter.drawImage(frame.x_offset + trim_x, frame.y_offset + trim_y, image)
+
+
+def frame_file_data(frame):
+    """Encoded image data to write to disk, at full canvas size
+    
+    A frame trimmed on load writes back the payload it was read with until
+    its image is edited, so unedited frames are neither decoded nor re-encoded.
+    """
+    source = frame.source_data
+    if source is not None:
+        return source
+    image_data = frame.image_data
+    if image_data and frame.trim is not None:
+        return image_to_png_bytes(decode_frame(frame))
+    return image_data
+
+
+# Delta frame record: magic, then <5I keyframe index, x, y, width, height, then
+# a PNG of the changed rectangle XORed with the keyframe (zero where unchanged)
+DELTA_MAGIC = b"DLT1"
+DELTA_HEADER = struct.Struct("<5I")
+ASF_DELTA_VERSION = 2.0
+
+
+def encode_delta(pixels, key_pixels, key_index):
+    """Encode a BGRA frame as the rectangle that differs from its keyframe"""
+    import numpy as np
+    changed = (pixels != key_pixels).any(axis=2)
+    columns = np.flatnonzero(changed.any(axis=0))
+    if not len(columns):
+        return DELTA_MAGIC + DELTA_HEADER.pack(key_index, 0, 0, 0, 0)
+    rows = np.flatnonzero(changed.any(axis=1))
+    x, y = int(columns[0]), int(rows[0])
+    w, h = int(columns[-1]) - x + 1, int(rows[-1]) - y + 1
+    patch = pixels[y:y + h, x:x + w] ^ key_pixels[y:y + h, x:x + w]
+    return DELTA_MAGIC + DELTA_HEADER.pack(key_index, x, y, w, h) + image_to_png_bytes(array_to_qimage(patch))
+
+
+def apply_delta(record, key_pixels):
+    """Rebuild the BGRA frame a delta record encodes from its keyframe's pixels"""
+    _, x, y, w, h = DELTA_HEADER.unpack_from(record, len(DELTA_MAGIC))
+    pixels = key_pixels.copy()
+    if w and h:
+        patch = qimage_to_array(QImage.fromData(record[len(DELTA_MAGIC) + DELTA_HEADER.size:]))
+        pixels[y:y + h, x:x + w] ^= patch
+    return pixels
+
+
+def delta_encode_frames(frames, keyframe_interval, frame_cache=None):
+    """Yield each frame's file data, either whole (a keyframe) or as a delta
+    
+    A keyframe starts every keyframe_interval frames, on each direction
+    change and whenever a delta would not be smaller than the whole frame, so
+    any frame decodes from at most two images.
+    """
+    key_index = key_pixels = None
+    for index, frame in enumerate(frames):
+        image_data = frame_file_data(frame)
+        image = decode_frame(frame, frame_cache) if image_data else None
+        if image is None or image.isNull():
+            yield image_data
+            continue
+        pixels = qimage_to_array(image)
+        if (key_pixels is not None and index - key_index < keyframe_interval and
+                frame.direction == frames[key_index].direction and pixels.shape == key_pixels.shape):
+            delta = encode_delta(pixels, key_pixels, key_index)
+            if len(delta) < len(image_data):
+                yield delta
+                continue
+        key_index, key_pixels = index, pixels
+        yield image_data
+
+
+def delta_frame_loader(key_data, record, frame_cache=None, trim=False):
+    """Return a loader that rebuilds a delta frame from its keyframe's file data on first access"""
+    def load():
+        key_image = frame_cache.get(key_data) if frame_cache is not None else QImage.fromData(key_data)
+        image = array_to_qimage(apply_delta(record, qimage_to_array(key_image)))
+        if trim:
+            image, load.trim = trim_image(image)
+        # Fast compression: this runs on first access, often during playback
+        return image_to_png_bytes(image, 90)
+    load.trim = None
+    load.resident_bytes = len(record)
+    return load
+
+
+class MaxRectsPacker:
+    """MaxRects bin packer (best short side fit) for one atlas page"""
+    def __init__(self, width, height, allow_rotation=False):
+        self.width = width
+        self.height = height
+        self.allow_rotation = allow_rotation
+        self.free = [(0, 0, width, height)]  # Maximal free rectangles, none inside another
+    
+    def insert(self, width, height):
+        """Place a width x height rectangle; returns (x, y, rotated) or None"""
+        best = None  # (short side left, long side left, x, y, rotated)
+        for fx, fy, fw, fh in self.free:
+            for w, h, rotated in ((width, height, False), (height, width, True)):
+                if rotated and (not self.allow_rotation or width == height):
+                    continue
+                if w <= fw and h <= fh:
+                    score = (min(fw - w, fh - h), max(fw - w, fh - h), fx, fy, rotated)
+                    if best is None or score[:2] < best[:2]:
+                        best = score
+        if best is None:
+            return None
+            
+        x, y, rotated = best[2:]
+        w, h = (height, width) if rotated else (width, height)
+        self.place(x, y, w, h)
+        return x, y, rotated
+    
+    def place(self, x, y, w, h):
+        """Split every free rectangle the placed one overlaps"""
+        kept, split = [], []
+        for fx, fy, fw, fh in self.free:
+            if x >= fx + fw or x + w <= fx or y >= fy + fh or y + h <= fy:
+                kept.append((fx, fy, fw, fh))
+                continue
+            if x > fx:
+                split.append((fx, fy, x - fx, fh))
+            if x + w < fx + fw:
+                split.append((x + w, fy, fx + fw - x - w, fh))
+            if y > fy:
+                split.append((fx, fy, fw, y - fy))
+            if y + h < fy + fh:
+                split.append((fx, y + h, fw, fy + fh - y - h))
+        
+        # Untouched rectangles were already maximal among themselves, so only
+        # the new pieces need comparing
+        def contains(outer, inner):
+            return (outer[0] <= inner[0] and outer[1] <= inner[1] and
+                    outer[0] + outer[2] >= inner[0] + inner[2] and
+                    outer[1] + outer[3] >= inner[1] + inner[3])
+        
+        new = []
+        for i, rect in enumerate(split):
+            if any(contains(other, rect) for other in kept):
+                continue
+            if any(contains(other, rect) and (other != rect or j > i)
+                   for j, other in enumerate(split) if j != i):
+                continue
+            new.append(rect)
+        self.free = [rect for rect in kept if not any(contains(other, rect) for other in new)] + new
+
+
+def next_power_of_two(value):
+    return 1 << max(0, int(value) - 1).bit_length()
+
+
+def pack_atlas(sizes, max_width=4096, max_height=4096, power_of_two=False, allow_rotation=False):
+    """Pack {key: (width, height)} into as few, as small pages as possible
+    
+    Returns a list of (page width, page height, {key: (x, y, rotated)}).
+    Raises ValueError if a rectangle cannot fit on an empty page.
+    """
+    # Large, long rectangles first
+    order = sorted(sizes, key=lambda key: (max(sizes[key]), sizes[key][0] * sizes[key][1]), reverse=True)
+    
+    def pack(keys, width, height):
+        packer = MaxRectsPacker(width, height, allow_rotation)
+        placed, left = {}, []
+        for key in keys:
+            position = packer.insert(*sizes[key])
+            if position is None:
+                left.append(key)
+            else:
+                placed[key] = position
+        return placed, left
+    
+    def grow(value, limit):
+        return min(limit, value * 2 if power_of_two else int(value * 1.1) + 4)
+    
+    pages = []
+    while order:
+        # Fill a maximum size page, then shrink it to the smallest size that still fits
+        placed, order = pack(order, max_width, max_height)
+        if not placed:
+            key = order[0]
+            raise ValueError(f"{key} ({sizes[key][0]}x{sizes[key][1]}) does not fit in "
+                             f"{max_width}x{max_height}")
+        keys = list(placed)
+        side = math.isqrt(sum(sizes[key][0] * sizes[key][1] for key in keys))
+        if allow_rotation:
+            width = height = max([side] + [min(sizes[key]) for key in keys])
+        else:
+            width = max([side] + [sizes[key][0] for key in keys])
+            height = max([side] + [sizes[key][1] for key in keys])
+        if power_of_two:
+            width, height = next_power_of_two(width), next_power_of_two(height)
+        width, height = min(width, max_width), min(height, max_height)
+        while (width, height) != (max_width, max_height):
+            trial, left = pack(keys, width, height)
+            if not left:
+                placed = trial
+                break
+            if (width <= height and width < max_width) or height >= max_height:
+                width = grow(width, max_width)
+            else:
+                height = grow(height, max_height)
+        else:
+            width, height = max_width, max_height
+        
+        if not power_of_two:
+            # Crop to what was used
+            width = max(x + (sizes[key][1] if rotated else sizes[key][0])
+                        for key, (x, y, rotated) in placed.items())
+            height = max(y + (sizes[key][0] if rotated else sizes[key][1])
+                         for key, (x, y, rotated) in placed.items())
+        pages.append((width, height, placed))
+    return pages
+
+
+def apply_colour_key(pixels, key_color=None, tolerance=0, alpha_threshold=0):
+    """Make matching pixels fully transparent, in place.
+
+    pixels is an HxWx4 BGRA array. A pixel is cleared when its alpha is below
+    alpha_threshold, or when key_color is given and every RGB channel is within
+    tolerance of it. Returns the number of cleared pixels.
+    """
+    import numpy as np
+    mask = pixels[..., 3] < alpha_threshold
+    if key_color is not None:
+        key = np.array([key_color.blue(), key_color.green(), key_color.red()], dtype=np.int16)
+        distance = np.abs(pixels[..., :3].astype(np.int16) - key).max(axis=-1)
+        mask |= distance <= tolerance
+    # Clear colour as well as alpha so the key colour cannot bleed into scaled output
+    pixels[mask] = 0
+    return int(np.count_nonzero(mask))
+
+
+# Resampling and fit modes for resize_image
+RESAMPLE_MODES = [("nearest", "Nearest / Integer (pixel art)"),
+                  ("bilinear", "Bilinear"),
+                  ("lanczos", "Lanczos")]
+FIT_MODES = [("exact", "Exact (stretch)"),
+             ("fit", "Fit with padding"),
+             ("crop", "Fill and crop")]
+
+
+def scale_image(image, width, height, resample="nearest"):
+    """Scale a QImage to exactly width x height with the given resampling mode"""
+    import numpy as np
+    from PIL import Image
+    if image.width() == width and image.height() == height:
+        return image
+        
+    if resample == "nearest":
+        if width % image.width() == 0 and height % image.height() == 0:
+            # Whole-number upscale: repeat pixels so the result stays crisp
+            pixels = qimage_to_array(image)
+            pixels = pixels.repeat(height // image.height(), axis=0)
+            pixels = pixels.repeat(width // image.width(), axis=1)
+            return array_to_qimage(pixels)
+        return image.scaled(width, height, Qt.IgnoreAspectRatio, Qt.FastTransformation)
+    elif resample == "lanczos":
+        pixels = qimage_to_array(image)
+        pil_image = Image.frombuffer("RGBA", (image.width(), image.height()),
+                                     pixels.tobytes(), "raw", "BGRA", 0, 1)
+        pil_image = pil_image.resize((width, height), Image.LANCZOS)
+        data = np.frombuffer(pil_image.tobytes("raw", "BGRA"), np.uint8)
+        return array_to_qimage(data.reshape(height, width, 4))
+    else:
+        return image.scaled(width, height, Qt.IgnoreAspectRatio, Qt.SmoothTransformation)
+
+
+def resize_image(image, width, height, resample="nearest", fit="exact"):
+    """Resize a QImage onto a width x height canvas
+
+    fit is "exact" (stretch), "fit" (keep aspect ratio, pad with transparency)
+    or "crop" (keep aspect ratio, fill the canvas and crop the overflow).
+    """
+    if fit == "exact" or image.width() == 0 or image.height() == 0:
+        return scale_image(image, width, height, resample).convertToFormat(QImage.Format_ARGB32)
+        
+    scale_x = width / image.width()
+    scale_y = height / image.height()
+    scale = min(scale_x, scale_y) if fit == "fit" else max(scale_x, scale_y)
+    scaled_width = max(1, round(image.width() * scale))
+    scaled_height = max(1, round(image.height() * scale))
+    scaled = scale_image(image, scaled_width, scaled_height, resample)
+    
+    # Center the scaled image on a transparent canvas
+    canvas = QImage(width, height, QImage.Format_ARGB32)
+    canvas.fill(Qt.transparent)
+    painter = QPainter(canvas)
+    painter.setCompositionMode(QPainter.CompositionMode_Source)
+    painter.drawImage((width - scaled_width) // 2, (height - scaled_height) // 2, scaled)
+    painter.end()
+    return canvas
+
+
+def build_direction_index(frames):
+    """Map each direction to the indices of its frames, in frame list order"""
+    index = {}
+    for i, frame in enumerate(frames):
+        index.setdefault(frame.direction, []).append(i)
+    return dict(sorted(index.items()))
+
+
+def frame_content_hash(frame, frame_cache=None):
+    """Digest of a frame's pixels on its full canvas, so re-encoded copies still match"""
+    image = decode_frame(frame, frame_cache)
+    if image is None or image.isNull():
+        return hashlib.sha1(frame.image_data or b"").hexdigest()
+    digest = hashlib.sha1(struct.pack("<2I", image.width(), image.height()))
+    digest.update(qimage_to_array(image).tobytes())
+    return digest.hexdigest()
+
+
+PHASH_BACKGROUND = 128  # Grey that transparent pixels are composited over before hashing
+
+
+def area_resize(pixels, width, height):
+    """Shrink a 2-D array to height x width by averaging the pixels in each cell"""
+    import numpy as np
+    # Repeat pixels of images smaller than the target so every cell is non-empty
+    pixels = np.repeat(pixels, -(-height // pixels.shape[0]), axis=0)
+    pixels = np.repeat(pixels, -(-width // pixels.shape[1]), axis=1)
+    rows = np.linspace(0, pixels.shape[0], height + 1).astype(int)
+    columns = np.linspace(0, pixels.shape[1], width + 1).astype(int)
+    sums = np.add.reduceat(np.add.reduceat(pixels, rows[:-1], axis=0), columns[:-1], axis=1)
+    return sums / np.outer(np.diff(rows), np.diff(columns))
+
+
+def perceptual_hashes(image):
+    """64-bit (aHash, dHash) of a QImage composited over grey
+    
+    aHash sets a bit for each cell of an 8x8 thumbnail brighter than the mean;
+    dHash for each cell of a 9x8 thumbnail brighter than its left neighbour.
+    Similar images differ in few bits.
+    """
+    import numpy as np
+    pixels = qimage_to_array(image).astype(np.float32)
+    alpha = pixels[..., 3:] / 255
+    composited = pixels[..., :3] * alpha + PHASH_BACKGROUND * (1 - alpha)
+    gray = composited @ np.array([0.114, 0.587, 0.299], np.float32)  # BGR luma
+    
+    average = area_resize(gray, 8, 8)
+    gradient = area_resize(gray, 9, 8)
+    pack = lambda bits: int.from_bytes(np.packbits(bits).tobytes(), "big")
+    return pack(average > average.mean()), pack(gradient[:, 1:] > gradient[:, :-1])
+
+
+def pixel_diff_heatmap(old_image, new_image):
+    """Heat map of per-pixel differences between two frames, and the number of changed pixels
+    
+    Unchanged pixels show the new frame as dim grey; changed ones run from red
+    (slight) to yellow (large) by their largest channel difference, alpha included.
+    """
+    import numpy as np
+    width = max(old_image.width(), new_image.width())
+    height = max(old_image.height(), new_image.height())
+    
+    def canvas(image):
+        pixels = np.zeros((height, width, 4), np.int16)
+        array = qimage_to_array(image)
+        pixels[:array.shape[0], :array.shape[1]] = array
+        return pixels
+    
+    old, new = canvas(old_image), canvas(new_image)
+    difference = np.abs(old - new).max(axis=2)
+    changed = difference > 0
+    
+    heat = np.empty((height, width, 4), np.uint8)
+    luma = new[..., :3] @ np.array([0.114, 0.587, 0.299]) * (new[..., 3] / 255)
+    heat[..., :3] = (luma * 0.35 + 24).astype(np.uint8)[..., None]
+    heat[..., 3] = 255
+    heat[changed, 0] = 0
+    heat[changed, 1] = difference[changed]
+    heat[changed, 2] = 255
+    return array_to_qimage(heat), int(changed.sum())
+
+
+def frame_placement(frame):
+    """Everything but the image and delay that must match for frames to merge"""
+    return (frame.direction, frame.x_offset, frame.y_offset,
+            frame.shadow_enabled, frame.shadow_x_offset, frame.shadow_y_offset,
+            frame.shadow_transparency, frame.shadow_color.rgba())
+
+
+def compaction_candidates(frames):
+    """Indices of frames placed like a neighbour, the only ones worth hashing"""
+    placements = [frame_placement(frame) for frame in frames]
+    return [i for i in range(len(frames))
+            if (i > 0 and placements[i - 1] == placements[i]) or
+               (i + 1 < len(frames) and placements[i + 1] == placements[i])]
+
+
+def compaction_runs(frames, hashes):
+    """Return (start, end) slices of identical consecutive frames of one direction
+    
+    hashes maps frame index to content hash; frames without one never merge.
+    Frames match when their hashes and frame_placement are equal, so only
+    delays may differ. Runs of a single frame are left out.
+    """
+    def key(i):
+        return (hashes.get(i, i), frame_placement(frames[i]))
+    
+    runs = []
+    start = 0
+    for i in range(1, len(frames) + 1):
+        if i == len(frames) or key(i) != key(start):
+            if i - start > 1:
+                runs.append((start, i))
+            start = i
+    return runs
+
+
+def merged_delay(frames):
+    """Delay that plays a run of frames for exactly as long as the run did
+    
+    Playback holds a frame for at least 1 ms, so zero delays count as 1.
+    """
+    return sum(max(1, frame.delay) for frame in frames)
+
+
+def compact_timeline(frames, hashes):
+    """Collapse identical consecutive frames into one frame with their summed delay
+    
+    Returns (frames, removed frames, removed bytes); the input frames are not
+    modified, kept frames with a new delay are copies.
+    """
+    compacted = []
+    removed_bytes = 0
+    position = 0
+    for start, end in compaction_runs(frames, hashes):
+        compacted.extend(frames[position:start])
+        keep = ASFFrame()
+        keep.restore(frames[start].snapshot())
+        keep.delay = merged_delay(frames[start:end])
+        compacted.append(keep)
+        removed_bytes += sum(len(frame.image_data or b"") for frame in frames[start + 1:end])
+        position = end
+    compacted.extend(frames[position:])
+    return compacted, len(frames) - len(compacted), removed_bytes
+
+
+IMPORT_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp", ".tga", ".gif", ".webp", ".json")
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+
+def natural_sort_key(path):
+    """Sort key that orders frame_2 before frame_10"""
+    return [int(part) if part.isdigit() else part.lower() for part in re.split(r"(\d+)", path)]
+
+
+def pil_to_qimage(pil_image):
+    """Convert a PIL image to an ARGB32 QImage"""
+    import numpy as np
+    rgba = np.asarray(pil_image.convert("RGBA"))
+    return array_to_qimage(rgba[..., [2, 1, 0, 3]])
+
+
+def read_atlas_json(path):
+    """Read atlas metadata written by export_atlas or TexturePacker (hash or array)
+    
+    Returns [(page path, (x, y, w, h), rotated, (trim x, trim y, source w, source h), info)]
+    where info may hold direction, delay, x_offset and y_offset.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        atlas = json.load(f)
+    folder = os.path.dirname(path)
+    meta = atlas.get("meta", {})
+    pages = [os.path.join(folder, page["image"]) for page in meta.get("pages", [])]
+    if not pages and "image" in meta:
+        pages = [os.path.join(folder, meta["image"])]
+        
+    entries = atlas.get("frames", [])
+    if isinstance(entries, dict):
+        entries = [dict(entry, filename=name) for name, entry in sorted(
+            entries.items(), key=lambda item: natural_sort_key(item[0]))]
+    
+    sprites = []
+    for entry in entries:
+        rect = entry["frame"]
+        source = entry.get("sprite_source_size", entry.get("spriteSourceSize",
+                                                           {"x": 0, "y": 0}))
+        size = entry.get("source_size", entry.get("sourceSize", {"w": rect["w"], "h": rect["h"]}))
+        info = {}
+        if "direction" in entry:
+            info["direction"] = entry["direction"]
+        if "delay" in entry or "duration" in entry:
+            info["delay"] = entry.get("delay", entry.get("duration"))
+        if "offset" in entry:
+            info["x_offset"], info["y_offset"] = entry["offset"]["x"], entry["offset"]["y"]
+        if "filename" in entry:
+            info["name"] = entry["filename"]
+        sprites.append((pages[entry.get("page", 0)], (rect["x"], rect["y"], rect["w"], rect["h"]),
+                        bool(entry.get("rotated")), (source["x"], source["y"], size["w"], size["h"]),
+                        info))
+    return sprites
+
+
+def load_image_file(path):
+    """Load a still image with Qt, falling back to PIL (TGA, WebP without plugins)"""
+    from PIL import Image
+    image = QImage(path)
+    if image.isNull():
+        with Image.open(path) as pil_image:
+            image = pil_to_qimage(pil_image)
+    return image
+
+
+def import_frames_from_file(path, options):
+    """Decode one import source into [(image data, direction, delay, x offset, y offset, trim)]
+    
+    path is a still image, an animated GIF/APNG/WebP, a grid sprite sheet
+    (options["grid"] = (cell width, cell height)) or an atlas JSON. Frames are
+    fitted to options["width"] x options["height"] when those are set;
+    direction and delay come from sheet metadata, then from the
+    options["direction_pattern"] / options["delay_pattern"] regexes applied to
+    the file name, then from the defaults. With options["trim"] frames are
+    trimmed to their visible bounds. Runs on worker threads.
+    """
+    import numpy as np
+    from PIL import Image
+    width, height = options["width"], options["height"]
+    
+    def named_value(pattern, name, default):
+        match = pattern.search(name) if pattern is not None else None
+        return int(match.group(1)) if match else default
+    
+    def make_frame(image, name, info=None, source_data=None):
+        info = info or {}
+        if width > 0 and height > 0 and (image.width(), image.height()) != (width, height):
+            image = resize_image(image, width, height, options["resample"], options["fit"])
+            source_data = None
+        trim = None
+        if options.get("trim"):
+            image, trim = trim_image(image)
+            if trim is not None:
+                source_data = None
+        # Unchanged PNG files are kept byte for byte instead of re-encoded
+        data = source_data if source_data is not None else image_to_png_bytes(image)
+        direction = info.get("direction", named_value(options["direction_pattern"], name, 0))
+        delay = info.get("delay", named_value(options["delay_pattern"], name, options["delay"]))
+        return data, direction, delay, info.get("x_offset", 0), info.get("y_offset", 0), trim
+    
+    name = os.path.basename(path)
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".json":
+        frames, pages = [], {}
+        for page, (x, y, w, h), rotated, (trim_x, trim_y, source_w, source_h), info in read_atlas_json(path):
+            if page not in pages:
+                pages[page] = qimage_to_array(load_image_file(page))
+            sprite = pages[page][y:y + (w if rotated else h), x:x + (h if rotated else w)]
+            if rotated:
+                sprite = np.rot90(sprite, 1)
+            canvas = np.zeros((source_h, source_w, 4), np.uint8)
+            canvas[trim_y:trim_y + sprite.shape[0], trim_x:trim_x + sprite.shape[1]] = sprite
+            frames.append(make_frame(array_to_qimage(canvas), info.get("name", name), info))
+        return frames
+        
+    if extension in (".gif", ".png", ".webp"):
+        with Image.open(path) as pil_image:
+            if getattr(pil_image, "n_frames", 1) > 1:
+                frames = []
+                for index in range(pil_image.n_frames):
+                    pil_image.seek(index)
+                    info = {}
+                    if pil_image.info.get("duration"):
+                        info["delay"] = int(pil_image.info["duration"])
+                    frames.append(make_frame(pil_to_qimage(pil_image), name, info))
+                return frames
+                
+    if options["grid"]:
+        cell_width, cell_height = options["grid"]
+        sheet = load_image_file(path)
+        return [make_frame(sheet.copy(x, y, cell_width, cell_height), name)
+                for y in range(0, sheet.height() - cell_height + 1, cell_height)
+                for x in range(0, sheet.width() - cell_width + 1, cell_width)]
+        
+    with open(path, "rb") as f:
+        data = f.read()
+    image = QImage.fromData(data)
+    if image.isNull():
+        image = load_image_file(path)
+    source_data = data if data.startswith(PNG_SIGNATURE) else None
+    return [make_frame(image, name, source_data=source_data)]
+
+
+def decode_tga(image_data, width, height, bits_per_pixel=32, image_descriptor=0):
+    """Decode TGA image data"""
+    try:
+        bytes_per_pixel = bits_per_pixel // 8
+        expected_size = width * height * bytes_per_pixel
+
+        print(f"Decode TGA: {width}x{height}, {bits_per_pixel}bpp")
+        print(f"Expected data size: {expected_size}, actual: {len(image_data)}")
+
+        if len(image_data) < expected_size:
+            print(f"Warning: Data size mismatch, using available data")
+
+        if bits_per_pixel == 32:
+            # 32-bit BGRA
+            qimage = QImage(width, height, QImage.Format_ARGB32)
+
+            for y in range(height):
+                for x in range(width):
+                    pixel_idx = (y * width + x) * 4
+                    if pixel_idx + 3 < len(image_data):
+                        b = image_data[pixel_idx]
+                        g = image_data[pixel_idx + 1]
+                        r = image_data[pixel_idx + 2]
+                        a = image_data[pixel_idx + 3]
+
+                        # Kiểm tra origin (TGA có thể có origin ở dưới)
+                        actual_y = height - 1 - y if (image_descriptor & 0x20) == 0 else y
+                        qimage.setPixel(x, actual_y, qRgba(r, g, b, a))
+
+        elif bits_per_pixel == 24:
+            # 24-bit BGR
+            qimage = QImage(width, height, QImage.Format_RGB888)
+
+            for y in range(height):
+                for x in range(width):
+                    pixel_idx = (y * width + x) * 3
+                    if pixel_idx + 2 < len(image_data):
+                        b = image_data[pixel_idx]
+                        g = image_data[pixel_idx + 1]
+                        r = image_data[pixel_idx + 2]
+
+                        actual_y = height - 1 - y if (image_descriptor & 0x20) == 0 else y
+                        qimage.setPixel(x, actual_y, qRgb(r, g, b))
+        else:
+            print(f"Unsupported bit depth: {bits_per_pixel}")
+            return None
+
+        return qimage
+
+    except Exception as e:
+        print(f"Decode error: {e}")
+        return None
+
+
+def decode_rle_tga(image_data, width, height, bits_per_pixel, image_descriptor):
+    """Decode RLE compressed TGA"""
+    try:
+        bytes_per_pixel = bits_per_pixel // 8
+        pixels = []
+        i = 0
+
+        print(f"Decoding RLE TGA: {width}x{height}, {bits_per_pixel}bpp")
+
+        while i < len(image_data) and len(pixels) < width * height * bytes_per_pixel:
+            if i >= len(image_data):
+                break
+
+            packet_header = image_data[i]
+            i += 1
+
+            if packet_header & 0x80:  # RLE packet
+                count = (packet_header & 0x7F) + 1
+                if i + bytes_per_pixel <= len(image_data):
+                    pixel_data = image_data[i:i + bytes_per_pixel]
+                    i += bytes_per_pixel
+
+                    # Repeat pixel
+                    for _ in range(count):
+                        pixels.extend(pixel_data)
+                        if len(pixels) >= width * height * bytes_per_pixel:
+                            break
+            else:  # Raw packet
+                count = (packet_header & 0x7F) + 1
+                for _ in range(count):
+                    if i + bytes_per_pixel <= len(image_data):
+                        pixels.extend(image_data[i:i + bytes_per_pixel])
+                        i += bytes_per_pixel
+                    if len(pixels) >= width * height * bytes_per_pixel:
+                        break
+
+        print(f"RLE decoded {len(pixels)} bytes")
+
+        # Tạo QImage từ decoded pixels
+        if bits_per_pixel == 32:
+            qimage = QImage(width, height, QImage.Format_ARGB32)
+
+            for y in range(height):
+                for x in range(width):
+                    pixel_idx = (y * width + x) * 4
+                    if pixel_idx + 3 < len(pixels):
+                        b = pixels[pixel_idx]
+                        g = pixels[pixel_idx + 1]
+                        r = pixels[pixel_idx + 2]
+                        a = pixels[pixel_idx + 3]
+
+                        actual_y = height - 1 - y if (image_descriptor & 0x20) == 0 else y
+                        qimage.setPixel(x, actual_y, qRgba(r, g, b, a))
+
+        elif bits_per_pixel == 24:
+            qimage = QImage(width, height, QImage.Format_RGB888)
+
+            for y in range(height):
+                for x in range(width):
+                    pixel_idx = (y * width + x) * 3
+                    if pixel_idx + 2 < len(pixels):
+                        b = pixels[pixel_idx]
+                        g = pixels[pixel_idx + 1]
+                        r = pixels[pixel_idx + 2]
+
+                        actual_y = height - 1 - y if (image_descriptor & 0x20) == 0 else y
+                        qimage.setPixel(x, actual_y, qRgb(r, g, b))
+        else:
+            return None
+
+        return qimage
+
+    except Exception as e:
+        print(f"RLE decode error: {e}")
+        return None
+
+
+def spr_frame_loader(raw_data, width, height, file_path, mtime, disk_cache=None, trim=False):
+    """Return a loader that turns raw SPR frame data into PNG image data
+
+    The disk cache is checked before running the (slow) TGA decoder. With trim,
+    the image is cut to its visible bounds and the origin left in load.trim.
+    """
+    def load():
+        # Always use manual decode for SPR (do not try QImage.loadFromData with TGA)
+        with PROFILER.span("decode_tga", bytes=len(raw_data)):
+            image = decode_tga(raw_data, width, height)
+        if not image:
+            print(f"Failed to decode frame from {file_path}")
+            return None
+        if trim:
+            image, load.trim = trim_image(image)
+        return image_to_png_bytes(image)
+    load.trim = None
+    load.resident_bytes = len(raw_data)
+    return disk_cached_loader(load, "spr-trimmed" if trim else "spr", raw_data,
+                              file_path, mtime, disk_cache)
+
+
+def read_spr_document(file_path, disk_cache=None, trim=False, offset=0):
+    """Read an SPR file (or one embedded at a byte offset) into (header, frames)
+
+    Frame images are decoded lazily, on first access to ASFFrame.image_data,
+    and trimmed to their visible bounds if trim is set.
+    """
+    mtime = os.stat(file_path).st_mtime_ns
+    with open(file_path, "rb") as f:
+        f.seek(offset)
+        # Read and validate header
+        signature = f.read(3).decode('ascii')
+        if signature != "SPR":
+            raise ValueError("Invalid SPR file signature")
+
+        # Read header data
+        header = SPRHeader()
+        header.version = struct.unpack("<f", f.read(4))[0]
+        header.frame_count = struct.unpack("<I", f.read(4))[0]
+        header.width = struct.unpack("<I", f.read(4))[0]
+        header.height = struct.unpack("<I", f.read(4))[0]
+        header.direction_count = struct.unpack("<I", f.read(4))[0]
+
+        # Read frame data
+        frames = []
+        for i in range(header.frame_count):
+            frame = ASFFrame()
+            frame.direction = struct.unpack("<I", f.read(4))[0]
+            data_size = struct.unpack("<I", f.read(4))[0]
+            raw_data = f.read(data_size)
+            frame.set_loader(spr_frame_loader(raw_data, header.width, header.height,
+                                              file_path, mtime, disk_cache, trim))
+            frames.append(frame)
+            
+    return header, frames
+
+
+def read_asf_document(file_path, trim=False, frame_cache=None, offset=0, disk_cache=None):
+    """Read an ASF file (or one embedded at a byte offset) into (header, frames)
+    
+    With trim, frames are trimmed to their visible bounds on first access.
+    Delta frames are rebuilt lazily from their keyframe, decoded through
+    frame_cache when one is given. Trimmed and rebuilt frames are kept in
+    disk_cache; other payloads are stored as PNG and used as read.
+    """
+    mtime = os.stat(file_path).st_mtime_ns
+    with open(file_path, "rb") as f:
+        f.seek(offset)
+        # Read and validate header
+        signature = f.read(3).decode('ascii')
+        if signature != "ASF":
+            raise ValueError("Invalid ASF file signature")
+
+        # Read header data
+        header = ASFHeader()
+        header.version = struct.unpack("<f", f.read(4))[0]
+        header.frame_count = struct.unpack("<I", f.read(4))[0]
+        header.width = struct.unpack("<I", f.read(4))[0]
+        header.height = struct.unpack("<I", f.read(4))[0]
+        header.direction_count = struct.unpack("<I", f.read(4))[0]
+
+        # Read frame data (stored already encoded, so no decoding is needed)
+        frames = []
+        file_datas = []
+        for i in range(header.frame_count):
+            frame = ASFFrame()
+            frame.direction = struct.unpack("<I", f.read(4))[0]
+            frame.x_offset = struct.unpack("<i", f.read(4))[0]
+            frame.y_offset = struct.unpack("<i", f.read(4))[0]
+            frame.delay = struct.unpack("<I", f.read(4))[0]
+            data_size = struct.unpack("<I", f.read(4))[0]
+            frame.image_data = f.read(data_size) if data_size else None
+            file_datas.append(frame.image_data)
+            if frame.image_data and frame.image_data.startswith(DELTA_MAGIC):
+                key_index = DELTA_HEADER.unpack_from(frame.image_data, len(DELTA_MAGIC))[0]
+                if key_index >= i or not file_datas[key_index] or \
+                        file_datas[key_index].startswith(DELTA_MAGIC):
+                    raise ValueError(f"Frame {i} refers to an invalid keyframe {key_index}")
+                key_data, record = file_datas[key_index], frame.image_data
+                frame.set_loader(disk_cached_loader(
+                    delta_frame_loader(key_data, record, frame_cache, trim),
+                    "asf-delta-trimmed" if trim else "asf-delta",
+                    lambda key_data=key_data, record=record: key_data + record,
+                    file_path, mtime, disk_cache))
+            elif trim and frame.image_data:
+                frame.set_loader(disk_cached_loader(trimming_loader(frame.image_data), "asf-trimmed",
+                                                    frame.image_data, file_path, mtime, disk_cache))
+            frames.append(frame)
+            
+    return header, frames
+
+
+def write_asf_document(file_path, header, frames, direction_count=None,
+                       keyframe_interval=0, frame_cache=None):
+    """Write frames to an ASF file
+    
+    With keyframe_interval > 1 frames may be stored as deltas against a
+    keyframe (see delta_encode_frames) and the file version is set to
+    ASF_DELTA_VERSION; readers older than delta support cannot open it.
+    Returns the number of image bytes written.
+    """
+    if keyframe_interval > 1:
+        datas = delta_encode_frames(frames, keyframe_interval, frame_cache)
+    else:
+        datas = (frame_file_data(frame) for frame in frames)
+    version = header.version
+    if keyframe_interval > 1:
+        version = ASF_DELTA_VERSION
+    elif version == ASF_DELTA_VERSION:
+        version = 1.0  # No deltas left, so older readers can open it again
+    if direction_count is None:
+        direction_count = header.direction_count
+    
+    image_bytes = 0
+    with open(file_path, "wb") as f:
+        # Write signature and header
+        f.write("ASF".encode('ascii'))
+        f.write(struct.pack("<f", version))
+        f.write(struct.pack("<I", len(frames)))
+        f.write(struct.pack("<I", header.width))
+        f.write(struct.pack("<I", header.height))
+        f.write(struct.pack("<I", direction_count))
+        
+        # Write frame data
+        for frame, image_data in zip(frames, datas):
+            f.write(struct.pack("<I", frame.direction))
+            f.write(struct.pack("<i", frame.x_offset))
+            f.write(struct.pack("<i", frame.y_offset))
+            f.write(struct.pack("<I", frame.delay))
+            
+            # Write frame data size and data (trimmed frames are saved at full size)
+            if image_data:
+                f.write(struct.pack("<I", len(image_data)))
+                f.write(image_data)
+                image_bytes += len(image_data)
+            else:
+                f.write(struct.pack("<I", 0))
+    return image_bytes
+
+
+def write_spr_document(file_path, header, frames, direction_count=None):
+    """Write frames to an SPR file; returns the number of image bytes written"""
+    if direction_count is None:
+        direction_count = header.direction_count
+        
+    image_bytes = 0
+    with open(file_path, "wb") as f:
+        # Write signature and header
+        f.write("SPR".encode('ascii'))
+        f.write(struct.pack("<f", 1.0))  # Version
+        f.write(struct.pack("<I", len(frames)))
+        f.write(struct.pack("<I", header.width))
+        f.write(struct.pack("<I", header.height))
+        f.write(struct.pack("<I", direction_count))
+        
+        # Write frame data
+        for frame in frames:
+            f.write(struct.pack("<I", frame.direction))
+            
+            # Write frame data size and data (trimmed frames are saved at full size)
+            image_data = frame_file_data(frame)
+            if image_data:
+                f.write(struct.pack("<I", len(image_data)))
+                f.write(image_data)
+                image_bytes += len(image_data)
+            else:
+                f.write(struct.pack("<I", 0))
+    return image_bytes
+
+
+# Frame table records, read without touching the image payloads
+DOCUMENT_HEADER = struct.Struct("<3sfIIII")   # signature, version, frames, width, height, directions
+ASF_FRAME_RECORD = struct.Struct("<IiiII")    # direction, x offset, y offset, delay, data size
+SPR_FRAME_RECORD = struct.Struct("<II")       # direction, data size
+
+# One frame table entry; offsets and delay are None for SPR frames, digest None unless hashed
+FrameEntry = namedtuple("FrameEntry", ["direction", "x_offset", "y_offset", "delay",
+                                       "size", "data_offset", "digest"])
+
+
+def payload_digest(data):
+    """Content hash of an encoded frame payload"""
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def read_frame_table(file_path, hash_payloads=True, offset=0):
+    """Read an ASF or SPR header and frame table without decoding any image
+    
+    Returns (header, entries). Payloads are skipped with a seek, or read and
+    hashed when hash_payloads is set. Raises ValueError if the frame chain
+    runs past the end of the file.
+    """
+    with open(file_path, "rb") as f:
+        file_size = os.fstat(f.fileno()).st_size
+        f.seek(offset)
+        data = f.read(DOCUMENT_HEADER.size)
+        if len(data) < DOCUMENT_HEADER.size:
+            raise ValueError("File is too short for a header")
+        signature, version, frame_count, width, height, direction_count = DOCUMENT_HEADER.unpack(data)
+        if signature == b"ASF":
+            header, record = ASFHeader(), ASF_FRAME_RECORD
+        elif signature == b"SPR":
+            header, record = SPRHeader(), SPR_FRAME_RECORD
+        else:
+            raise ValueError("Invalid ASF/SPR file signature")
+        header.version, header.frame_count = version, frame_count
+        header.width, header.height, header.direction_count = width, height, direction_count
+        
+        entries = []
+        position = offset + DOCUMENT_HEADER.size
+        for i in range(frame_count):
+            data = f.read(record.size)
+            if len(data) < record.size:
+                raise ValueError(f"Frame table ends early, at frame {i} of {frame_count}")
+            if record is ASF_FRAME_RECORD:
+                direction, x_offset, y_offset, delay, size = record.unpack(data)
+            else:
+                (direction, size), x_offset, y_offset, delay = record.unpack(data), None, None, None
+            position += record.size
+            if position + size > file_size:
+                raise ValueError(f"Frame {i} runs past the end of the file")
+            if hash_payloads:
+                digest = payload_digest(f.read(size))
+            else:
+                digest = None
+                f.seek(size, os.SEEK_CUR)
+            entries.append(FrameEntry(direction, x_offset, y_offset, delay, size, position, digest))
+            position += size
+    return header, entries
+
+
+# Result of diff_documents for one frame: status is "unchanged", "metadata" (same
+# payload in place, other fields changed), "moved", "modified", "added" or "removed";
+# fields maps changed metadata names to (old, new)
+FrameChange = namedtuple("FrameChange", ["status", "old_index", "new_index", "fields"])
+
+DIFF_HEADER_FIELDS = ("signature", "version", "width", "height", "direction_count")
+DIFF_FRAME_FIELDS = ("direction", "x_offset", "y_offset", "delay")
+
+
+def frame_metadata_changes(old, new):
+    return {name: (getattr(old, name), getattr(new, name)) for name in DIFF_FRAME_FIELDS
+            if getattr(old, name) != getattr(new, name)}
+
+
+def diff_documents(old_path, new_path):
+    """Compare two ASF/SPR files frame by frame without decoding any image
+    
+    Frames are aligned by payload hash: a longest-common-subsequence match
+    keeps order, identical payloads elsewhere count as moved, and leftovers
+    in the same changed region pair up as modified. Returns
+    (header changes as {field: (old, new)}, [FrameChange]).
+    """
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        (old_header, old_entries), (new_header, new_entries) = pool.map(read_frame_table,
+                                                                        (old_path, new_path))
+    header_changes = {name: (getattr(old_header, name), getattr(new_header, name))
+                      for name in DIFF_HEADER_FIELDS
+                      if getattr(old_header, name) != getattr(new_header, name)}
+    
+    from difflib import SequenceMatcher
+    old_digests = [entry.digest for entry in old_entries]
+    new_digests = [entry.digest for entry in new_entries]
+    pairs = []                # (status, old index, new index)
+    unmatched = []            # (old indices, new indices) of each changed region
+    matcher = SequenceMatcher(None, old_digests, new_digests, autojunk=False)
+    for tag, old_start, old_end, new_start, new_end in matcher.get_opcodes():
+        if tag == "equal":
+            pairs.extend(("unchanged", old_start + k, new_start + k) for k in range(old_end - old_start))
+        else:
+            unmatched.append((list(range(old_start, old_end)), list(range(new_start, new_end))))
+    
+    # Payloads that left one region and reappear in another were moved
+    removed_by_digest = {}
+    for old_indices, _ in unmatched:
+        for i in old_indices:
+            removed_by_digest.setdefault(old_digests[i], deque()).append(i)
+    moved_old = set()
+    for region, (old_indices, new_indices) in enumerate(unmatched):
+        remaining = []
+        for j in new_indices:
+            candidates = removed_by_digest.get(new_digests[j])
+            if candidates:
+                i = candidates.popleft()
+                moved_old.add(i)
+                pairs.append(("moved", i, j))
+            else:
+                remaining.append(j)
+        unmatched[region] = (old_indices, remaining)
+    
+    for old_indices, new_indices in unmatched:
+        old_indices = [i for i in old_indices if i not in moved_old]
+        for i, j in itertools.zip_longest(old_indices, new_indices):
+            if i is None:
+                pairs.append(("added", None, j))
+            elif j is None:
+                pairs.append(("removed", i, None))
+            else:
+                pairs.append(("modified", i, j))
+    
+    # Order by position in the new file; a removed frame goes just after
+    # wherever the old frame before it ended up
+    new_position = {i: j for _, i, j in pairs if i is not None and j is not None}
+    anchor, last = {}, -1
+    for i in range(len(old_entries)):
+        last = new_position.get(i, last)
+        anchor[i] = last
+    
+    changes = []
+    for status, i, j in pairs:
+        fields = {}
+        if i is not None and j is not None:
+            fields = frame_metadata_changes(old_entries[i], new_entries[j])
+        if status == "unchanged" and fields:
+            status = "metadata"
+        changes.append(FrameChange(status, i, j, fields))
+    changes.sort(key=lambda change: (change.new_index, 0) if change.new_index is not None
+                 else (anchor[change.old_index] + 0.5, change.old_index))
+    return header_changes, changes
+
+
+def describe_frame_change(change):
+    """One-line description of a FrameChange's metadata differences"""
+    return ", ".join(f"{name.replace('_', ' ')} {old} -> {new}" for name, (old, new) in change.fields.items())
+
+
+# A document found inside another file by scan_embedded; length covers header and frames
+EmbeddedDocument = namedtuple("EmbeddedDocument", ["offset", "kind", "version", "frame_count", "width",
+                                                   "height", "direction_count", "length"])
+
+SCAN_SIGNATURES = (b"ASF", b"SPR")
+SCAN_WINDOW = 64 * 1024 * 1024
+# Limits a real header stays within; they reject nearly all chance signature matches
+SCAN_MAX_FRAMES = 100000
+SCAN_MAX_SIZE = 16384
+SCAN_MAX_DIRECTIONS = 256
+SCAN_MAX_OFFSET = 1 << 20
+
+
+def validate_embedded(data, offset):
+    """Check a candidate header and its frame chain in a buffer, without decoding
+    
+    Returns an EmbeddedDocument, or None if the header is implausible or any
+    frame record runs past the end of the buffer.
+    """
+    end = len(data)
+    if offset + DOCUMENT_HEADER.size > end:
+        return None
+    signature, version, frame_count, width, height, direction_count = DOCUMENT_HEADER.unpack_from(data, offset)
+    if not (0 < version < 100 and 0 < frame_count <= SCAN_MAX_FRAMES and
+            width <= SCAN_MAX_SIZE and height <= SCAN_MAX_SIZE and
+            direction_count <= SCAN_MAX_DIRECTIONS):
+        return None
+    directions = max(direction_count, 1)
+    is_asf = signature == b"ASF"
+    record = ASF_FRAME_RECORD if is_asf else SPR_FRAME_RECORD
+    position = offset + DOCUMENT_HEADER.size
+    for i in range(frame_count):
+        if position + record.size > end:
+            return None
+        if is_asf:
+            direction, x_offset, y_offset, delay, size = record.unpack_from(data, position)
+            if abs(x_offset) > SCAN_MAX_OFFSET or abs(y_offset) > SCAN_MAX_OFFSET:
+                return None
+        else:
+            direction, size = record.unpack_from(data, position)
+        position += record.size
+        if direction >= directions or position + size > end:
+            return None
+        if is_asf and size >= len(DELTA_MAGIC) + DELTA_HEADER.size and \
+                data[position:position + len(DELTA_MAGIC)] == DELTA_MAGIC:
+            if DELTA_HEADER.unpack_from(data, position + len(DELTA_MAGIC))[0] >= i:
+                return None
+        position += size
+    return EmbeddedDocument(offset, signature.decode("ascii"), version, frame_count, width, height,
+                            direction_count, position - offset)
+
+
+def scan_embedded(file_path, progress=None, cancelled=None):
+    """Find valid ASF/SPR documents anywhere inside a file of any size
+    
+    The file is memory-mapped and searched a window at a time, so every
+    signature is found in one sequential pass. Candidates inside a document
+    already found are skipped. progress(done, total) is called with counts
+    of SCAN_WINDOW-sized windows; returns [EmbeddedDocument] in file order.
+    """
+    import mmap
+    found = []
+    with open(file_path, "rb") as f:
+        total = os.fstat(f.fileno()).st_size
+        if total == 0:
+            return found
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            if hasattr(mmap, "MADV_SEQUENTIAL"):
+                data.madvise(mmap.MADV_SEQUENTIAL)
+            covered = 0  # End of the last document found
+            windows = range(0, total, SCAN_WINDOW)
+            for window, start in enumerate(windows):
+                if cancelled is not None and cancelled():
+                    break
+                # Overlap windows so a signature on the boundary is still found
+                stop = min(start + SCAN_WINDOW + len(SCAN_SIGNATURES[0]) - 1, total)
+                candidates = []
+                for signature in SCAN_SIGNATURES:
+                    position = data.find(signature, start, stop)
+                    while position != -1:
+                        candidates.append(position)
+                        position = data.find(signature, position + 1, stop)
+                for position in sorted(candidates):
+                    if position < covered:
+                        continue
+                    document = validate_embedded(data, position)
+                    if document is not None:
+                        found.append(document)
+                        covered = position + document.length
+                if progress is not None:
+                    progress(window + 1, len(windows))
+    return found
+
+
+def extract_embedded(file_path, documents, output_dir):
+    """Copy embedded documents out to their own .asf/.spr files; returns the new paths"""
+    os.makedirs(output_dir, exist_ok=True)
+    stem = os.path.splitext(os.path.basename(file_path))[0]
+    paths = []
+    with open(file_path, "rb") as source:
+        for document in documents:
+            path = os.path.join(output_dir, f"{stem}_{document.offset:010x}.{document.kind.lower()}")
+            source.seek(document.offset)
+            remaining = document.length
+            with open(path, "wb") as f:
+                while remaining:
+                    chunk = source.read(min(remaining, 1 << 20))
+                    if not chunk:
+                        raise ValueError(f"{file_path} ends inside the document at {document.offset:#x}")
+                    f.write(chunk)
+                    remaining -= len(chunk)
+            paths.append(path)
+    return paths
+
+
+CATALOGUE_EXTENSIONS = (".asf", ".spr")
+
+
+PHASH_METHODS = ("dhash", "ahash")
+PHASH_MAX_DISTANCE = 16
+
+
+def perceptual_hash_file(path):
+    """(path, [(frame index, aHash, dHash)], error) for an ASF/SPR file; runs in worker processes"""
+    from contextlib import redirect_stdout
+    try:
+        # The decoders print progress; keep it out of the parent's console
+        with redirect_stdout(io.StringIO()):
+            _, frames = read_document(path)
+            hashes = []
+            for i, frame in enumerate(frames):
+                image = decode_frame(frame)
+                if image is not None and not image.isNull():
+                    hashes.append((i, *perceptual_hashes(image)))
+    except (OSError, ValueError, struct.error) as e:
+        return path, None, str(e)
+    return path, hashes, None
+
+
+def hamming_neighbours(value, bits, radius):
+    """Every bits-wide value within radius bit flips of value"""
+    neighbours = [value]
+    for count in range(1, radius + 1):
+        for positions in itertools.combinations(range(bits), count):
+            flipped = value
+            for position in positions:
+                flipped ^= 1 << position
+            neighbours.append(flipped)
+    return neighbours
+
+
+def signed_int64(value):
+    """Store an unsigned 64-bit hash in an SQLite INTEGER"""
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+class AssetCatalogue:
+    """SQLite index of ASF/SPR file headers and frame tables for fast searching
+    
+    scan() walks directory trees and re-reads only files whose mtime or size
+    changed; frame tables are read (and payloads hashed) on a thread pool.
+    """
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS files (
+            id INTEGER PRIMARY KEY,
+            path TEXT UNIQUE NOT NULL,
+            kind TEXT,
+            mtime_ns INTEGER,
+            size INTEGER,
+            version REAL,
+            width INTEGER,
+            height INTEGER,
+            direction_count INTEGER,
+            frame_count INTEGER,
+            min_delay INTEGER,
+            max_delay INTEGER,
+            duration INTEGER,
+            content_hash TEXT,
+            error TEXT
+        );
+        CREATE TABLE IF NOT EXISTS frames (
+            file_id INTEGER NOT NULL REFERENCES files(id) ON DELETE CASCADE,
+            idx INTEGER NOT NULL,
+            direction INTEGER,
+            x_offset INTEGER,
+            y_offset INTEGER,
+            delay INTEGER,
+            size INTEGER,
+            hash TEXT,
+            PRIMARY KEY (file_id, idx)
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS files_size ON files(width, height);
+        CREATE INDEX IF NOT EXISTS files_directions ON files(direction_count);
+        CREATE INDEX IF NOT EXISTS files_min_delay ON files(min_delay);
+        CREATE INDEX IF NOT EXISTS files_content ON files(content_hash);
+        CREATE INDEX IF NOT EXISTS frames_hash ON frames(hash);
+        CREATE TABLE IF NOT EXISTS phashes (
+            file_id INTEGER NOT NULL REFERENCES files(id) ON DELETE CASCADE,
+            idx INTEGER NOT NULL,
+            method TEXT NOT NULL,
+            hash INTEGER NOT NULL,
+            c0 INTEGER, c1 INTEGER, c2 INTEGER, c3 INTEGER,
+            PRIMARY KEY (file_id, idx, method)
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS phashes_c0 ON phashes(method, c0, hash);
+        CREATE INDEX IF NOT EXISTS phashes_c1 ON phashes(method, c1, hash);
+        CREATE INDEX IF NOT EXISTS phashes_c2 ON phashes(method, c2, hash);
+        CREATE INDEX IF NOT EXISTS phashes_c3 ON phashes(method, c3, hash);
+        CREATE TABLE IF NOT EXISTS phashed_files (
+            file_id INTEGER PRIMARY KEY REFERENCES files(id) ON DELETE CASCADE,
+            error TEXT
+        );
+    """
+    
+    # Columns returned by query(), in order
+    COLUMNS = ["path", "kind", "width", "height", "direction_count", "frame_count",
+               "min_delay", "max_delay", "size"]
+    
+    def __init__(self, db_path=None):
+        import sqlite3
+        if db_path is None:
+            db_path = self.default_path()
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self.db_path = db_path
+        # Scans run on a worker thread while the dialog waits, never concurrently
+        self.db = sqlite3.connect(db_path, check_same_thread=False)
+        self.db.execute("PRAGMA foreign_keys = ON")
+        self.db.execute("PRAGMA journal_mode = WAL")
+        self.db.executescript(self.SCHEMA)
+    
+    @staticmethod
+    def default_path():
+        return os.path.join(QStandardPaths.writableLocation(QStandardPaths.GenericDataLocation),
+                            "pyasftool", "catalogue.sqlite")
+    
+    def close(self):
+        self.db.close()
+    
+    @staticmethod
+    def index_file(path):
+        """Read one file's metadata for the catalogue (runs on worker threads)"""
+        try:
+            header, entries = read_frame_table(path)
+        except (OSError, ValueError) as e:
+            return path, None, None, str(e)
+        return path, header, entries, None
+    
+    def scan(self, roots, progress=None, cancelled=None, workers=None):
+        """Index every ASF/SPR file under roots, skipping files unchanged since the last scan
+        
+        Files under roots that no longer exist are dropped. progress(done, total)
+        is called as files are read; returns {"found", "indexed", "removed", "errors"}.
+        """
+        found = {}
+        for root in roots:
+            root = os.path.abspath(root)
+            if os.path.isfile(root):
+                walk = [(os.path.dirname(root), [], [os.path.basename(root)])]
+            else:
+                walk = os.walk(root)
+            for directory, _, names in walk:
+                for name in names:
+                    if name.lower().endswith(CATALOGUE_EXTENSIONS):
+                        path = os.path.join(directory, name)
+                        try:
+                            stat = os.stat(path)
+                        except OSError:
+                            continue
+                        found[path] = (stat.st_mtime_ns, stat.st_size)
+        
+        known = {}
+        for root in roots:
+            root = os.path.abspath(root)
+            prefix = root if os.path.isfile(root) else os.path.join(root, "")
+            rows = self.db.execute("SELECT path, mtime_ns, size FROM files WHERE path = ? OR "
+                                   "substr(path, 1, ?) = ?", (root, len(prefix), prefix))
+            known.update((path, (mtime, size)) for path, mtime, size in rows)
+        removed = [path for path in known if path not in found]
+        changed = [path for path, stamp in found.items() if known.get(path) != stamp]
+        
+        stats = {"found": len(found), "indexed": 0, "removed": len(removed), "errors": 0}
+        with self.db:
+            self.db.executemany("DELETE FROM files WHERE path = ?", ((path,) for path in removed))
+        
+        with ThreadPoolExecutor(max_workers=workers or min(32, (os.cpu_count() or 4) * 4)) as pool:
+            # Commit in batches so an interrupted scan keeps what it finished
+            for batch_start in range(0, len(changed), 500):
+                if cancelled is not None and cancelled():
+                    break
+                batch = changed[batch_start:batch_start + 500]
+                with self.db:
+                    for path, header, entries, error in pool.map(self.index_file, batch):
+                        self.store(path, found[path], header, entries, error)
+                        stats["indexed"] += 1
+                        stats["errors"] += error is not None
+                if progress is not None:
+                    progress(min(batch_start + 500, len(changed)), len(changed))
+        return stats
+    
+    def store(self, path, stamp, header, entries, error):
+        """Replace one file's rows (call inside a transaction)"""
+        self.db.execute("DELETE FROM files WHERE path = ?", (path,))
+        if header is None:
+            self.db.execute("INSERT INTO files (path, mtime_ns, size, error) VALUES (?, ?, ?, ?)",
+                            (path, stamp[0], stamp[1], error))
+            return
+        delays = [entry.delay for entry in entries if entry.delay is not None]
+        content = hashlib.blake2b(digest_size=16)
+        for entry in entries:
+            content.update(bytes.fromhex(entry.digest))
+        cursor = self.db.execute(
+            "INSERT INTO files (path, kind, mtime_ns, size, version, width, height, direction_count, "
+            "frame_count, min_delay, max_delay, duration, content_hash) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (path, header.signature, stamp[0], stamp[1], header.version, header.width, header.height,
+             header.direction_count, len(entries), min(delays, default=None), max(delays, default=None),
+             sum(delays) if delays else None, content.hexdigest()))
+        file_id = cursor.lastrowid
+        self.db.executemany(
+            "INSERT INTO frames (file_id, idx, direction, x_offset, y_offset, delay, size, hash) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            ((file_id, i, entry.direction, entry.x_offset, entry.y_offset, entry.delay,
+              entry.size, entry.digest) for i, entry in enumerate(entries)))
+    
+    def query(self, name=None, kind=None, min_width=None, max_width=None, min_height=None,
+              max_height=None, direction_count=None, min_frames=None, max_frames=None,
+              delay_below=None, content_hash=None, frame_hash=None, limit=1000):
+        """Return matching files as tuples of COLUMNS; None leaves a filter out"""
+        conditions, params = ["error IS NULL"], []
+        if name:
+            # Match the name literally so "_" and "%" are not wildcards
+            name = "%" + re.sub(r"([\\%_])", r"\\\1", name) + "%"
+        for clause, value in (("path LIKE ? ESCAPE '\\'", name or None),
+                              ("kind = ?", kind),
+                              ("width >= ?", min_width), ("width <= ?", max_width),
+                              ("height >= ?", min_height), ("height <= ?", max_height),
+                              ("direction_count = ?", direction_count),
+                              ("frame_count >= ?", min_frames), ("frame_count <= ?", max_frames),
+                              ("min_delay < ?", delay_below),
+                              ("content_hash = ?", content_hash),
+                              ("id IN (SELECT file_id FROM frames WHERE hash = ?)", frame_hash)):
+            if value is not None:
+                conditions.append(clause)
+                params.append(value)
+        sql = (f"SELECT {', '.join(self.COLUMNS)} FROM files WHERE {' AND '.join(conditions)} "
+               f"ORDER BY path LIMIT ?")
+        return self.db.execute(sql, params + [limit]).fetchall()
+    
+    def file_count(self):
+        return self.db.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+    
+    def hashed_frame_count(self):
+        return self.db.execute("SELECT COUNT(*) FROM phashes WHERE method = 'dhash'").fetchone()[0]
+    
+    def hash_frames(self, progress=None, cancelled=None, workers=None):
+        """Compute perceptual hashes for indexed files that have none yet
+        
+        Frames are decoded and hashed in a process pool; a file's hashes are
+        dropped with it when scan() re-indexes or removes it. Returns
+        {"files", "frames", "errors"}.
+        """
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+        pending = self.db.execute("SELECT id, path FROM files WHERE error IS NULL AND "
+                                  "id NOT IN (SELECT file_id FROM phashed_files)").fetchall()
+        file_ids = {path: file_id for file_id, path in pending}
+        stats = {"files": 0, "frames": 0, "errors": 0}
+        if not pending:
+            return stats
+        
+        # Spawned workers import only what they need and never inherit Qt state
+        with ProcessPoolExecutor(max_workers=workers or os.cpu_count() or 4,
+                                 mp_context=multiprocessing.get_context("spawn")) as pool:
+            for batch_start in range(0, len(pending), 200):
+                if cancelled is not None and cancelled():
+                    break
+                batch = [path for _, path in pending[batch_start:batch_start + 200]]
+                results = list(pool.map(perceptual_hash_file, batch, chunksize=4))
+                with self.db:
+                    for path, hashes, error in results:
+                        file_id = file_ids[path]
+                        self.db.execute("INSERT OR REPLACE INTO phashed_files (file_id, error) VALUES (?, ?)",
+                                        (file_id, error))
+                        stats["files"] += 1
+                        if error is not None:
+                            stats["errors"] += 1
+                            continue
+                        self.db.executemany(
+                            "INSERT OR REPLACE INTO phashes (file_id, idx, method, hash, c0, c1, c2, c3) "
+                            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                            ((file_id, idx, method, signed_int64(value),
+                              *((value >> shift) & 0xFFFF for shift in (48, 32, 16, 0)))
+                             for idx, ahash, dhash in hashes
+                             for method, value in (("ahash", ahash), ("dhash", dhash))))
+                        stats["frames"] += len(hashes)
+                if progress is not None:
+                    progress(min(batch_start + 200, len(pending)), len(pending))
+        return stats
+    
+    def find_similar(self, hash_value, method="dhash", max_distance=8, limit=100):
+        """Frames within max_distance bits of a perceptual hash, nearest first
+        
+        Uses multi-index hashing: the hash is split into four 16-bit chunks,
+        and any hash within d bits has some chunk within d // 4 bits of the
+        query's, so only rows matching one of those chunk values (found via
+        the chunk indexes) are compared. Returns [(distance, path, frame index)].
+        """
+        chunk_radius = max_distance // 4
+        candidates = {}
+        for chunk, shift in enumerate((48, 32, 16, 0)):
+            values = hamming_neighbours((hash_value >> shift) & 0xFFFF, 16, chunk_radius)
+            # Keep under SQLite's default limit on query parameters
+            for start in range(0, len(values), 900):
+                batch = values[start:start + 900]
+                rows = self.db.execute(f"SELECT file_id, idx, hash FROM phashes WHERE method = ? "
+                                       f"AND c{chunk} IN ({', '.join('?' * len(batch))})", [method, *batch])
+                for file_id, idx, stored in rows:
+                    candidates[file_id, idx] = stored
+        
+        matches = []
+        for (file_id, idx), stored in candidates.items():
+            distance = bin((stored & 0xFFFFFFFFFFFFFFFF) ^ hash_value).count("1")
+            if distance <= max_distance:
+                matches.append((distance, file_id, idx))
+        matches.sort()
+        matches = matches[:limit]
+        
+        file_ids = sorted({file_id for _, file_id, _ in matches})
+        paths = {}
+        for start in range(0, len(file_ids), 900):
+            batch = file_ids[start:start + 900]
+            paths.update(self.db.execute(f"SELECT id, path FROM files WHERE id IN "
+                                         f"({', '.join('?' * len(batch))})", batch))
+        return [(distance, paths[file_id], idx) for distance, file_id, idx in matches]
+
+
+ProfileEvent = namedtuple("ProfileEvent", ["name", "start", "duration", "thread", "args"])
+
+
+class ProfileSpan:
+    """Times one block of work for the Profiler; set() attaches byte counts and the like"""
+    __slots__ = ("profiler", "name", "args", "start")
+    
+    def __init__(self, profiler, name, args):
+        self.profiler = profiler
+        self.name = name
+        self.args = args
+    
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+    
+    def __exit__(self, exc_type, exc, traceback):
+        end = time.perf_counter()
+        if exc_type is not None:
+            self.args["error"] = exc_type.__name__
+        self.profiler.events.append(ProfileEvent(self.name, self.start - self.profiler.origin,
+                                                 end - self.start, threading.get_ident(), self.args))
+        return False
+    
+    def set(self, **args):
+        self.args.update(args)
+    
+    def __bool__(self):
+        return True
+
+
+class NullSpan:
+    """Stand-in span while profiling is off; false, so callers can skip measuring"""
+    __slots__ = ()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc, traceback):
+        return False
+    
+    def set(self, **args):
+        pass
+    
+    def __bool__(self):
+        return False
+
+
+NULL_SPAN = NullSpan()
+
+
+class Profiler:
+    """Opt-in ring buffer of timed spans over the load, decode, render, save and export paths
+    
+    While disabled, span() returns the shared NULL_SPAN, so instrumented code
+    pays for one attribute check. Appending to the deque is thread-safe, so
+    worker threads record spans directly.
+    """
+    def __init__(self, capacity=20000):
+        self.enabled = False
+        self.events = deque(maxlen=capacity)
+        self.origin = time.perf_counter()
+    
+    def span(self, name, **args):
+        if not self.enabled:
+            return NULL_SPAN
+        return ProfileSpan(self, name, args)
+    
+    def clear(self):
+        self.events.clear()
+    
+    def summary(self):
+        """Per span name: count, total/mean/max/last seconds and bytes, in first-seen order"""
+        stats = OrderedDict()
+        for event in list(self.events):
+            entry = stats.get(event.name)
+            if entry is None:
+                entry = stats[event.name] = {"count": 0, "total": 0.0, "max": 0.0, "bytes": 0}
+            entry["count"] += 1
+            entry["total"] += event.duration
+            entry["max"] = max(entry["max"], event.duration)
+            entry["last"] = event.duration
+            entry["bytes"] += event.args.get("bytes", 0)
+        for entry in stats.values():
+            entry["mean"] = entry["total"] / entry["count"]
+        return stats
+    
+    def write_json(self, file_path, extra=None):
+        """Dump the summary and every buffered event as JSON"""
+        data = {
+            "summary": self.summary(),
+            "events": [event._asdict() for event in list(self.events)],
+        }
+        if extra:
+            data.update(extra)
+        with open(file_path, "w") as f:
+            json.dump(data, f, indent=1, default=str)
+    
+    def write_chrome_trace(self, file_path):
+        """Dump the events in Chrome trace format (chrome://tracing, Perfetto)"""
+        pid = os.getpid()
+        trace = [{"name": event.name, "ph": "X", "pid": pid, "tid": event.thread,
+                  "ts": event.start * 1e6, "dur": event.duration * 1e6, "args": event.args}
+                 for event in list(self.events)]
+        with open(file_path, "w") as f:
+            json.dump({"traceEvents": trace, "displayTimeUnit": "ms"}, f, default=str)
+
+
+PROFILER = Profiler()  # Shared by the readers, caches and the editor window
+
+
+class DiskCache:
+    """Size-capped LRU cache of encoded frame data in the user cache directory
+
+    Entries are files named by key(); each hit refreshes the file's mtime,
+    which orders eviction once the cache grows past max_bytes.
+    """
+    def __init__(self, directory=None, max_bytes=512 * 1024 * 1024):
+        if directory is None:
+            directory = os.path.join(
+                QStandardPaths.writableLocation(QStandardPaths.GenericCacheLocation), "pyasftool")
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.enabled = True
+        self.entries = None  # name -> size, least recently used first
+        self.total_bytes = 0
+        self.lock = threading.Lock()
+    
+    @staticmethod
+    def key(kind, payload, file_path=None, mtime=None):
+        """Hash a payload together with the file it came from"""
+        digest = hashlib.blake2b(digest_size=20)
+        digest.update(f"{kind}|{file_path}|{mtime}|".encode('utf-8'))
+        digest.update(payload)
+        return digest.hexdigest()
+    
+    def scan(self):
+        """Index existing entries, oldest first (called with the lock held)"""
+        if self.entries is not None:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        found = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and not entry.name.endswith(".tmp"):
+                stat = entry.stat()
+                found.append((stat.st_mtime, entry.name, stat.st_size))
+        found.sort()
+        self.entries = OrderedDict((name, size) for _, name, size in found)
+        self.total_bytes = sum(self.entries.values())
+    
+    def get(self, key):
+        """Return cached bytes for key, or None"""
+        path = os.path.join(self.directory, key)
+        with self.lock:
+            self.scan()
+            if key not in self.entries:
+                return None
+            self.entries.move_to_end(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)
+            return data
+        except OSError:
+            with self.lock:
+                if self.entries.pop(key, None) is not None:
+                    self.total_bytes = sum(self.entries.values())
+            return None
+    
+    def put(self, key, data):
+        """Store bytes under key, evicting least recently used entries"""
+        path = os.path.join(self.directory, key)
+        try:
+            with self.lock:
+                self.scan()
+            # Write to a temporary name so readers never see partial entries
+            temp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(temp_path, "wb") as f:
+                f.write(data)
+            os.replace(temp_path, path)
+        except OSError as e:
+            print(f"Disk cache write failed: {e}")
+            return
+            
+        with self.lock:
+            self.total_bytes += len(data) - self.entries.pop(key, 0)
+            self.entries[key] = len(data)
+            while self.total_bytes > self.max_bytes and len(self.entries) > 1:
+                name, size = self.entries.popitem(last=False)
+                self.total_bytes -= size
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except OSError:
+                    pass
+    
+    def clear(self):
+        """Delete every cache entry"""
+        with self.lock:
+            self.scan()
+            for name in self.entries:
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except OSError:
+                    pass
+            self.entries.clear()
+            self.total_bytes = 0
+
+
+class FrameCache:
+    """Thread-safe LRU cache of decoded frame images
+
+    Entries are keyed by the identity of the encoded payload, so replacing a
+    frame's image_data automatically bypasses its old entry.
+    """
+    def __init__(self, max_bytes=256 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()  # id(data) -> (data, image, size)
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, data):
+        """Return the decoded QImage for an encoded payload"""
+        return self.lookup(data)[0]
+    
+    def lookup(self, data):
+        """Return (decoded QImage, whether it was already cached) for a payload"""
+        key = id(data)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] is data:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry[1], True
+            self.misses += 1
+            
+        # Decode outside the lock so worker threads can decode in parallel
+        with PROFILER.span("decode", bytes=len(data)):
+            image = QImage.fromData(data)
+        size = image.sizeInBytes()
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.total_bytes -= old[2]
+            self.entries[key] = (data, image, size)
+            self.total_bytes += size
+            while self.total_bytes > self.max_bytes and len(self.entries) > 1:
+                _, (_, _, evicted_size) = self.entries.popitem(last=False)
+                self.total_bytes -= evicted_size
+        return image, False
+
+    def decoded_bytes(self, data):
+        """Bytes of the cached decoded image for a payload (0 if not cached)"""
+        with self.lock:
+            entry = self.entries.get(id(data))
+            return entry[2] if entry is not None and entry[0] is data else 0
+
+    def discard(self, data):
+        """Drop the decoded image for a payload, returning the bytes freed"""
+        with self.lock:
+            entry = self.entries.get(id(data))
+            if entry is None or entry[0] is not data:
+                return 0
+            del self.entries[id(data)]
+            self.total_bytes -= entry[2]
+            return entry[2]
+
+    def trim(self):
+        """Evict least recently used images until within max_bytes"""
+        with self.lock:
+            while self.total_bytes > self.max_bytes and self.entries:
+                _, (_, _, evicted_size) = self.entries.popitem(last=False)
+                self.total_bytes -= evicted_size
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.total_bytes = 0
+
+
+class SpillStore:
+    """Append-only temporary file holding frame data moved out of memory"""
+    def __init__(self):
+        self.file = None
+        self.size = 0
+        self.lock = threading.Lock()
+
+    def spill(self, data):
+        """Write data to the store and return a loader that reads it back"""
+        with self.lock:
+            if self.file is None:
+                self.file = tempfile.TemporaryFile(prefix="pyasftool-spill-")
+            self.file.seek(0, os.SEEK_END)
+            offset = self.file.tell()
+            self.file.write(data)
+            self.size += len(data)
+        length = len(data)
+
+        def load():
+            with self.lock:
+                self.file.seek(offset)
+                return self.file.read(length)
+        return load
+
+    def close(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+                self.size = 0
+
+
+class MemoryManager:
+    """Keeps frame data and decoded images within a memory budget
+
+    Decoded images are evicted from the frame cache first. If usage still
+    exceeds the budget, the least recently used frames are spilled to a
+    temporary file and transparently reloaded on next access; each frame's
+    cost is its encoded data plus its decoded image (see frame_bytes).
+    """
+    def __init__(self, frame_cache, budget_bytes=1024 * 1024 * 1024):
+        self.frame_cache = frame_cache
+        self.budget_bytes = budget_bytes
+        self.spill_store = SpillStore()
+        self.spilled = weakref.WeakKeyDictionary()  # frame -> (revision, loader)
+        self.spilled_count = 0
+
+    def reset(self):
+        """Start a new spill file once the frames using the old one are gone"""
+        self.spill_store = SpillStore()
+        self.spilled = weakref.WeakKeyDictionary()
+
+    def frame_bytes(self, frame):
+        """Return (encoded bytes, decoded bytes) one frame holds in memory"""
+        data = frame.loaded_data
+        return frame.resident_bytes(), self.frame_cache.decoded_bytes(data) if data else 0
+
+    def usage(self, frames):
+        """Return (encoded bytes, decoded bytes) currently held in memory
+        
+        Decoded bytes cover the whole frame cache, including images of
+        payloads only held by undo history.
+        """
+        encoded = sum(frame.resident_bytes() for frame in frames)
+        return encoded, self.frame_cache.total_bytes
+
+    def enforce(self, frames, keep=()):
+        """Evict and spill until usage fits the budget; keep lists pinned frames
+
+        Returns the number of frames spilled.
+        """
+        encoded, _ = self.usage(frames)
+        
+        # Decoded images get whatever the encoded data leaves, but at least a quarter
+        self.frame_cache.max_bytes = max(self.budget_bytes - encoded, self.budget_bytes // 4)
+        self.frame_cache.trim()
+        
+        excess = encoded + self.frame_cache.total_bytes - self.budget_bytes
+        if excess <= 0:
+            return 0
+            
+        # Coldest frames first; a spilled frame frees its encoded data and its
+        # decoded image, so frames holding nothing are never worth spilling
+        spilled = 0
+        pinned = set(id(frame) for frame in keep)
+        candidates = [frame for frame in frames
+                      if frame.is_loaded and not frame.is_empty and id(frame) not in pinned]
+        candidates.sort(key=lambda frame: frame.last_access)
+        for frame in candidates:
+            if excess <= 0:
+                break
+            encoded, decoded = self.frame_bytes(frame)
+            if not encoded + decoded:
+                continue
+            image_data = frame.image_data
+            
+            # Frames reloaded but not edited since their last spill reuse it
+            previous = self.spilled.get(frame)
+            if previous is not None and previous[0] == frame.revision:
+                loader = previous[1]
+            else:
+                loader = self.spill_store.spill(image_data)
+                self.spilled[frame] = (frame.revision, loader)
+            frame.set_loader(loader)
+            decoded = self.frame_cache.discard(image_data)
+            excess -= encoded - frame.resident_bytes() + decoded  # A trimmed frame's source stays resident
+            spilled += 1
+        self.spilled_count += spilled
+        return spilled
+
+
+class PlaybackEngine(QObject):
+    """Drift-free animation playback scheduled against a monotonic clock
+
+    Frame i is due at the sum of the delays before it, counted from start(),
+    so timer jitter and slow frames never accumulate. The next prefetch_count
+    frames are decoded and composited on worker threads, and frames whose
+    slot has already passed when playback falls behind are dropped. Render
+    settings are snapshotted on the GUI thread by start() and invalidate()
+    and handed to the workers, which never read the tool's state.
+    """
+    frame_ready = pyqtSignal(int, object)  # frame index, composited QImage or None
+    
+    LATE_TOLERANCE_MS = 4  # Frames shown later than this count as late
+    
+    def __init__(self, frame_cache, render, render_settings, prefetch_count=8, parent=None):
+        super().__init__(parent)
+        self.frame_cache = frame_cache
+        self.render = render  # render(frame, image, settings) -> composited QImage
+        self.render_settings = render_settings  # () -> settings, called on the GUI thread
+        self.settings = None
+        self.prefetch_count = prefetch_count
+        self.frames = []
+        self.index = 0
+        self.due_ms = 0  # Time the current frame was due, relative to start()
+        self.playing = False
+        self.prefetched = {}  # index -> future of (frame state, composite)
+        self.pool = ThreadPoolExecutor(max_workers=2)
+        
+        self.clock = QElapsedTimer()
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setTimerType(Qt.PreciseTimer)
+        self.timer.timeout.connect(self.tick)
+        
+        self.reset_stats()
+    
+    def reset_stats(self):
+        self.shown_times = deque(maxlen=120)
+        self.decode_times = deque(maxlen=120)
+        self.shown_count = 0
+        self.late_count = 0
+        self.dropped_count = 0
+    
+    def start(self, frames, index=0):
+        """Start playing frames from index"""
+        self.stop()
+        if not frames:
+            return
+            
+        self.frames = frames
+        self.index = index % len(frames)
+        self.due_ms = 0
+        self.settings = self.render_settings()
+        self.playing = True
+        self.reset_stats()
+        self.clock.start()
+        
+        self.show(self.index)
+        self.prefetch()
+        self.schedule()
+    
+    def stop(self):
+        """Stop playback and discard prefetched frames"""
+        self.playing = False
+        self.timer.stop()
+        self.invalidate()
+    
+    def invalidate(self):
+        """Discard prefetched composites, e.g. after a display setting changed"""
+        for future in self.prefetched.values():
+            future.cancel()
+        self.prefetched.clear()
+        if self.playing:
+            self.settings = self.render_settings()
+    
+    def frame_delay(self, index):
+        return max(1, self.frames[index % len(self.frames)].delay)
+    
+    def frame_state(self, frame):
+        """Everything a composite depends on, used to detect stale prefetches"""
+        return (id(frame.image_data), frame.x_offset, frame.y_offset, frame.shadow_enabled,
+                frame.shadow_x_offset, frame.shadow_y_offset, frame.shadow_transparency)
+    
+    def tick(self):
+        """Advance to the frame whose slot contains the current time"""
+        if not self.playing or not self.frames:
+            self.stop()
+            return
+            
+        now = self.clock.elapsed()
+        frame_count = len(self.frames)
+        next_index = (self.index + 1) % frame_count
+        next_due = self.due_ms + self.frame_delay(self.index)
+        
+        # Drop frames whose whole slot has already passed
+        while next_due + self.frame_delay(next_index) <= now:
+            next_due += self.frame_delay(next_index)
+            next_index = (next_index + 1) % frame_count
+            self.dropped_count += 1
+            
+        self.index = next_index
+        self.due_ms = next_due
+        self.show(self.index)
+        self.prefetch()
+        self.schedule()
+    
+    def schedule(self):
+        next_due = self.due_ms + self.frame_delay(self.index)
+        self.timer.start(max(0, next_due - self.clock.elapsed()))
+    
+    def compose(self, frame, settings):
+        """Decode and composite a frame, recording how long it took"""
+        start = time.perf_counter()
+        image = None
+        if frame.image_data:
+            decoded = self.frame_cache.get(frame.image_data)
+            if not decoded.isNull():
+                image = self.render(frame, decoded, settings)
+        self.decode_times.append((time.perf_counter() - start) * 1000)
+        return image
+    
+    def prefetch_frame(self, frame, settings):
+        """Compose on a worker; the state is taken after lazy data has loaded"""
+        image = self.compose(frame, settings)
+        return self.frame_state(frame), image
+    
+    def show(self, index):
+        frame = self.frames[index]
+        image = None
+        future = self.prefetched.pop(index, None)
+        if future is not None and not future.cancelled():
+            state, image = future.result()
+            if state != self.frame_state(frame):
+                image = None
+        if image is None:
+            image = self.compose(frame, self.settings)
+            
+        now = self.clock.elapsed()
+        if now - self.due_ms > self.LATE_TOLERANCE_MS:
+            self.late_count += 1
+        self.shown_count += 1
+        self.shown_times.append(now)
+        self.frame_ready.emit(index, image)
+    
+    def prefetch(self):
+        """Queue the next frames for background decoding and compositing"""
+        frame_count = len(self.frames)
+        wanted = [(self.index + step) % frame_count
+                  for step in range(1, min(self.prefetch_count, frame_count) + 1)]
+        for index in list(self.prefetched):
+            if index not in wanted:
+                self.prefetched.pop(index).cancel()
+        for index in wanted:
+            if index not in self.prefetched:
+                self.prefetched[index] = self.pool.submit(self.prefetch_frame, self.frames[index],
+                                                          self.settings)
+    
+    def stats(self):
+        """Return achieved fps, late and dropped frame counts and decode time"""
+        fps = 0.0
+        if len(self.shown_times) > 1 and self.shown_times[-1] > self.shown_times[0]:
+            fps = (len(self.shown_times) - 1) * 1000.0 / (self.shown_times[-1] - self.shown_times[0])
+        decode_ms = sum(self.decode_times) / len(self.decode_times) if self.decode_times else 0.0
+        return {
+            "fps": fps,
+            "shown": self.shown_count,
+            "late": self.late_count,
+            "dropped": self.dropped_count,
+            "decode_ms": decode_ms,
+        }
+
+
+class OnionSkinRenderer:
+    """Builds ghost overlays of neighbouring frames from cached decoded images
+
+    Each ghost layer (tinted, faded and offset) is cached by the payload and
+    offsets it was built from, so scrubbing or editing one frame only rebuilds
+    the layers whose frame or offsets actually changed. Entries keep their
+    payload alive and check it by identity, like FrameCache, so a freed
+    payload's reused id never matches a stale layer.
+    """
+    PREVIOUS_TINT = QColor(255, 64, 64, 110)
+    NEXT_TINT = QColor(64, 160, 255, 110)
+    
+    def __init__(self, frame_cache, max_layers=32):
+        self.frame_cache = frame_cache
+        self.max_layers = max_layers
+        self.enabled = False
+        self.before = 1     # Ghost frames before the current one
+        self.after = 1      # Ghost frames after the current one
+        self.opacity = 0.4  # Opacity of the nearest ghosts
+        self.falloff = 0.6  # Opacity multiplier per extra frame of distance
+        self.layers = OrderedDict()  # layer key -> (image data, QImage)
+        self.stack_layers = None     # Layers the cached stack was drawn from
+        self.stack = None
+    
+    def layer_opacity(self, distance):
+        """Opacity of the ghost abs(distance) frames away"""
+        return self.opacity * (self.falloff ** (abs(distance) - 1))
+    
+    def neighbours(self, frames, index):
+        """Return [(distance, frame)] for ghost frames in the same direction"""
+        direction = frames[index].direction
+        result = []
+        for step, count in ((-1, self.before), (1, self.after)):
+            found = 0
+            i = index + step
+            while found < count and 0 <= i < len(frames):
+                if frames[i].direction == direction:
+                    found += 1
+                    result.append((found * step, frames[i]))
+                i += step
+        return result
+    
+    def layer(self, frame, distance, size):
+        """Return the cached ghost image for a frame at a signed distance"""
+        image_data = frame.image_data
+        key = (id(image_data), frame.x_offset, frame.y_offset, frame.trim, distance,
+               self.layer_opacity(distance), size.width(), size.height())
+        entry = self.layers.get(key)
+        if entry is not None and entry[0] is image_data:
+            self.layers.move_to_end(key)
+            return entry[1]
+            
+        image = self.frame_cache.get(image_data)
+        tinted = image.convertToFormat(QImage.Format_ARGB32_Premultiplied)
+        painter = QPainter(tinted)
+        painter.setCompositionMode(QPainter.CompositionMode_SourceAtop)
+        painter.fillRect(tinted.rect(), self.PREVIOUS_TINT if distance < 0 else self.NEXT_TINT)
+        painter.end()
+        
+        layer = QImage(size, QImage.Format_ARGB32_Premultiplied)
+        layer.fill(Qt.transparent)
+        painter = QPainter(layer)
+        painter.setOpacity(self.layer_opacity(distance))
+        trim_x, trim_y = frame_origin(frame)
+        painter.drawImage(frame.x_offset + trim_x, frame.y_offset + trim_y, tinted)
+        painter.end()
+        
+        self.layers[key] = (image_data, layer)
+        self.layers.move_to_end(key)
+        while len(self.layers) > self.max_layers:
+            self.layers.popitem(last=False)
+        return layer
+    
+    def ghost_stack(self, frames, index, size):
+        """Return one image holding all ghosts for frame index, or None"""
+        if not self.enabled:
+            return None
+            
+        # Farthest ghosts first so nearer ones are drawn on top
+        neighbours = [(distance, frame) for distance, frame in self.neighbours(frames, index)
+                      if frame.image_data]
+        neighbours.sort(key=lambda item: -abs(item[0]))
+        if not neighbours:
+            return None
+            
+        layers = [self.layer(frame, distance, size) for distance, frame in neighbours]
+        if self.stack_layers is None or len(layers) != len(self.stack_layers) or \
+                any(layer is not old for layer, old in zip(layers, self.stack_layers)):
+            stack = QImage(size, QImage.Format_ARGB32_Premultiplied)
+            stack.fill(Qt.transparent)
+            painter = QPainter(stack)
+            for layer in layers:
+                painter.drawImage(0, 0, layer)
+            painter.end()
+            self.stack_layers = layers
+            self.stack = stack
+        return self.stack
+    
+    def clear(self):
+        self.layers.clear()
+        self.stack_layers = None
+        self.stack = None
+
+
+class ThumbnailCache(QObject):
+    """Bounded LRU cache of frame thumbnails rendered on a background thread
+
+    Thumbnails are keyed by frame and image revision (holding only a weak
+    reference, so cached thumbnails never keep frame data in memory) and
+    persisted in the disk cache by content hash. Requests are served newest
+    first, so fast scrolling never waits behind rows that have already left
+    the screen. Lazily loaded or spilled frames are loaded on the worker.
+    """
+    thumbnail_ready = pyqtSignal(object)  # id of the frame that was requested
+    
+    MAX_PENDING = 256
+    
+    def __init__(self, size=48, max_entries=2048, disk_cache=None, parent=None):
+        super().__init__(parent)
+        self.size = size
+        self.max_entries = max_entries
+        self.disk_cache = disk_cache
+        self.entries = OrderedDict()   # id(frame) -> (weak frame, revision, thumbnail)
+        self.requests = OrderedDict()  # id(frame) -> frame, newest last
+        self.condition = threading.Condition()
+        self.placeholder = QImage(size, size, QImage.Format_ARGB32)
+        self.placeholder.fill(Qt.transparent)
+        
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+    
+    def lookup(self, frame):
+        """Return the cached thumbnail for a frame (called with the lock held)"""
+        entry = self.entries.get(id(frame))
+        if entry is not None and entry[0]() is frame and entry[1] == frame.revision:
+            self.entries.move_to_end(id(frame))
+            return entry[2]
+        return None
+    
+    def get(self, frame):
+        """Return the thumbnail for a frame, or None after queueing it"""
+        with self.condition:
+            thumbnail = self.lookup(frame)
+            if thumbnail is not None:
+                return thumbnail
+                
+            key = id(frame)
+            self.requests[key] = frame
+            self.requests.move_to_end(key)
+            while len(self.requests) > self.MAX_PENDING:
+                self.requests.popitem(last=False)
+            self.condition.notify()
+        return None
+    
+    def render(self, data):
+        """Load a thumbnail from the disk cache or scale the decoded frame"""
+        disk_key = None
+        if self.disk_cache is not None and self.disk_cache.enabled:
+            disk_key = DiskCache.key(f"thumbnail{self.size}", data)
+            cached = self.disk_cache.get(disk_key)
+            if cached is not None:
+                return QImage.fromData(cached)
+                
+        image = QImage.fromData(data)
+        if image.isNull():
+            return image
+        image = image.scaled(self.size, self.size, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+        if disk_key is not None:
+            self.disk_cache.put(disk_key, image_to_png_bytes(image))
+        return image
+    
+    def run(self):
+        while True:
+            with self.condition:
+                while not self.requests:
+                    self.condition.wait()
+                key, frame = self.requests.popitem(last=True)
+                
+            with self.condition:
+                thumbnail = self.lookup(frame)
+            if thumbnail is None:
+                # May run the lazy reader's decoder or reload a spilled frame
+                revision = frame.revision
+                data = frame.image_data
+                if data:
+                    thumbnail = self.render(data)
+                    with self.condition:
+                        self.entries[key] = (weakref.ref(frame), revision, thumbnail)
+                        while len(self.entries) > self.max_entries:
+                            self.entries.popitem(last=False)
+            self.thumbnail_ready.emit(key)
+
+
+class FrameListModel(QAbstractListModel):
+    """List model over the tool's frames with lazily rendered thumbnails
+
+    Row labels are computed from the row number, so inserting, removing or
+    swapping frames never renumbers the other rows.
+    """
+    def __init__(self, tool, parent=None):
+        super().__init__(parent)
+        self.tool = tool
+        self.thumbnails = ThumbnailCache(disk_cache=tool.disk_cache, parent=self)
+        self.thumbnails.thumbnail_ready.connect(self.on_thumbnail_ready)
+        self.waiting = {}  # id(frame) -> row that asked for its thumbnail
+    
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.tool.frames)
+    
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or index.row() >= len(self.tool.frames):
+            return None
+            
+        if role == Qt.DisplayRole:
+            return f"Frame {index.row() + 1}"
+        if role == Qt.DecorationRole:
+            frame = self.tool.frames[index.row()]
+            if frame.is_empty:
+                return self.thumbnails.placeholder
+            thumbnail = self.thumbnails.get(frame)
+            if thumbnail is None:
+                self.waiting[id(frame)] = index.row()
+                return self.thumbnails.placeholder
+            return thumbnail
+        return None
+    
+    def on_thumbnail_ready(self, key):
+        row = self.waiting.pop(key, None)
+        if row is not None and row < len(self.tool.frames) and id(self.tool.frames[row]) == key:
+            index = self.index(row)
+            self.dataChanged.emit(index, index, [Qt.DecorationRole])
+    
+    def set_frames(self, frames):
+        """Replace the whole frame list"""
+        self.beginResetModel()
+        self.tool.frames = frames
+        self.waiting.clear()
+        self.endResetModel()
+    
+    def insert_frames(self, row, frames):
+        """Insert frames before row"""
+        if not frames:
+            return
+        self.beginInsertRows(QModelIndex(), row, row + len(frames) - 1)
+        self.tool.frames[row:row] = frames
+        self.endInsertRows()
+    
+    def remove_frame(self, row):
+        """Remove and return the frame at row"""
+        return self.remove_frames(row, 1)[0]
+    
+    def remove_frames(self, row, count):
+        """Remove and return count frames starting at row"""
+        self.beginRemoveRows(QModelIndex(), row, row + count - 1)
+        frames = self.tool.frames[row:row + count]
+        del self.tool.frames[row:row + count]
+        self.endRemoveRows()
+        return frames
+    
+    def swap_frames(self, row, other):
+        """Swap two frames in place"""
+        frames = self.tool.frames
+        frames[row], frames[other] = frames[other], frames[row]
+        self.frames_changed(min(row, other), max(row, other))
+    
+    def frames_changed(self, first=0, last=None):
+        """Refresh rows whose frame data changed"""
+        if last is None:
+            last = len(self.tool.frames) - 1
+        if last >= first:
+            self.dataChanged.emit(self.index(first), self.index(last))
+
+
+class FrameListView(QListView):
+    """List view with the row helpers of QListWidget"""
+    def currentRow(self):
+        return self.currentIndex().row()
+    
+    def setCurrentRow(self, row):
+        self.setCurrentIndex(self.model().index(row, 0))
+
+
+def payload_bytes(state):
+    """Bytes of encoded data a FrameState keeps alive"""
+    if state.loader is not None:
+        size = getattr(state.loader, "resident_bytes", 0)
+    else:
+        size = len(state.image_data) if state.image_data else 0
+    if state.source_data is not None and state.source_data is not state.image_data:
+        size += len(state.source_data)
+    return size
+
+
+class UndoStep:
+    """One undoable edit: the rows it touched and the list operations it made
+    
+    Frames are recorded by identity, so a step stays valid however the list
+    is reordered later. Only frames passed to capture() are snapshotted and
+    their payloads are kept by reference, so a step costs a few tuples per
+    changed row plus whichever encoded images it replaced.
+    """
+    def __init__(self, description):
+        self.description = description
+        self.before = {}       # frame -> FrameState before the edit
+        self.after = {}        # frame -> FrameState after the edit
+        self.operations = []   # ("insert" | "remove", row, frames) or ("swap", row, other)
+        self.header_before = None
+        self.header_after = None
+        self.undo_bytes = 0    # Payloads only reachable through undo
+        self.redo_bytes = 0    # Payloads only reachable through redo
+    
+    def capture(self, frames):
+        """Snapshot frames about to change (the first snapshot wins)"""
+        for frame in frames:
+            if frame not in self.before:
+                self.before[frame] = frame.snapshot()
+    
+    def capture_header(self, header):
+        if self.header_before is None:
+            self.header_before = (header.width, header.height)
+    
+    def insert_frames(self, model, row, frames):
+        model.insert_frames(row, frames)
+        self.operations.append(("insert", row, list(frames)))
+    
+    def remove_frames(self, model, row, count=1):
+        frames = model.remove_frames(row, count)
+        self.operations.append(("remove", row, frames))
+        return frames
+    
+    def swap_frames(self, model, row, other):
+        model.swap_frames(row, other)
+        self.operations.append(("swap", row, other))
+    
+    def finish(self, header):
+        """Record the after states; returns False if nothing changed"""
+        for frame, before in list(self.before.items()):
+            after = frame.snapshot()
+            # Revision stands in for the payload, so unchanged images are never compared
+            if after[2:] == before[2:]:
+                del self.before[frame]
+                continue
+            self.after[frame] = after
+            if after.revision != before.revision:
+                self.undo_bytes += payload_bytes(before)
+                self.redo_bytes += payload_bytes(after)
+        if self.header_before is not None:
+            self.header_after = (header.width, header.height)
+            if self.header_after == self.header_before:
+                self.header_before = self.header_after = None
+        for kind, row, frames in self.operations:
+            if kind != "swap":
+                size = sum(frame.resident_bytes() for frame in frames)
+                if kind == "remove":
+                    self.undo_bytes += size
+                else:
+                    self.redo_bytes += size
+        return bool(self.after or self.operations or self.header_after)
+    
+    def merge(self, other):
+        """Fold a later step over the same frames into this one"""
+        for frame, after in other.after.items():
+            self.before.setdefault(frame, other.before[frame])
+            self.after[frame] = after
+        self.redo_bytes = other.redo_bytes
+    
+    def undo(self, model, header):
+        for frame, state in self.before.items():
+            frame.restore(state)
+        for kind, row, frames in reversed(self.operations):
+            if kind == "insert":
+                model.remove_frames(row, len(frames))
+            elif kind == "remove":
+                model.insert_frames(row, frames)
+            else:
+                model.swap_frames(row, frames)
+        if self.header_before is not None:
+            header.width, header.height = self.header_before
+    
+    def redo(self, model, header):
+        for kind, row, frames in self.operations:
+            if kind == "insert":
+                model.insert_frames(row, frames)
+            elif kind == "remove":
+                model.remove_frames(row, len(frames))
+            else:
+                model.swap_frames(row, frames)
+        for frame, state in self.after.items():
+            frame.restore(state)
+        if self.header_after is not None:
+            header.width, header.height = self.header_after
+
+
+class UndoHistory:
+    """Undo and redo stacks of UndoSteps, capped by payload memory"""
+    def __init__(self, max_bytes=256 * 1024 * 1024, max_steps=500):
+        self.max_bytes = max_bytes
+        self.max_steps = max_steps
+        self.undo_steps = deque()
+        self.redo_steps = []
+        self.merge_key = None  # Consecutive pushes with the same key become one step
+    
+    def clear(self):
+        self.undo_steps.clear()
+        self.redo_steps.clear()
+        self.merge_key = None
+    
+    def memory_bytes(self):
+        return (sum(step.undo_bytes for step in self.undo_steps) +
+                sum(step.redo_bytes for step in self.redo_steps))
+    
+    def push(self, step, header, merge_key=None):
+        """Add a finished edit; returns False if it changed nothing"""
+        if not step.finish(header):
+            return False
+        self.redo_steps.clear()
+        if (merge_key is not None and merge_key == self.merge_key and self.undo_steps
+                and not step.operations and step.header_after is None):
+            self.undo_steps[-1].merge(step)
+        else:
+            self.undo_steps.append(step)
+        self.merge_key = merge_key
+        # Forget the oldest steps first, always keeping the one just made
+        while len(self.undo_steps) > 1 and (len(self.undo_steps) > self.max_steps or
+                                            self.memory_bytes() > self.max_bytes):
+            self.undo_steps.popleft()
+        return True
+    
+    def undo(self, model, header):
+        """Revert the last step and return it, or None"""
+        if not self.undo_steps:
+            return None
+        step = self.undo_steps.pop()
+        step.undo(model, header)
+        self.redo_steps.append(step)
+        self.merge_key = None
+        return step
+    
+    def redo(self, model, header):
+        """Reapply the last undone step and return it, or None"""
+        if not self.redo_steps:
+            return None
+        step = self.redo_steps.pop()
+        step.redo(model, header)
+        self.undo_steps.append(step)
+        self.merge_key = None
+        return step
+    
+    def undo_text(self):
+        return self.undo_steps[-1].description if self.undo_steps else ""
+    
+    def redo_text(self):
+        return self.redo_steps[-1].description if self.redo_steps else ""
+
+
+class FrameAdjustmentDialog(QDialog):
+    """Dialog for advanced frame adjustments"""
+    def __init__(self, parent=None, frame=None):
+        super().__init__(parent)
+        self.frame = frame
+        self.setWindowTitle("Frame Details")
+        self.setMinimumWidth(400)
+        self.init_ui()
+        
+    def init_ui(self):
+        layout = QFormLayout(self)
+        
+        # Transparency slider
+        self.transparency_slider = QSlider(Qt.Horizontal)
+        self.transparency_slider.setRange(0, 255)
+        self.transparency_slider.setValue(self.frame.shadow_transparency if self.frame else 120)
+        layout.addRow("Transparency:", self.transparency_slider)
+        
+        # Shadow color picker
+        self.color_btn = QPushButton("Choose Shadow Color")
+        self.color_btn.clicked.connect(self.choose_shadow_color)
+        layout.addRow("Shadow Color:", self.color_btn)
+        
+        # Lock offset checkbox
+        self.lock_offset = QCheckBox("Lock Offset")
+        layout.addRow("", self.lock_offset)
+        
+        # Buttons
+        buttons_layout = QHBoxLayout()
+        self.ok_btn = QPushButton("OK")
+        self.ok_btn.clicked.connect(self.accept)
+        self.cancel_btn = QPushButton("Cancel")
+        self.cancel_btn.clicked.connect(self.reject)
+        
+        buttons_layout.addWidget(self.ok_btn)
+        buttons_layout.addWidget(self.cancel_btn)
+        layout.addRow("", buttons_layout)
+    
+    def choose_shadow_color(self):
+        if self.frame:
+            color = QColorDialog.getColor(self.frame.shadow_color, self, "Choose Shadow Color")
+            if color.isValid():
+                self.frame.shadow_color = color
+
+
+class ResizeFramesDialog(QDialog):
+    """Dialog for choosing how existing frames are resized"""
+    def __init__(self, parent=None, old_size=(0, 0), new_size=(0, 0)):
+        super().__init__(parent)
+        self.setWindowTitle("Resize Frames")
+        self.setMinimumWidth(400)
+        self.init_ui(old_size, new_size)
+
+    def init_ui(self, old_size, new_size):
+        layout = QFormLayout(self)
+
+        layout.addRow(QLabel(f"Resize all existing frames from {old_size[0]}x{old_size[1]} "
+                             f"to {new_size[0]}x{new_size[1]}?"))
+
+        self.resample_combo = QComboBox()
+        for mode, label in RESAMPLE_MODES:
+            self.resample_combo.addItem(label, mode)
+        layout.addRow("Resampling:", self.resample_combo)
+
+        self.fit_combo = QComboBox()
+        for mode, label in FIT_MODES:
+            self.fit_combo.addItem(label, mode)
+        layout.addRow("Fit:", self.fit_combo)
+
+        # Buttons
+        buttons_layout = QHBoxLayout()
+        self.ok_btn = QPushButton("Resize")
+        self.ok_btn.clicked.connect(self.accept)
+        self.cancel_btn = QPushButton("Cancel")
+        self.cancel_btn.clicked.connect(self.reject)
+
+        buttons_layout.addWidget(self.ok_btn)
+        buttons_layout.addWidget(self.cancel_btn)
+        layout.addRow("", buttons_layout)
+
+    def settings(self):
+        """Return (resample, fit)"""
+        return self.resample_combo.currentData(), self.fit_combo.currentData()
+
+
+class ExportFramesDialog(QDialog):
+    """Dialog for the encoder, naming and layout of an all-frames export"""
+    def __init__(self, parent=None, has_selection=False):
+        super().__init__(parent)
+        self.setWindowTitle("Export Frames")
+        self.setMinimumWidth(420)
+        self.init_ui(has_selection)
+
+    def init_ui(self, has_selection):
+        layout = QFormLayout(self)
+
+        self.format_combo = QComboBox()
+        self.format_combo.addItems(list(EXPORT_FORMATS))
+        self.format_combo.currentTextChanged.connect(self.update_options)
+        layout.addRow("Format:", self.format_combo)
+
+        self.compression_spin = QSpinBox()
+        self.compression_spin.setRange(0, 9)
+        self.compression_spin.setValue(6)
+        self.compression_spin.setToolTip("PNG zlib level: 0 is fastest, 9 is smallest")
+        layout.addRow("PNG compression:", self.compression_spin)
+
+        self.quality_spin = QSpinBox()
+        self.quality_spin.setRange(1, 100)
+        self.quality_spin.setValue(90)
+        self.quality_spin.setToolTip("JPG/WebP quality; 100 writes lossless WebP")
+        layout.addRow("Quality:", self.quality_spin)
+
+        self.template_input = QLineEdit("frame_{index:04d}_dir_{direction}")
+        self.template_input.setToolTip("Fields: {name} {index} {number} {direction} {delay} {x} {y}")
+        layout.addRow("File names:", self.template_input)
+
+        self.subfolders_checkbox = QCheckBox("One subfolder per direction (dir_N)")
+        layout.addRow("", self.subfolders_checkbox)
+
+        self.selected_frames_checkbox = QCheckBox("Selected frames only")
+        self.selected_frames_checkbox.setEnabled(has_selection)
+        layout.addRow("", self.selected_frames_checkbox)
+
+        # Buttons
+        buttons_layout = QHBoxLayout()
+        self.ok_btn = QPushButton("Export")
+        self.ok_btn.clicked.connect(self.accept)
+        self.cancel_btn = QPushButton("Cancel")
+        self.cancel_btn.clicked.connect(self.reject)
+
+        buttons_layout.addWidget(self.ok_btn)
+        buttons_layout.addWidget(self.cancel_btn)
+        layout.addRow("", buttons_layout)
+
+        self.update_options(self.format_combo.currentText())
+
+    def update_options(self, format_name):
+        self.compression_spin.setEnabled(format_name == "PNG")
+        self.quality_spin.setEnabled(format_name in ("JPG", "WebP"))
+
+    def settings(self):
+        """Return (format name, compression, quality, template, subfolders, selected only)"""
+        return (self.format_combo.currentText(), self.compression_spin.value(),
+                self.quality_spin.value(), self.template_input.text(),
+                self.subfolders_checkbox.isChecked(), self.selected_frames_checkbox.isChecked())
+
+
+class AtlasExportDialog(QDialog):
+    """Dialog for the page limits and packing options of an atlas export"""
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Export Atlas")
+        self.setMinimumWidth(360)
+        self.init_ui()
+
+    def init_ui(self):
+        layout = QFormLayout(self)
+
+        self.max_size_combo = QComboBox()
+        for size in (512, 1024, 2048, 4096, 8192, 16384):
+            self.max_size_combo.addItem(f"{size} x {size}", size)
+        self.max_size_combo.setCurrentIndex(3)
+        layout.addRow("Max page size:", self.max_size_combo)
+
+        self.padding_spin = QSpinBox()
+        self.padding_spin.setRange(0, 16)
+        self.padding_spin.setValue(1)
+        layout.addRow("Padding:", self.padding_spin)
+
+        self.trim_checkbox = QCheckBox("Trim transparent borders")
+        self.trim_checkbox.setChecked(True)
+        layout.addRow("", self.trim_checkbox)
+
+        self.rotation_checkbox = QCheckBox("Allow 90° rotation")
+        layout.addRow("", self.rotation_checkbox)
+
+        self.dedupe_checkbox = QCheckBox("Share identical frames")
+        self.dedupe_checkbox.setChecked(True)
+        layout.addRow("", self.dedupe_checkbox)
+
+        self.power_of_two_checkbox = QCheckBox("Power-of-two page sizes")
+        layout.addRow("", self.power_of_two_checkbox)
+
+        # Buttons
+        buttons_layout = QHBoxLayout()
+        self.ok_btn = QPushButton("Export")
+        self.ok_btn.clicked.connect(self.accept)
+        self.cancel_btn = QPushButton("Cancel")
+        self.cancel_btn.clicked.connect(self.reject)
+
+        buttons_layout.addWidget(self.ok_btn)
+        buttons_layout.addWidget(self.cancel_btn)
+        layout.addRow("", buttons_layout)
+
+    def settings(self):
+        """Return (max size, padding, trim, rotation, dedupe, power of two)"""
+        return (self.max_size_combo.currentData(), self.padding_spin.value(),
+                self.trim_checkbox.isChecked(), self.rotation_checkbox.isChecked(),
+                self.dedupe_checkbox.isChecked(), self.power_of_two_checkbox.isChecked())
+
+
+class AnimationExportDialog(QDialog):
+    """Dialog for the format, direction and background of an animation export"""
+    def __init__(self, parent=None, directions=()):
+        super().__init__(parent)
+        self.setWindowTitle("Export Animation")
+        self.setMinimumWidth(360)
+        self.init_ui(directions)
+
+    def init_ui(self, directions):
+        layout = QFormLayout(self)
+
+        self.format_combo = QComboBox()
+        self.format_combo.addItems(list(ANIMATION_FORMATS))
+        layout.addRow("Format:", self.format_combo)
+
+        # None = all frames in order, "each" = one file per direction
+        self.frames_combo = QComboBox()
+        self.frames_combo.addItem("All frames in order", None)
+        if len(directions) > 1:
+            self.frames_combo.addItem("One file per direction", "each")
+        for direction in directions:
+            self.frames_combo.addItem(f"Direction {direction}", direction)
+        layout.addRow("Frames:", self.frames_combo)
+
+        self.background_combo = QComboBox()
+        self.background_combo.addItem("Transparent", False)
+        self.background_combo.addItem("Display background colour", True)
+        layout.addRow("Background:", self.background_combo)
+
+        self.loop_checkbox = QCheckBox("Loop forever")
+        self.loop_checkbox.setChecked(True)
+        layout.addRow("", self.loop_checkbox)
+
+        # Buttons
+        buttons_layout = QHBoxLayout()
+        self.ok_btn = QPushButton("Export")
+        self.ok_btn.clicked.connect(self.accept)
+        self.cancel_btn = QPushButton("Cancel")
+        self.cancel_btn.clicked.connect(self.reject)
+
+        buttons_layout.addWidget(self.ok_btn)
+        buttons_layout.addWidget(self.cancel_btn)
+        layout.addRow("", buttons_layout)
+
+    def settings(self):
+        """Return (format name, frames choice, use background, loop)"""
+        return (self.format_combo.currentText(), self.frames_combo.currentData(),
+                self.background_combo.currentData(), self.loop_checkbox.isChecked())
+
+
+class ImportFramesDialog(QDialog):
+    """Dialog for choosing import sources and how they become frames"""
+    def __init__(self, parent=None, frame_size=(0, 0)):
+        super().__init__(parent)
+        self.setWindowTitle("Import Frames")
+        self.setMinimumWidth(520)
+        self.init_ui(frame_size)
+
+    def init_ui(self, frame_size):
+        layout = QFormLayout(self)
+
+        # Sources
+        self.source_list = QListWidget()
+        self.source_list.setSelectionMode(QAbstractItemView.ExtendedSelection)
+        layout.addRow("Sources:", self.source_list)
+
+        sources_layout = QHBoxLayout()
+        self.add_files_btn = QPushButton("Add Files...")
+        self.add_files_btn.clicked.connect(self.add_files)
+        self.add_folder_btn = QPushButton("Add Folder...")
+        self.add_folder_btn.clicked.connect(self.add_folder)
+        self.remove_source_btn = QPushButton("Remove")
+        self.remove_source_btn.clicked.connect(self.remove_sources)
+        sources_layout.addWidget(self.add_files_btn)
+        sources_layout.addWidget(self.add_folder_btn)
+        sources_layout.addWidget(self.remove_source_btn)
+        layout.addRow("", sources_layout)
+
+        # Sprite sheets cut on a grid of cells
+        self.grid_checkbox = QCheckBox("Cut still images into a grid of cells")
+        layout.addRow("", self.grid_checkbox)
+        grid_layout = QHBoxLayout()
+        self.cell_width_spin = QSpinBox()
+        self.cell_width_spin.setRange(1, 8192)
+        self.cell_width_spin.setValue(frame_size[0] or 64)
+        self.cell_height_spin = QSpinBox()
+        self.cell_height_spin.setRange(1, 8192)
+        self.cell_height_spin.setValue(frame_size[1] or 64)
+        grid_layout.addWidget(self.cell_width_spin)
+        grid_layout.addWidget(QLabel("x"))
+        grid_layout.addWidget(self.cell_height_spin)
+        layout.addRow("Cell size:", grid_layout)
+
+        self.resample_combo = QComboBox()
+        for mode, label in RESAMPLE_MODES:
+            self.resample_combo.addItem(label, mode)
+        layout.addRow("Resampling:", self.resample_combo)
+
+        self.fit_combo = QComboBox()
+        for mode, label in FIT_MODES:
+            self.fit_combo.addItem(label, mode)
+        self.fit_combo.setCurrentIndex(1)
+        layout.addRow("Fit:", self.fit_combo)
+
+        # File name patterns, first group is the value
+        self.direction_pattern_input = QLineEdit(r"dir(?:ection)?[_\- ]?(\d+)")
+        layout.addRow("Direction pattern:", self.direction_pattern_input)
+        self.delay_pattern_input = QLineEdit(r"(\d+)\s*ms")
+        layout.addRow("Delay pattern:", self.delay_pattern_input)
+
+        self.delay_spin = QSpinBox()
+        self.delay_spin.setRange(1, 10000)
+        self.delay_spin.setValue(100)
+        layout.addRow("Default delay (ms):", self.delay_spin)
+
+        # Buttons
+        buttons_layout = QHBoxLayout()
+        self.ok_btn = QPushButton("Import")
+        self.ok_btn.clicked.connect(self.accept)
+        self.cancel_btn = QPushButton("Cancel")
+        self.cancel_btn.clicked.connect(self.reject)
+
+        buttons_layout.addWidget(self.ok_btn)
+        buttons_layout.addWidget(self.cancel_btn)
+        layout.addRow("", buttons_layout)
+
+    def add_files(self):
+        extensions = " ".join(f"*{extension}" for extension in IMPORT_EXTENSIONS)
+        file_paths, _ = QFileDialog.getOpenFileNames(self, "Add Files", "",
+                                                     f"Images and atlases ({extensions});;All Files (*)")
+        self.source_list.addItems(file_paths)
+
+    def add_folder(self):
+        directory = QFileDialog.getExistingDirectory(self, "Add Folder")
+        if not directory:
+            return
+        # Atlas JSON files are only imported when picked explicitly
+        names = [name for name in os.listdir(directory)
+                 if os.path.splitext(name)[1].lower() in IMPORT_EXTENSIONS[:-1]]
+        self.source_list.addItems([os.path.join(directory, name)
+                                   for name in sorted(names, key=natural_sort_key)])
+
+    def remove_sources(self):
+        for item in self.source_list.selectedItems():
+            self.source_list.takeItem(self.source_list.row(item))
+
+    def sources(self):
+        return [self.source_list.item(row).text() for row in range(self.source_list.count())]
+
+    def settings(self):
+        """Return import options for import_frames_from_file (without the target size)
+
+        Raises re.error for an invalid pattern.
+        """
+        return {
+            "grid": ((self.cell_width_spin.value(), self.cell_height_spin.value())
+                     if self.grid_checkbox.isChecked() else None),
+            "resample": self.resample_combo.currentData(),
+            "fit": self.fit_combo.currentData(),
+            "direction_pattern": re.compile(self.direction_pattern_input.text(), re.IGNORECASE)
+                                 if self.direction_pattern_input.text() else None,
+            "delay_pattern": re.compile(self.delay_pattern_input.text(), re.IGNORECASE)
+                             if self.delay_pattern_input.text() else None,
+            "delay": self.delay_spin.value(),
+        }
+
+
+class ColourKeyDialog(QDialog):
+    """Dialog for the bulk colour key / alpha threshold pass"""
+    def __init__(self, parent=None, alpha_threshold=0, has_selection=False):
+        super().__init__(parent)
+        self.key_color = QColor(255, 0, 255)
+        self.setWindowTitle("Colour Key / Alpha Threshold")
+        self.setMinimumWidth(400)
+        self.init_ui(alpha_threshold, has_selection)
+
+    def init_ui(self, alpha_threshold, has_selection):
+        layout = QFormLayout(self)
+
+        # Colour key
+        self.use_key_checkbox = QCheckBox("Remove key colour")
+        self.use_key_checkbox.setChecked(True)
+        self.use_key_checkbox.stateChanged.connect(self.settings_changed)
+        layout.addRow("", self.use_key_checkbox)
+
+        self.color_btn = QPushButton()
+        self.color_btn.setFixedWidth(100)
+        self.color_btn.setStyleSheet(f"background-color: {self.key_color.name()}")
+        self.color_btn.clicked.connect(self.choose_key_color)
+        layout.addRow("Key Colour:", self.color_btn)
+
+        self.tolerance_spin = QSpinBox()
+        self.tolerance_spin.setRange(0, 255)
+        self.tolerance_spin.valueChanged.connect(self.settings_changed)
+        layout.addRow("Tolerance:", self.tolerance_spin)
+
+        # Alpha threshold
+        self.threshold_spin = QSpinBox()
+        self.threshold_spin.setRange(0, 255)
+        self.threshold_spin.setValue(alpha_threshold)
+        self.threshold_spin.valueChanged.connect(self.settings_changed)
+        layout.addRow("Alpha Threshold:", self.threshold_spin)
+
+        # Frames to process
+        self.all_frames_radio = QRadioButton("All frames")
+        self.selected_frames_radio = QRadioButton("Selected frames")
+        self.all_frames_radio.setChecked(True)
+        self.selected_frames_radio.setEnabled(has_selection)
+        scope_group = QButtonGroup(self)
+        scope_group.addButton(self.all_frames_radio)
+        scope_group.addButton(self.selected_frames_radio)
+        layout.addRow("Apply To:", self.all_frames_radio)
+        layout.addRow("", self.selected_frames_radio)
+
+        # Buttons
+        buttons_layout = QHBoxLayout()
+        self.ok_btn = QPushButton("Apply")
+        self.ok_btn.clicked.connect(self.accept)
+        self.cancel_btn = QPushButton("Cancel")
+        self.cancel_btn.clicked.connect(self.reject)
+
+        buttons_layout.addWidget(self.ok_btn)
+        buttons_layout.addWidget(self.cancel_btn)
+        layout.addRow("", buttons_layout)
+
+    def choose_key_color(self):
+        color = QColorDialog.getColor(self.key_color, self, "Choose Key Colour")
+        if color.isValid():
+            self.key_color = color
+            self.color_btn.setStyleSheet(f"background-color: {color.name()}")
+            self.settings_changed()
+
+    def settings(self):
+        """Return (key_color or None, tolerance, alpha_threshold)"""
+        key_color = self.key_color if self.use_key_checkbox.isChecked() else None
+        return key_color, self.tolerance_spin.value(), self.threshold_spin.value()
+
+    def settings_changed(self):
+        """Refresh the live preview in the main window"""
+        if hasattr(self.parent(), "preview_colour_key"):
+            self.parent().preview_colour_key(*self.settings())
+
+
+class DirectionGridWidget(QWidget):
+    """Plays every direction side by side from one clock on a single surface
+
+    Each cell is redrawn into one shared QImage only when its direction moves
+    to another frame, and the widget paints that surface with one draw call.
+    The tool calls invalidate() after every edit or document change so the
+    schedule and all cells are rebuilt from the current frames.
+    """
+    def __init__(self, tool, parent=None):
+        super().__init__(parent)
+        self.tool = tool
+        self.surface = QImage()
+        self.cell_width = 0
+        self.cell_height = 0
+        self.columns = 1
+        self.directions = []  # [(direction, frame indices, cumulative end times)]
+        self.shown = {}  # cell -> frame index currently drawn
+        self.stale = True
+        
+        self.clock = QElapsedTimer()
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setTimerType(Qt.PreciseTimer)
+        self.timer.timeout.connect(self.tick)
+        self.setMinimumSize(320, 240)
+    
+    def rebuild(self):
+        """Rebuild the schedule from the tool's direction index"""
+        frames = self.tool.frames
+        self.stale = False
+        self.directions = []
+        for direction, indices in build_direction_index(frames).items():
+            ends = []
+            total = 0
+            for i in indices:
+                total += max(1, frames[i].delay)
+                ends.append(total)
+            self.directions.append((direction, indices, ends))
+            
+        self.cell_width = self.tool.header.width or 1
+        self.cell_height = self.tool.header.height or 1
+        count = max(1, len(self.directions))
+        self.columns = min(count, math.ceil(math.sqrt(count)))
+        rows = (count + self.columns - 1) // self.columns
+        self.surface = QImage(self.columns * self.cell_width, rows * self.cell_height,
+                              QImage.Format_ARGB32)
+        self.surface.fill(self.tool.background_color)
+        self.shown = {}
+    
+    def start(self):
+        self.rebuild()
+        self.clock.start()
+        self.tick()
+    
+    def stop(self):
+        self.timer.stop()
+    
+    def invalidate(self):
+        """Rebuild the schedule and redraw every cell on the next tick"""
+        self.stale = True
+        if self.isVisible():
+            self.timer.start(0)
+    
+    def tick(self):
+        if self.stale:
+            self.rebuild()
+            
+        now = self.clock.elapsed()
+        next_change = None
+        changed = False
+        painter = QPainter(self.surface)
+        for cell, (direction, indices, ends) in enumerate(self.directions):
+            # Find the frame whose slot contains now
+            loop_time = now % ends[-1]
+            position = bisect_right(ends, loop_time)
+            until_change = ends[position] - loop_time
+            if next_change is None or until_change < next_change:
+                next_change = until_change
+                
+            frame_index = indices[position]
+            if self.shown.get(cell) != frame_index:
+                self.draw_cell(painter, cell, frame_index)
+                self.shown[cell] = frame_index
+                changed = True
+        painter.end()
+        
+        if changed:
+            self.update()
+        if next_change is not None:
+            self.timer.start(next_change)
+    
+    def draw_cell(self, painter, cell, frame_index):
+        x = (cell % self.columns) * self.cell_width
+        y = (cell // self.columns) * self.cell_height
+        painter.fillRect(x, y, self.cell_width, self.cell_height, self.tool.background_color)
+        frame = self.tool.frames[frame_index]
+        if not frame.image_data:
+            return
+        image = self.tool.frame_cache.get(frame.image_data)
+        painter.save()
+        painter.setClipRect(x, y, self.cell_width, self.cell_height)
+        painter.translate(x, y)
+        draw_frame(painter, frame, image)
+        painter.restore()
+    
+    def paintEvent(self, event):
+        if self.surface.isNull():
+            return
+        painter = QPainter(self)
+        # Largest whole-number zoom that fits, nearest-neighbour for crisp pixels
+        zoom = max(1, min(self.width() // max(1, self.surface.width()),
+                          self.height() // max(1, self.surface.height())))
+        width = self.surface.width() * zoom
+        height = self.surface.height() * zoom
+        target = QRect((self.width() - width) // 2, (self.height() - height) // 2, width, height)
+        painter.drawImage(target, self.surface)
+        
+        # Direction labels
+        painter.setPen(Qt.white)
+        for cell, (direction, _, _) in enumerate(self.directions):
+            x = target.x() + (cell % self.columns) * self.cell_width * zoom
+            y = target.y() + (cell // self.columns) * self.cell_height * zoom
+            painter.drawText(x + 3, y + 12, f"Dir {direction}")
+
+
+class DirectionPreviewDialog(QDialog):
+    """Window playing all directions of the current file at once"""
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Direction Preview")
+        self.resize(640, 480)
+        layout = QVBoxLayout(self)
+        
+        self.grid = DirectionGridWidget(parent, self)
+        layout.addWidget(self.grid)
+        
+        buttons_layout = QHBoxLayout()
+        self.restart_btn = QPushButton("Restart")
+        self.restart_btn.clicked.connect(self.grid.start)
+        self.close_btn = QPushButton("Close")
+        self.close_btn.clicked.connect(self.close)
+        buttons_layout.addStretch()
+        buttons_layout.addWidget(self.restart_btn)
+        buttons_layout.addWidget(self.close_btn)
+        layout.addLayout(buttons_layout)
+    
+    def showEvent(self, event):
+        super().showEvent(event)
+        self.grid.start()
+    
+    def hideEvent(self, event):
+        self.grid.stop()
+        super().hideEvent(event)
+
+
+def run_with_progress(parent, label, func):
+    """Run func(progress, cancelled) on a worker thread behind a modal progress dialog
+    
+    func reports with progress(done, total) and should return early once
+    cancelled() is true. Returns func's result; its exceptions are re-raised.
+    """
+    done = [0, 0]
+    cancel = threading.Event()
+    
+    def progress(count, total):
+        done[:] = [count, total]
+    
+    progress_dialog = QProgressDialog(label, "Cancel", 0, 0, parent)
+    progress_dialog.setWindowModality(Qt.WindowModal)
+    progress_dialog.setMinimumDuration(300)
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        future = pool.submit(func, progress, cancel.is_set)
+        while not future.done():
+            if done[1]:
+                progress_dialog.setMaximum(done[1])
+                progress_dialog.setValue(min(done[0], done[1] - 1))
+            QApplication.processEvents()
+            if progress_dialog.wasCanceled():
+                cancel.set()
+            wait([future], timeout=0.05)
+    progress_dialog.close()
+    return future.result()
+
+
+class CatalogueDialog(QDialog):
+    """Search the asset catalogue by name, size, directions, frame count and delay"""
+    HEADERS = ["File", "Type", "Width", "Height", "Directions", "Frames", "Min delay", "Max delay", "KB"]
+    
+    def __init__(self, parent, catalogue):
+        super().__init__(parent)
+        self.catalogue = catalogue
+        self.setWindowTitle("Asset Catalogue")
+        self.resize(860, 520)
+        self.init_ui()
+        self.run_query()
+    
+    def init_ui(self):
+        layout = QVBoxLayout(self)
+        filters = QFormLayout()
+        
+        self.name_input = QLineEdit()
+        self.name_input.setPlaceholderText("Part of the file path")
+        self.name_input.textChanged.connect(self.run_query)
+        filters.addRow("Name:", self.name_input)
+        
+        self.kind_combo = QComboBox()
+        for label, kind in (("Any", None), ("ASF", "ASF"), ("SPR", "SPR")):
+            self.kind_combo.addItem(label, kind)
+        self.kind_combo.currentIndexChanged.connect(self.run_query)
+        filters.addRow("Type:", self.kind_combo)
+        
+        # Zero leaves a filter out
+        size_layout = QHBoxLayout()
+        self.min_width_spin, self.max_width_spin = self.filter_spin(), self.filter_spin()
+        self.min_height_spin, self.max_height_spin = self.filter_spin(), self.filter_spin()
+        for label, spin in (("Width", self.min_width_spin), ("to", self.max_width_spin),
+                            ("Height", self.min_height_spin), ("to", self.max_height_spin)):
+            size_layout.addWidget(QLabel(label))
+            size_layout.addWidget(spin)
+        filters.addRow("Size:", size_layout)
+        
+        counts_layout = QHBoxLayout()
+        self.directions_spin, self.min_frames_spin = self.filter_spin(), self.filter_spin()
+        self.delay_below_spin = self.filter_spin()
+        for label, spin in (("Directions", self.directions_spin), ("At least frames", self.min_frames_spin),
+                            ("Any delay below (ms)", self.delay_below_spin)):
+            counts_layout.addWidget(QLabel(label))
+            counts_layout.addWidget(spin)
+        filters.addRow("Frames:", counts_layout)
+        layout.addLayout(filters)
+        
+        self.table = QTableWidget(0, len(self.HEADERS))
+        self.table.setHorizontalHeaderLabels(self.HEADERS)
+        self.table.verticalHeader().setVisible(False)
+        self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.table.setSelectionMode(QAbstractItemView.SingleSelection)
+        self.table.horizontalHeader().setSectionResizeMode(0, QHeaderView.Stretch)
+        self.table.doubleClicked.connect(self.open_selected)
+        layout.addWidget(self.table)
+        
+        self.status_label = QLabel()
+        layout.addWidget(self.status_label)
+        
+        buttons_layout = QHBoxLayout()
+        self.index_btn = QPushButton("Index Folder...")
+        self.index_btn.clicked.connect(self.index_folder)
+        self.open_btn = QPushButton("Open")
+        self.open_btn.clicked.connect(self.open_selected)
+        self.close_btn = QPushButton("Close")
+        self.close_btn.clicked.connect(self.close)
+        buttons_layout.addWidget(self.index_btn)
+        buttons_layout.addStretch()
+        buttons_layout.addWidget(self.open_btn)
+        buttons_layout.addWidget(self.close_btn)
+        layout.addLayout(buttons_layout)
+    
+    def filter_spin(self):
+        spin = QSpinBox()
+        spin.setRange(0, 100000)
+        spin.setSpecialValueText("any")
+        spin.valueChanged.connect(self.run_query)
+        return spin
+    
+    def run_query(self):
+        value = lambda spin: spin.value() or None
+        start = time.perf_counter()
+        rows = self.catalogue.query(name=self.name_input.text() or None,
+                                    kind=self.kind_combo.currentData(),
+                                    min_width=value(self.min_width_spin), max_width=value(self.max_width_spin),
+                                    min_height=value(self.min_height_spin),
+                                    max_height=value(self.max_height_spin),
+                                    direction_count=value(self.directions_spin),
+                                    min_frames=value(self.min_frames_spin),
+                                    delay_below=value(self.delay_below_spin))
+        elapsed = time.perf_counter() - start
+        
+        self.table.setSortingEnabled(False)
+        self.table.setRowCount(len(rows))
+        for row, record in enumerate(rows):
+            path, kind, *numbers, size = record
+            self.table.setItem(row, 0, QTableWidgetItem(path))
+            self.table.setItem(row, 1, QTableWidgetItem(kind))
+            for column, number in enumerate(numbers + [round(size / 1024)], 2):
+                item = QTableWidgetItem()
+                if number is not None:
+                    item.setData(Qt.DisplayRole, number)
+                self.table.setItem(row, column, item)
+        self.table.setSortingEnabled(True)
+        self.status_label.setText(f"{len(rows)} of {self.catalogue.file_count()} indexed files "
+                                  f"({elapsed * 1000:.1f} ms)")
+    
+    def index_folder(self):
+        directory = QFileDialog.getExistingDirectory(self, "Index Folder")
+        if not directory:
+            return
+        start = time.perf_counter()
+        try:
+            stats = run_with_progress(self, "Indexing files...",
+                                      lambda progress, cancelled: self.catalogue.scan([directory], progress,
+                                                                                      cancelled))
+        except Exception as e:
+            QMessageBox.critical(self, "Error", f"Failed to index folder: {str(e)}")
+            return
+        self.run_query()
+        self.status_label.setText(f"Indexed {stats['indexed']} of {stats['found']} files "
+                                  f"({stats['found'] - stats['indexed']} unchanged, {stats['removed']} removed, "
+                                  f"{stats['errors']} unreadable) in {time.perf_counter() - start:.1f} s")
+    
+    def open_selected(self):
+        rows = self.table.selectionModel().selectedRows()
+        if not rows:
+            return
+        path = self.table.item(rows[0].row(), 0).text()
+        editor = self.parent()
+        if editor.frames and editor.check_unsaved_changes():
+            return
+        editor.open_path(path)
+
+
+class SimilarFramesDialog(QDialog):
+    """Catalogue frames whose perceptual hash is close to the current frame's"""
+    HEADERS = ["Distance", "File", "Frame"]
+    
+    def __init__(self, parent, catalogue, image):
+        super().__init__(parent)
+        self.catalogue = catalogue
+        self.hashes = dict(zip(("ahash", "dhash"), perceptual_hashes(image)))
+        self.setWindowTitle("Similar Frames")
+        self.resize(720, 480)
+        self.init_ui()
+        self.run_search()
+    
+    def init_ui(self):
+        layout = QVBoxLayout(self)
+        options = QFormLayout()
+        
+        self.method_combo = QComboBox()
+        self.method_combo.addItem("Gradient (dHash)", "dhash")
+        self.method_combo.addItem("Average (aHash)", "ahash")
+        self.method_combo.currentIndexChanged.connect(self.run_search)
+        options.addRow("Hash:", self.method_combo)
+        
+        self.distance_spin = QSpinBox()
+        self.distance_spin.setRange(0, PHASH_MAX_DISTANCE)
+        self.distance_spin.setValue(8)
+        self.distance_spin.setSuffix(" bits")
+        self.distance_spin.valueChanged.connect(self.run_search)
+        options.addRow("Maximum distance:", self.distance_spin)
+        layout.addLayout(options)
+        
+        self.table = QTableWidget(0, len(self.HEADERS))
+        self.table.setHorizontalHeaderLabels(self.HEADERS)
+        self.table.verticalHeader().setVisible(False)
+        self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.table.setSelectionMode(QAbstractItemView.SingleSelection)
+        self.table.horizontalHeader().setSectionResizeMode(1, QHeaderView.Stretch)
+        self.table.doubleClicked.connect(self.open_selected)
+        layout.addWidget(self.table)
+        
+        self.status_label = QLabel()
+        layout.addWidget(self.status_label)
+        
+        buttons_layout = QHBoxLayout()
+        self.hash_btn = QPushButton("Hash Catalogue")
+        self.hash_btn.setToolTip("Compute perceptual hashes for indexed files that have none")
+        self.hash_btn.clicked.connect(self.hash_catalogue)
+        self.open_btn = QPushButton("Open")
+        self.open_btn.clicked.connect(self.open_selected)
+        self.close_btn = QPushButton("Close")
+        self.close_btn.clicked.connect(self.close)
+        buttons_layout.addWidget(self.hash_btn)
+        buttons_layout.addStretch()
+        buttons_layout.addWidget(self.open_btn)
+        buttons_layout.addWidget(self.close_btn)
+        layout.addLayout(buttons_layout)
+    
+    def run_search(self):
+        method = self.method_combo.currentData()
+        start = time.perf_counter()
+        matches = self.catalogue.find_similar(self.hashes[method], method, self.distance_spin.value())
+        elapsed = time.perf_counter() - start
+        
+        self.table.setRowCount(len(matches))
+        for row, (distance, path, index) in enumerate(matches):
+            for column, value in enumerate((distance, path, index)):
+                item = QTableWidgetItem()
+                item.setData(Qt.DisplayRole, value)
+                self.table.setItem(row, column, item)
+        self.status_label.setText(f"{len(matches)} similar frames among "
+                                  f"{self.catalogue.hashed_frame_count()} hashed ({elapsed * 1000:.1f} ms)")
+    
+    def hash_catalogue(self):
+        start = time.perf_counter()
+        try:
+            stats = run_with_progress(self, "Hashing frames...", self.catalogue.hash_frames)
+        except Exception as e:
+            QMessageBox.critical(self, "Error", f"Failed to hash frames: {str(e)}")
+            return
+        self.run_search()
+        self.status_label.setText(f"Hashed {stats['frames']} frames in {stats['files']} files "
+                                  f"({stats['errors']} unreadable) in {time.perf_counter() - start:.1f} s")
+    
+    def open_selected(self):
+        rows = self.table.selectionModel().selectedRows()
+        if not rows:
+            return
+        path = self.table.item(rows[0].row(), 1).text()
+        index = self.table.item(rows[0].row(), 2).data(Qt.DisplayRole)
+        editor = self.parent()
+        if editor.current_file != path:
+            if editor.frames and editor.check_unsaved_changes():
+                return
+            editor.open_path(path)
+        if editor.current_file == path and index < len(editor.frames):
+            editor.frame_list.setCurrentRow(index)
+
+
+class DiffDialog(QDialog):
+    """Frame-level comparison of two ASF/SPR files, with a heat map for modified frames"""
+    HEADERS = ["Status", "Old frame", "New frame", "Metadata changes"]
+    STATUS_COLOURS = {"added": QColor(200, 255, 200), "removed": QColor(255, 210, 210),
+                      "modified": QColor(255, 240, 190), "moved": QColor(210, 225, 255),
+                      "metadata": QColor(235, 225, 255)}
+    PREVIEW_SIZE = 200
+    
+    def __init__(self, parent=None, old_path=""):
+        super().__init__(parent)
+        self.setWindowTitle("Compare Files")
+        self.resize(900, 640)
+        self.changes = []
+        self.documents = {}  # Frames read on demand for heat maps, by path
+        self.init_ui(old_path)
+    
+    def init_ui(self, old_path):
+        layout = QVBoxLayout(self)
+        files = QFormLayout()
+        self.old_input, self.new_input = QLineEdit(old_path), QLineEdit()
+        for label, line_edit in (("Old file:", self.old_input), ("New file:", self.new_input)):
+            row = QHBoxLayout()
+            browse_btn = QPushButton("Browse...")
+            browse_btn.clicked.connect(lambda _, line_edit=line_edit: self.browse(line_edit))
+            row.addWidget(line_edit)
+            row.addWidget(browse_btn)
+            files.addRow(label, row)
+        layout.addLayout(files)
+        
+        options_layout = QHBoxLayout()
+        self.compare_btn = QPushButton("Compare")
+        self.compare_btn.clicked.connect(self.compare)
+        self.show_unchanged_checkbox = QCheckBox("Show unchanged frames")
+        self.show_unchanged_checkbox.toggled.connect(self.fill_table)
+        options_layout.addWidget(self.compare_btn)
+        options_layout.addWidget(self.show_unchanged_checkbox)
+        options_layout.addStretch()
+        layout.addLayout(options_layout)
+        
+        self.summary_label = QLabel()
+        self.summary_label.setWordWrap(True)
+        layout.addWidget(self.summary_label)
+        
+        self.table = QTableWidget(0, len(self.HEADERS))
+        self.table.setHorizontalHeaderLabels(self.HEADERS)
+        self.table.verticalHeader().setVisible(False)
+        self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.table.setSelectionMode(QAbstractItemView.SingleSelection)
+        self.table.horizontalHeader().setSectionResizeMode(3, QHeaderView.Stretch)
+        self.table.itemSelectionChanged.connect(self.show_selected)
+        layout.addWidget(self.table)
+        
+        # Old frame, new frame and heat map side by side
+        previews_layout = QHBoxLayout()
+        self.previews = []
+        for caption in ("Old", "New", "Difference"):
+            column = QVBoxLayout()
+            preview = QLabel()
+            preview.setFixedSize(self.PREVIEW_SIZE, self.PREVIEW_SIZE)
+            preview.setAlignment(Qt.AlignCenter)
+            preview.setStyleSheet("background-color: #202020;")
+            column.addWidget(preview)
+            column.addWidget(QLabel(caption), alignment=Qt.AlignCenter)
+            previews_layout.addLayout(column)
+            self.previews.append(preview)
+        self.preview_label = QLabel()
+        self.preview_label.setWordWrap(True)
+        previews_layout.addWidget(self.preview_label, 1)
+        layout.addLayout(previews_layout)
+        
+        buttons_layout = QHBoxLayout()
+        self.close_btn = QPushButton("Close")
+        self.close_btn.clicked.connect(self.close)
+        buttons_layout.addStretch()
+        buttons_layout.addWidget(self.close_btn)
+        layout.addLayout(buttons_layout)
+    
+    def browse(self, line_edit):
+        file_path, _ = QFileDialog.getOpenFileName(self, "Choose File", line_edit.text(),
+                                                   "ASF/SPR Files (*.asf *.spr);;All Files (*)")
+        if file_path:
+            line_edit.setText(file_path)
+    
+    def compare(self):
+        old_path, new_path = self.old_input.text(), self.new_input.text()
+        start = time.perf_counter()
+        try:
+            header_changes, self.changes = diff_documents(old_path, new_path)
+        except Exception as e:
+            QMessageBox.critical(self, "Error", f"Failed to compare files: {str(e)}")
+            return
+        elapsed = time.perf_counter() - start
+        self.documents = {}
+        
+        counts = {}
+        for change in self.changes:
+            counts[change.status] = counts.get(change.status, 0) + 1
+        summary = ", ".join(f"{counts[status]} {status}" for status in
+                            ("added", "removed", "moved", "modified", "metadata") if status in counts)
+        headers = "; ".join(f"{name.replace('_', ' ')} {old} -> {new}"
+                            for name, (old, new) in header_changes.items())
+        self.summary_label.setText(f"{summary or 'No frame changes'}"
+                                   f"{'. Header: ' + headers if headers else ''} "
+                                   f"({elapsed * 1000:.0f} ms)")
+        self.fill_table()
+    
+    def fill_table(self):
+        show_all = self.show_unchanged_checkbox.isChecked()
+        rows = [change for change in self.changes
+                if show_all or change.status != "unchanged"]
+        self.table.setRowCount(len(rows))
+        for row, change in enumerate(rows):
+            values = (change.status, change.old_index, change.new_index, describe_frame_change(change))
+            for column, value in enumerate(values):
+                item = QTableWidgetItem("" if value is None else str(value))
+                item.setData(Qt.UserRole, change)
+                if change.status in self.STATUS_COLOURS:
+                    item.setBackground(self.STATUS_COLOURS[change.status])
+                self.table.setItem(row, column, item)
+        self.show_selected()
+    
+    def document_frames(self, path):
+        if path not in self.documents:
+            _, self.documents[path] = read_document(path)
+        return self.documents[path]
+    
+    def show_selected(self):
+        for preview in self.previews:
+            preview.clear()
+        rows = self.table.selectionModel().selectedRows()
+        change = self.table.item(rows[0].row(), 0).data(Qt.UserRole) if rows else None
+        if change is None or change.status != "modified":
+            self.preview_label.setText("Select a modified frame to see its pixel differences")
+            return
+        
+        # Only modified frames are decoded
+        try:
+            old_image = decode_frame(self.document_frames(self.old_input.text())[change.old_index])
+            new_image = decode_frame(self.document_frames(self.new_input.text())[change.new_index])
+        except Exception as e:
+            self.preview_label.setText(f"Could not decode the frames: {str(e)}")
+            return
+        if old_image is None or new_image is None or old_image.isNull() or new_image.isNull():
+            self.preview_label.setText("One of the frames has no image")
+            return
+        heatmap, changed = pixel_diff_heatmap(old_image, new_image)
+        for preview, image in zip(self.previews, (old_image, new_image, heatmap)):
+            preview.setPixmap(QPixmap.fromImage(image).scaled(self.PREVIEW_SIZE, self.PREVIEW_SIZE,
+                                                              Qt.KeepAspectRatio, Qt.FastTransformation))
+        total = heatmap.width() * heatmap.height()
+        self.preview_label.setText(f"{changed} of {total} pixels differ ({changed / total * 100:.1f}%)")
+
+
+class ArchiveScanDialog(QDialog):
+    """Find ASF/SPR documents embedded in a large file, then open or extract them"""
+    HEADERS = ["Offset", "Type", "Frames", "Size", "Directions", "KB"]
+    
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Scan Archive")
+        self.resize(720, 520)
+        self.documents = []
+        self.scanned_path = ""
+        self.init_ui()
+    
+    def init_ui(self):
+        layout = QVBoxLayout(self)
+        
+        file_layout = QHBoxLayout()
+        self.path_input = QLineEdit()
+        self.path_input.setPlaceholderText("Archive or data file")
+        self.browse_btn = QPushButton("Browse...")
+        self.browse_btn.clicked.connect(self.browse)
+        self.scan_btn = QPushButton("Scan")
+        self.scan_btn.clicked.connect(self.scan)
+        file_layout.addWidget(self.path_input)
+        file_layout.addWidget(self.browse_btn)
+        file_layout.addWidget(self.scan_btn)
+        layout.addLayout(file_layout)
+        
+        self.table = QTableWidget(0, len(self.HEADERS))
+        self.table.setHorizontalHeaderLabels(self.HEADERS)
+        self.table.verticalHeader().setVisible(False)
+        self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.table.setSelectionMode(QAbstractItemView.ExtendedSelection)
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.table.doubleClicked.connect(self.open_selected)
+        layout.addWidget(self.table)
+        
+        self.status_label = QLabel()
+        layout.addWidget(self.status_label)
+        
+        buttons_layout = QHBoxLayout()
+        self.open_btn = QPushButton("Open")
+        self.open_btn.clicked.connect(self.open_selected)
+        self.extract_selected_btn = QPushButton("Extract Selected...")
+        self.extract_selected_btn.clicked.connect(lambda: self.extract(self.selected_documents()))
+        self.extract_all_btn = QPushButton("Extract All...")
+        self.extract_all_btn.clicked.connect(lambda: self.extract(self.documents))
+        self.close_btn = QPushButton("Close")
+        self.close_btn.clicked.connect(self.close)
+        buttons_layout.addWidget(self.open_btn)
+        buttons_layout.addWidget(self.extract_selected_btn)
+        buttons_layout.addWidget(self.extract_all_btn)
+        buttons_layout.addStretch()
+        buttons_layout.addWidget(self.close_btn)
+        layout.addLayout(buttons_layout)
+    
+    def browse(self):
+        file_path, _ = QFileDialog.getOpenFileName(self, "Choose File", self.path_input.text(), "All Files (*)")
+        if file_path:
+            self.path_input.setText(file_path)
+    
+    def scan(self):
+        path = self.path_input.text()
+        start = time.perf_counter()
+        try:
+            self.documents = run_with_progress(self, "Scanning...",
+                                               lambda progress, cancelled: scan_embedded(path, progress,
+                                                                                         cancelled))
+        except Exception as e:
+            QMessageBox.critical(self, "Error", f"Failed to scan file: {str(e)}")
+            return
+        elapsed = time.perf_counter() - start
+        self.scanned_path = path
+        
+        self.table.setRowCount(len(self.documents))
+        for row, document in enumerate(self.documents):
+            values = (f"{document.offset:#010x}", document.kind, document.frame_count,
+                      f"{document.width}x{document.height}", document.direction_count,
+                      round(document.length / 1024))
+            for column, value in enumerate(values):
+                item = QTableWidgetItem()
+                item.setData(Qt.DisplayRole, value)
+                self.table.setItem(row, column, item)
+        size = os.path.getsize(path)
+        self.status_label.setText(f"Found {len(self.documents)} documents in {size / 1e6:.0f} MB "
+                                  f"in {elapsed:.2f} s ({size / 1e6 / max(elapsed, 1e-6):.0f} MB/s)")
+    
+    def selected_documents(self):
+        return [self.documents[index.row()] for index in self.table.selectionModel().selectedRows()]
+    
+    def open_selected(self):
+        documents = self.selected_documents()
+        if not documents:
+            return
+        editor = self.parent()
+        if editor.frames and editor.check_unsaved_changes():
+            return
+        document = documents[0]
+        editor.open_path(self.scanned_path, document.offset, document.kind)
+    
+    def extract(self, documents):
+        if not documents:
+            QMessageBox.warning(self, "Warning", "No documents to extract")
+            return
+        directory = QFileDialog.getExistingDirectory(self, "Extract To")
+        if not directory:
+            return
+        try:
+            paths = extract_embedded(self.scanned_path, documents, directory)
+        except Exception as e:
+            QMessageBox.critical(self, "Error", f"Failed to extract documents: {str(e)}")
+            return
+        self.status_label.setText(f"Extracted {len(paths)} documents to {directory}")
+
+
+class ProfilerPanel(QDockWidget):
+    """Dockable table of profiler span statistics and frame cache hit rate"""
+    COLUMNS = ["Span", "Count", "Total ms", "Mean ms", "Max ms", "Last ms", "KB"]
+    
+    def __init__(self, parent, profiler, frame_cache):
+        super().__init__("Profiler", parent)
+        self.profiler = profiler
+        self.frame_cache = frame_cache
+        self.setObjectName("profiler_panel")
+        
+        widget = QWidget()
+        layout = QVBoxLayout(widget)
+        
+        self.table = QTableWidget(0, len(self.COLUMNS))
+        self.table.setHorizontalHeaderLabels(self.COLUMNS)
+        self.table.verticalHeader().setVisible(False)
+        self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.table.horizontalHeader().setSectionResizeMode(0, QHeaderView.Stretch)
+        layout.addWidget(self.table)
+        
+        self.cache_label = QLabel()
+        layout.addWidget(self.cache_label)
+        
+        buttons_layout = QHBoxLayout()
+        self.clear_btn = QPushButton("Clear")
+        self.clear_btn.clicked.connect(self.clear)
+        self.save_json_btn = QPushButton("Save JSON...")
+        self.save_json_btn.clicked.connect(self.save_json)
+        self.save_trace_btn = QPushButton("Save Chrome Trace...")
+        self.save_trace_btn.clicked.connect(self.save_trace)
+        buttons_layout.addWidget(self.clear_btn)
+        buttons_layout.addStretch()
+        buttons_layout.addWidget(self.save_json_btn)
+        buttons_layout.addWidget(self.save_trace_btn)
+        layout.addLayout(buttons_layout)
+        
+        self.setWidget(widget)
+    
+    def cache_stats(self):
+        cache = self.frame_cache
+        lookups = cache.hits + cache.misses
+        return {
+            "frame_cache_hits": cache.hits,
+            "frame_cache_misses": cache.misses,
+            "frame_cache_hit_rate": cache.hits / lookups if lookups else 0.0,
+            "frame_cache_bytes": cache.total_bytes,
+        }
     
-    def choose_shadow_color(self):
-        if self.frame:
-            color = QColorDialog.getColor(self.frame.shadow_color, self, "Choose Shadow Color")
-            if color.isValid():
-                self.frame.shadow_color = color
+    def refresh(self, summary=None):
+        """Show span statistics (the profiler's current summary by default)"""
+        if summary is None:
+            summary = self.profiler.summary()
+        self.table.setRowCount(len(summary))
+        for row, (name, entry) in enumerate(summary.items()):
+            values = [name, str(entry["count"]), f"{entry['total'] * 1000:.1f}",
+                      f"{entry['mean'] * 1000:.2f}", f"{entry['max'] * 1000:.2f}",
+                      f"{entry['last'] * 1000:.2f}", f"{entry['bytes'] / 1024:.0f}"]
+            for column, value in enumerate(values):
+                item = self.table.item(row, column)
+                if item is None:
+                    item = QTableWidgetItem()
+                    if column:
+                        item.setTextAlignment(Qt.AlignRight | Qt.AlignVCenter)
+                    self.table.setItem(row, column, item)
+                item.setText(value)
+        
+        stats = self.cache_stats()
+        self.cache_label.setText(
+            f"Frame cache: {stats['frame_cache_hit_rate']:.0%} hits "
+            f"({stats['frame_cache_hits']} / {stats['frame_cache_hits'] + stats['frame_cache_misses']}), "
+            f"{stats['frame_cache_bytes'] / (1024 * 1024):.0f} MB | "
+            f"{len(self.profiler.events)} / {self.profiler.events.maxlen} events")
+    
+    def clear(self):
+        self.profiler.clear()
+        self.refresh()
+    
+    def save_json(self):
+        file_path, _ = QFileDialog.getSaveFileName(self, "Save Profile", "profile.json",
+                                                   "JSON Files (*.json)")
+        if file_path:
+            try:
+                self.profiler.write_json(file_path, self.cache_stats())
+            except Exception as e:
+                QMessageBox.critical(self, "Error", f"Failed to save profile: {str(e)}")
+    
+    def save_trace(self):
+        file_path, _ = QFileDialog.getSaveFileName(self, "Save Chrome Trace", "trace.json",
+                                                   "JSON Files (*.json)")
+        if file_path:
+            try:
+                self.profiler.write_chrome_trace(file_path)
+            except Exception as e:
+                QMessageBox.critical(self, "Error", f"Failed to save trace: {str(e)}")
+
+
+class FrameView(QAbstractScrollArea):
+    """Zoomable, pannable frame viewer that repaints only visible tiles
+
+    The composite is cut into TILE_SIZE x TILE_SIZE device-pixel tiles,
+    rendered on demand at the current zoom (nearest-neighbour when magnified)
+    and kept in an LRU cache, so scrolling only renders newly exposed tiles.
+    """
+    zoom_changed = pyqtSignal(float)
+    
+    TILE_SIZE = 256
+    MAX_TILES = 256
+    ZOOM_LEVELS = [0.125, 0.25, 0.5, 0.75, 1, 1.5, 2, 3, 4, 6, 8, 12, 16, 24, 32]
+    GRID_MIN_ZOOM = 6  # Pixel grid is only drawn from this zoom upwards
+    
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.image = QImage()
+        self.zoom = 1.0
+        self.show_grid = False
+        self.tiles = OrderedDict()  # (column, row) -> QPixmap
+        self.pan_start = None
+        self.viewport().setMouseTracking(False)
+    
+    def set_image(self, image):
+        """Show a new composite, keeping zoom and scroll position"""
+        self.image = image
+        self.tiles.clear()
+        self.update_scrollbars()
+        self.viewport().update()
+    
+    def clear(self):
+        self.set_image(QImage())
+    
+    def set_zoom(self, zoom, anchor=None):
+        """Set the zoom factor, keeping the image point under anchor in place"""
+        zoom = max(self.ZOOM_LEVELS[0], min(self.ZOOM_LEVELS[-1], zoom))
+        if zoom == self.zoom:
+            return
+        if anchor is None:
+            anchor = self.viewport().rect().center()
+        image_x, image_y = self.to_image(anchor)
+        
+        self.zoom = zoom
+        self.tiles.clear()
+        self.update_scrollbars()
+        
+        # Scroll so the anchored image point stays under the cursor
+        origin_x, origin_y = self.origin()
+        self.horizontalScrollBar().setValue(round(image_x * zoom - (anchor.x() - origin_x)))
+        self.verticalScrollBar().setValue(round(image_y * zoom - (anchor.y() - origin_y)))
+        self.viewport().update()
+        self.zoom_changed.emit(zoom)
+    
+    def zoom_in(self, anchor=None):
+        larger = [level for level in self.ZOOM_LEVELS if level > self.zoom]
+        if larger:
+            self.set_zoom(larger[0], anchor)
+    
+    def zoom_out(self, anchor=None):
+        smaller = [level for level in self.ZOOM_LEVELS if level < self.zoom]
+        if smaller:
+            self.set_zoom(smaller[-1], anchor)
+    
+    def zoom_to_fit(self):
+        if self.image.isNull():
+            return
+        viewport = self.viewport().size()
+        self.set_zoom(min(viewport.width() / self.image.width(), viewport.height() / self.image.height()))
+    
+    def set_show_grid(self, show):
+        self.show_grid = show
+        self.tiles.clear()
+        self.viewport().update()
+    
+    def content_size(self):
+        return (math.ceil(self.image.width() * self.zoom), math.ceil(self.image.height() * self.zoom))
+    
+    def origin(self):
+        """Viewport position of the image's top-left corner"""
+        width, height = self.content_size()
+        viewport = self.viewport().size()
+        x = (viewport.width() - width) // 2 if width < viewport.width() else -self.horizontalScrollBar().value()
+        y = (viewport.height() - height) // 2 if height < viewport.height() else -self.verticalScrollBar().value()
+        return x, y
+    
+    def to_image(self, point):
+        """Map a viewport point to image coordinates"""
+        origin_x, origin_y = self.origin()
+        return (point.x() - origin_x) / self.zoom, (point.y() - origin_y) / self.zoom
+    
+    def update_scrollbars(self):
+        width, height = self.content_size()
+        viewport = self.viewport().size()
+        self.horizontalScrollBar().setRange(0, max(0, width - viewport.width()))
+        self.horizontalScrollBar().setPageStep(viewport.width())
+        self.verticalScrollBar().setRange(0, max(0, height - viewport.height()))
+        self.verticalScrollBar().setPageStep(viewport.height())
+    
+    def tile(self, column, row):
+        """Return the cached rendering of one tile at the current zoom"""
+        key = (column, row)
+        pixmap = self.tiles.get(key)
+        if pixmap is not None:
+            self.tiles.move_to_end(key)
+            return pixmap
+            
+        size = self.TILE_SIZE
+        pixmap = QPixmap(size, size)
+        pixmap.fill(Qt.transparent)
+        painter = QPainter(pixmap)
+        painter.setRenderHint(QPainter.SmoothPixmapTransform, self.zoom < 1)
+        
+        # Source pixels covering this tile (fractional at non-integer zoom)
+        source = QRectF(column * size / self.zoom, row * size / self.zoom, size / self.zoom, size / self.zoom)
+        painter.drawImage(QRectF(0, 0, size, size), self.image, source)
+        
+        if self.show_grid and self.zoom >= self.GRID_MIN_ZOOM:
+            painter.setPen(QPen(QColor(0, 0, 0, 80), 0))
+            first_x = math.ceil(source.left())
+            first_y = math.ceil(source.top())
+            for x in range(first_x, min(math.ceil(source.right()), self.image.width()) + 1):
+                offset = round((x - source.left()) * self.zoom)
+                painter.drawLine(offset, 0, offset, size)
+            for y in range(first_y, min(math.ceil(source.bottom()), self.image.height()) + 1):
+                offset = round((y - source.top()) * self.zoom)
+                painter.drawLine(0, offset, size, offset)
+        painter.end()
+        
+        self.tiles[key] = pixmap
+        while len(self.tiles) > self.MAX_TILES:
+            self.tiles.popitem(last=False)
+        return pixmap
+    
+    def paintEvent(self, event):
+        if self.image.isNull():
+            return
+            
+        painter = QPainter(self.viewport())
+        origin_x, origin_y = self.origin()
+        width, height = self.content_size()
+        painter.setClipRect(QRect(origin_x, origin_y, width, height).intersected(event.rect()))
+        
+        # Only the tiles intersecting the exposed area are drawn (or rendered)
+        exposed = event.rect().translated(-origin_x, -origin_y)
+        size = self.TILE_SIZE
+        first_column = max(0, exposed.left() // size)
+        last_column = min((width - 1) // size, exposed.right() // size)
+        first_row = max(0, exposed.top() // size)
+        last_row = min((height - 1) // size, exposed.bottom() // size)
+        for row in range(first_row, last_row + 1):
+            for column in range(first_column, last_column + 1):
+                painter.drawPixmap(origin_x + column * size, origin_y + row * size, self.tile(column, row))
+    
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self.update_scrollbars()
+    
+    def scrollContentsBy(self, dx, dy):
+        self.viewport().update()
+    
+    def wheelEvent(self, event):
+        # Ctrl+wheel zooms around the cursor, plain wheel scrolls
+        if event.modifiers() & Qt.ControlModifier:
+            if event.angleDelta().y() > 0:
+                self.zoom_in(event.pos())
+            elif event.angleDelta().y() < 0:
+                self.zoom_out(event.pos())
+            event.accept()
+        else:
+            super().wheelEvent(event)
+    
+    def mousePressEvent(self, event):
+        if event.button() in (Qt.LeftButton, Qt.MiddleButton):
+            self.pan_start = (event.pos(), self.horizontalScrollBar().value(), self.verticalScrollBar().value())
+            self.viewport().setCursor(Qt.ClosedHandCursor)
+        super().mousePressEvent(event)
+    
+    def mouseMoveEvent(self, event):
+        if self.pan_start is not None:
+            start, scroll_x, scroll_y = self.pan_start
+            delta = event.pos() - start
+            self.horizontalScrollBar().setValue(scroll_x - delta.x())
+            self.verticalScrollBar().setValue(scroll_y - delta.y())
+        super().mouseMoveEvent(event)
+    
+    def mouseReleaseEvent(self, event):
+        self.pan_start = None
+        self.viewport().unsetCursor()
+        super().mouseReleaseEvent(event)
 
 
 class EnhancedPyAsfTool(QMainWindow):
@@ -108,12 +4627,32 @@ class EnhancedPyAsfTool(QMainWindow):
         self.header = ASFHeader() # File header info
         self.current_frame = 0  # Current frame index
         self.is_playing = False # Animation playback state
-        self.animation_timer = QTimer() # Timer for animation
-        self.animation_timer.timeout.connect(self.next_frame)
+        self.disk_cache = DiskCache() # Decoded frames and thumbnails across sessions
+        self.trim_frames = True       # Trim frames to their visible bounds on load/import
+        self.delta_keyframe_interval = 0  # > 1 saves ASF frames as deltas against keyframes
+        self.frame_cache = FrameCache() # Decoded frame images
+        self.memory_manager = MemoryManager(self.frame_cache)
+        self.memory_timer = QTimer(self) # Periodic memory budget check
+        self.memory_timer.timeout.connect(self.enforce_memory_budget)
+        self.memory_timer.start(2000)
+        self.profiler_panel = None     # Built the first time profiling is turned on
+        self.catalogue = None          # Asset catalogue database, opened on first use
+        self.catalogue_dialog = None
+        self.profiler_timer = QTimer(self)
+        self.profiler_timer.timeout.connect(self.update_profiler_views)
+        # Playback composites on worker threads from a copy of the background colour
+        self.playback = PlaybackEngine(self.frame_cache, composite_frame,
+                                       lambda: QColor(self.background_color), parent=self)
+        self.playback.frame_ready.connect(self.on_playback_frame)
+        self.last_stats_update = 0.0
+        self.direction_preview = None # Direction preview window
+        self.playback_selecting = False # Frame list follows playback
+        self.onion_skin = OnionSkinRenderer(self.frame_cache)
         
         # Custom settings
         self.background_color = QColor(128, 128, 128)  # Default background color
         self.lock_offsets = False  # Lock offsets across frames
+        self.history = UndoHistory()  # Undo/redo steps of frame and header edits
         
         self.init_ui()
         
@@ -163,8 +4702,10 @@ class EnhancedPyAsfTool(QMainWindow):
         # Read Offset
         params_layout.addWidget(QLabel("Read Offset:"), 1, 2)
         self.read_offset_input = QSpinBox()
-        self.read_offset_input.setRange(-999, 999)
+        self.read_offset_input.setRange(0, 2 ** 31 - 1)
         self.read_offset_input.setValue(0)
+        self.read_offset_input.setToolTip("Byte offset of the ASF/SPR data inside the file opened next, "
+                                          "for sprites embedded in archives (see File > Scan Archive...)")
         params_layout.addWidget(self.read_offset_input, 1, 3)
         
         main_layout.addWidget(params_group)
@@ -180,8 +4721,13 @@ class EnhancedPyAsfTool(QMainWindow):
         frame_list_label = QLabel("Frame list:")
         left_layout.addWidget(frame_list_label)
         
-        self.frame_list = QListWidget()
-        self.frame_list.itemSelectionChanged.connect(self.on_frame_selected)
+        self.frame_model = FrameListModel(self)
+        self.frame_list = FrameListView()
+        self.frame_list.setModel(self.frame_model)
+        self.frame_list.setUniformItemSizes(True)
+        self.frame_list.setIconSize(QSize(self.frame_model.thumbnails.size, self.frame_model.thumbnails.size))
+        self.frame_list.setSelectionMode(QAbstractItemView.ExtendedSelection)
+        self.frame_list.selectionModel().currentRowChanged.connect(self.on_frame_selected)
         left_layout.addWidget(self.frame_list)
         
         # Frame control buttons
@@ -211,20 +4757,47 @@ class EnhancedPyAsfTool(QMainWindow):
         right_layout = QVBoxLayout(right_panel)
         
         # Tabs for display and edit
-        tabs = QTabWidget()
-        right_layout.addWidget(tabs)
+        self.tabs = QTabWidget()
+        right_layout.addWidget(self.tabs)
         
         # Display tab
         display_tab = QWidget()
         display_layout = QVBoxLayout(display_tab)
         
         # Image display area
-        self.image_scroll = QScrollArea()
-        self.image_scroll.setWidgetResizable(True)
-        self.image_label = QLabel()
-        self.image_label.setAlignment(Qt.AlignCenter)
-        self.image_scroll.setWidget(self.image_label)
-        display_layout.addWidget(self.image_scroll)
+        self.image_view = FrameView()
+        self.image_view.zoom_changed.connect(self.update_zoom_label)
+        display_layout.addWidget(self.image_view)
+        
+        # Zoom controls
+        zoom_controls = QWidget()
+        zoom_layout = QHBoxLayout(zoom_controls)
+        
+        self.zoom_out_btn = QPushButton("-")
+        self.zoom_out_btn.clicked.connect(lambda: self.image_view.zoom_out())
+        zoom_layout.addWidget(self.zoom_out_btn)
+        
+        self.zoom_label = QLabel("100%")
+        zoom_layout.addWidget(self.zoom_label)
+        
+        self.zoom_in_btn = QPushButton("+")
+        self.zoom_in_btn.clicked.connect(lambda: self.image_view.zoom_in())
+        zoom_layout.addWidget(self.zoom_in_btn)
+        
+        self.zoom_reset_btn = QPushButton("1:1")
+        self.zoom_reset_btn.clicked.connect(lambda: self.image_view.set_zoom(1))
+        zoom_layout.addWidget(self.zoom_reset_btn)
+        
+        self.zoom_fit_btn = QPushButton("Fit")
+        self.zoom_fit_btn.clicked.connect(self.image_view.zoom_to_fit)
+        zoom_layout.addWidget(self.zoom_fit_btn)
+        
+        self.pixel_grid_checkbox = QCheckBox("Pixel Grid")
+        self.pixel_grid_checkbox.toggled.connect(self.image_view.set_show_grid)
+        zoom_layout.addWidget(self.pixel_grid_checkbox)
+        
+        zoom_layout.addStretch()
+        display_layout.addWidget(zoom_controls)
         
         # Animation controls
         animation_controls = QWidget()
@@ -249,9 +4822,56 @@ class EnhancedPyAsfTool(QMainWindow):
         # Add extra frame adjustments
         self.create_frame_adjustments(display_tab, display_layout)
         
-        # Edit tab
-        edit_tab = QWidget()
-        edit_layout = QGridLayout(edit_tab)
+        # Edit tab, filled in the first time it is shown
+        self.edit_tab = QWidget()
+        self.edit_tab_built = False
+        
+        # Add tabs to tab widget
+        self.tabs.addTab(display_tab, "Display")
+        self.tabs.addTab(self.edit_tab, "Edit")
+        self.tabs.currentChanged.connect(self.on_tab_changed)
+        
+        # Add panels to splitter
+        splitter.addWidget(left_panel)
+        splitter.addWidget(right_panel)
+        splitter.setSizes([200, 700])
+        
+        # Status bar
+        self.status_bar = QStatusBar()
+        self.setStatusBar(self.status_bar)
+        self.status_bar.showMessage("Ready")
+        
+        # Playback timing stats
+        self.playback_stats_label = QLabel()
+        self.status_bar.addPermanentWidget(self.playback_stats_label)
+        
+        # Memory usage against the budget
+        self.memory_label = QLabel()
+        self.status_bar.addPermanentWidget(self.memory_label)
+        
+        # Latest profiler timings, shown while profiling
+        self.profiler_label = QLabel()
+        self.profiler_label.hide()
+        self.status_bar.addPermanentWidget(self.profiler_label)
+        
+        # Update UI state
+        self.update_ui_state()
+
+    def on_tab_changed(self, index):
+        if self.tabs.widget(index) is self.edit_tab:
+            self.ensure_edit_tab()
+    
+    def ensure_edit_tab(self):
+        """Build the Edit tab's frame, shadow and utility controls on first use
+        
+        They are hidden at startup, so building them later keeps them off the
+        path to the first paint.
+        """
+        if self.edit_tab_built:
+            return
+        self.edit_tab_built = True
+        edit_layout = QGridLayout(self.edit_tab)
+        
         
         # Frame information
         frame_info_group = QGroupBox("Frame Information")
@@ -362,6 +4982,10 @@ class EnhancedPyAsfTool(QMainWindow):
         self.transparency_threshold.setValue(0)
         utils_layout.addWidget(self.transparency_threshold, 1, 1)
         
+        self.colour_key_btn = QPushButton("Apply...")
+        self.colour_key_btn.clicked.connect(self.show_colour_key_dialog)
+        utils_layout.addWidget(self.colour_key_btn, 1, 2)
+        
         # File name
         utils_layout.addWidget(QLabel("Filename:"), 2, 0)
         self.filename_input = QLineEdit()
@@ -383,23 +5007,17 @@ class EnhancedPyAsfTool(QMainWindow):
         
         edit_layout.addWidget(utils_group, 2, 0)
         
-        # Add tabs to tab widget
-        tabs.addTab(display_tab, "Display")
-        tabs.addTab(edit_tab, "Edit")
-        
-        # Add panels to splitter
-        splitter.addWidget(left_panel)
-        splitter.addWidget(right_panel)
-        splitter.setSizes([200, 700])
-        
-        # Status bar
-        self.status_bar = QStatusBar()
-        self.setStatusBar(self.status_bar)
-        self.status_bar.showMessage("Ready")
-        
-        # Update UI state
-        self.update_ui_state()
-
+        # Bring the new controls up to date
+        self.show_file_name()
+        self.colour_key_btn.setEnabled(len(self.frames) > 0)
+        if 0 <= self.current_frame < len(self.frames):
+            self.update_controls_from_frame(self.frames[self.current_frame])
+    
+    def show_file_name(self):
+        """Show the current file's name in the Edit tab"""
+        if self.edit_tab_built:
+            self.filename_input.setText(os.path.basename(self.current_file) if self.current_file else "")
+    
     def create_frame_adjustments(self, parent_widget, parent_layout):
         """Create frame adjustment controls"""
         frame_adjust_group = QGroupBox("Frame Spacing")
@@ -452,6 +5070,53 @@ class EnhancedPyAsfTool(QMainWindow):
         offset_layout.addWidget(self.advanced_offset_btn, 0, 5)
         
         parent_layout.addWidget(offset_group)
+        
+        # Onion skin group
+        onion_group = QGroupBox("Onion Skin")
+        onion_layout = QHBoxLayout(onion_group)
+        
+        self.onion_skin_checkbox = QCheckBox("Show")
+        self.onion_skin_checkbox.stateChanged.connect(self.update_onion_skin)
+        onion_layout.addWidget(self.onion_skin_checkbox)
+        
+        onion_layout.addWidget(QLabel("Before:"))
+        self.onion_before_spin = QSpinBox()
+        self.onion_before_spin.setRange(0, 8)
+        self.onion_before_spin.setValue(1)
+        self.onion_before_spin.valueChanged.connect(self.update_onion_skin)
+        onion_layout.addWidget(self.onion_before_spin)
+        
+        onion_layout.addWidget(QLabel("After:"))
+        self.onion_after_spin = QSpinBox()
+        self.onion_after_spin.setRange(0, 8)
+        self.onion_after_spin.setValue(1)
+        self.onion_after_spin.valueChanged.connect(self.update_onion_skin)
+        onion_layout.addWidget(self.onion_after_spin)
+        
+        onion_layout.addWidget(QLabel("Opacity %:"))
+        self.onion_opacity_spin = QSpinBox()
+        self.onion_opacity_spin.setRange(5, 100)
+        self.onion_opacity_spin.setValue(40)
+        self.onion_opacity_spin.valueChanged.connect(self.update_onion_skin)
+        onion_layout.addWidget(self.onion_opacity_spin)
+        
+        onion_layout.addWidget(QLabel("Falloff %:"))
+        self.onion_falloff_spin = QSpinBox()
+        self.onion_falloff_spin.setRange(10, 100)
+        self.onion_falloff_spin.setValue(60)
+        self.onion_falloff_spin.valueChanged.connect(self.update_onion_skin)
+        onion_layout.addWidget(self.onion_falloff_spin)
+        
+        parent_layout.addWidget(onion_group)
+    
+    def update_onion_skin(self):
+        """Apply onion skin settings and redraw the current frame"""
+        self.onion_skin.enabled = self.onion_skin_checkbox.isChecked()
+        self.onion_skin.before = self.onion_before_spin.value()
+        self.onion_skin.after = self.onion_after_spin.value()
+        self.onion_skin.opacity = self.onion_opacity_spin.value() / 100.0
+        self.onion_skin.falloff = self.onion_falloff_spin.value() / 100.0
+        self.display_frame(self.current_frame)
     
     def create_menus(self):
         """Create main menu"""
@@ -469,6 +5134,33 @@ class EnhancedPyAsfTool(QMainWindow):
         open_spr_action.triggered.connect(self.open_spr)
         file_menu.addAction(open_spr_action)
         
+        # Import many images, sheets or animations as frames
+        import_frames_action = QAction("Import Frames...", self)
+        import_frames_action.setShortcut("Ctrl+I")
+        import_frames_action.triggered.connect(self.import_frames)
+        file_menu.addAction(import_frames_action)
+        
+        # Search indexed asset folders
+        catalogue_action = QAction("Open from Catalogue...", self)
+        catalogue_action.setShortcut("Ctrl+Shift+O")
+        catalogue_action.triggered.connect(self.open_catalogue)
+        file_menu.addAction(catalogue_action)
+        
+        # Look up near-duplicates of the current frame in the catalogue
+        similar_action = QAction("Find Similar Frames...", self)
+        similar_action.triggered.connect(self.find_similar_frames)
+        file_menu.addAction(similar_action)
+        
+        # Frame-level diff of two files
+        compare_action = QAction("Compare Files...", self)
+        compare_action.triggered.connect(self.compare_files)
+        file_menu.addAction(compare_action)
+        
+        # Find sprites embedded in game archives
+        scan_archive_action = QAction("Scan Archive...", self)
+        scan_archive_action.triggered.connect(self.scan_archive)
+        file_menu.addAction(scan_archive_action)
+        
         file_menu.addSeparator()
         
         # Save file
@@ -511,6 +5203,32 @@ class EnhancedPyAsfTool(QMainWindow):
         exit_action.triggered.connect(self.close)
         file_menu.addAction(exit_action)
         
+        # Edit menu
+        edit_menu = menu_bar.addMenu("Edit")
+        
+        # Undo / redo
+        self.undo_action = QAction("Undo", self)
+        self.undo_action.setShortcut("Ctrl+Z")
+        self.undo_action.triggered.connect(self.undo)
+        edit_menu.addAction(self.undo_action)
+        
+        self.redo_action = QAction("Redo", self)
+        self.redo_action.setShortcuts(["Ctrl+Y", "Ctrl+Shift+Z"])
+        self.redo_action.triggered.connect(self.redo)
+        edit_menu.addAction(self.redo_action)
+        
+        edit_menu.addSeparator()
+        
+        # Colour key / alpha threshold
+        self.colour_key_action = QAction("Colour Key / Alpha Threshold...", self)
+        self.colour_key_action.triggered.connect(self.show_colour_key_dialog)
+        edit_menu.addAction(self.colour_key_action)
+        
+        # Merge identical consecutive frames
+        self.compact_timeline_action = QAction("Compact Timeline", self)
+        self.compact_timeline_action.triggered.connect(self.compact_timeline)
+        edit_menu.addAction(self.compact_timeline_action)
+        
         # Export menu
         export_menu = menu_bar.addMenu("Export")
         
@@ -529,11 +5247,68 @@ class EnhancedPyAsfTool(QMainWindow):
         self.export_sprite_sheet_action.triggered.connect(self.export_sprite_sheet)
         export_menu.addAction(self.export_sprite_sheet_action)
         
+        # Export packed atlas
+        self.export_atlas_action = QAction("Export Atlas...", self)
+        self.export_atlas_action.triggered.connect(self.export_atlas)
+        export_menu.addAction(self.export_atlas_action)
+        
+        # Export animated GIF / APNG / WebP
+        self.export_animation_action = QAction("Export Animation...", self)
+        self.export_animation_action.triggered.connect(self.export_animation)
+        export_menu.addAction(self.export_animation_action)
+        
         # Export TGA
         self.export_tga_action = QAction("Export TGA", self)  # Define as class member
         self.export_tga_action.triggered.connect(self.export_tga)
         export_menu.addAction(self.export_tga_action)
         
+        # View menu
+        view_menu = menu_bar.addMenu("View")
+        
+        # Preview all directions at once
+        self.direction_preview_action = QAction("Direction Preview", self)
+        self.direction_preview_action.triggered.connect(self.show_direction_preview)
+        view_menu.addAction(self.direction_preview_action)
+        
+        # Opt-in timing of load, decode, display, save and export
+        self.profiler_action = QAction("Profiler", self)
+        self.profiler_action.setCheckable(True)
+        self.profiler_action.toggled.connect(self.toggle_profiler)
+        view_menu.addAction(self.profiler_action)
+        
+        # Settings menu
+        settings_menu = menu_bar.addMenu("Settings")
+        
+        # Persistent cache of decoded frames and thumbnails
+        self.disk_cache_action = QAction("Use Disk Cache", self)
+        self.disk_cache_action.setCheckable(True)
+        self.disk_cache_action.setChecked(self.disk_cache.enabled)
+        self.disk_cache_action.toggled.connect(self.toggle_disk_cache)
+        settings_menu.addAction(self.disk_cache_action)
+        
+        clear_disk_cache_action = QAction("Clear Disk Cache", self)
+        clear_disk_cache_action.triggered.connect(self.clear_disk_cache)
+        settings_menu.addAction(clear_disk_cache_action)
+        
+        # Store frames cut to their visible bounds
+        trim_frames_action = QAction("Trim Transparent Borders on Load", self)
+        trim_frames_action.setCheckable(True)
+        trim_frames_action.setChecked(self.trim_frames)
+        trim_frames_action.toggled.connect(self.toggle_trim_frames)
+        settings_menu.addAction(trim_frames_action)
+        
+        # Inter-frame delta encoding when saving ASF files
+        delta_encoding_action = QAction("Delta Encoding...", self)
+        delta_encoding_action.triggered.connect(self.set_delta_encoding)
+        settings_menu.addAction(delta_encoding_action)
+        
+        settings_menu.addSeparator()
+        
+        # Memory budget for frame data and decoded images
+        memory_budget_action = QAction("Memory Budget...", self)
+        memory_budget_action.triggered.connect(self.set_memory_budget)
+        settings_menu.addAction(memory_budget_action)
+        
         # Help menu
         help_menu = menu_bar.addMenu("Help")
         
@@ -597,13 +5372,12 @@ class EnhancedPyAsfTool(QMainWindow):
         if not self.frames or self.current_frame < 0:
             return
             
-        self.frames[self.current_frame].x_offset = value
-        
         # Apply offset to all frames if locked
-        if self.lock_offsets:
-            for i, frame in enumerate(self.frames):
-                if i != self.current_frame:
-                    frame.x_offset = value
+        frames = self.frames if self.lock_offsets else [self.frames[self.current_frame]]
+        step = self.begin_edit("Change X Offset", frames)
+        for frame in frames:
+            frame.x_offset = value
+        self.end_edit(step, ("x_offset", self.lock_offsets, self.current_frame))
         
         # Update display
         self.display_frame(self.current_frame)
@@ -613,13 +5387,12 @@ class EnhancedPyAsfTool(QMainWindow):
         if not self.frames or self.current_frame < 0:
             return
             
-        self.frames[self.current_frame].y_offset = value
-        
         # Apply offset to all frames if locked
-        if self.lock_offsets:
-            for i, frame in enumerate(self.frames):
-                if i != self.current_frame:
-                    frame.y_offset = value
+        frames = self.frames if self.lock_offsets else [self.frames[self.current_frame]]
+        step = self.begin_edit("Change Y Offset", frames)
+        for frame in frames:
+            frame.y_offset = value
+        self.end_edit(step, ("y_offset", self.lock_offsets, self.current_frame))
         
         # Update display
         self.display_frame(self.current_frame)
@@ -648,32 +5421,269 @@ class EnhancedPyAsfTool(QMainWindow):
             self.header.width = new_width
             self.header.height = new_height
             return
+            
+        if new_width == self.header.width and new_height == self.header.height:
+            return
         
-        # Ask user for confirmation if there are existing frames
-        reply = QMessageBox.question(self, "Resize Frames", 
-                                    "Do you want to resize all existing frames?",
-                                    QMessageBox.Yes | QMessageBox.No)
-                                    
-        if reply == QMessageBox.Yes:
-            # Update header
-            self.header.width = new_width
-            self.header.height = new_height
+        # Ask user for confirmation and resize options if there are existing frames
+        dialog = ResizeFramesDialog(self, (self.header.width, self.header.height),
+                                    (new_width, new_height))
+        if not dialog.exec_():
+            return
             
-            # Resize all frames
-            for frame in self.frames:
-                if frame.image_data:
-                    # Resize image data to new dimensions
-                    old_image = QImage.fromData(frame.image_data)
-                    new_image = old_image.scaled(new_width, new_height, Qt.KeepAspectRatio)
-                    
-                    # Convert back to byte array
-                    ba = QByteArray()
-                    buffer = QBuffer(ba)
-                    buffer.open(QIODevice.WriteOnly)
-                    new_image.save(buffer, "PNG")
-                    frame.image_data = ba.data()
-            # Update display
-            self.display_frame(self.current_frame)
+        resample, fit = dialog.settings()
+        indices = [i for i, frame in enumerate(self.frames) if frame.image_data]
+        payloads = {i: self.frames[i].image_data for i in indices}
+        trims = {i: self.frames[i].trim for i in indices}
+        
+        def resize_frame(index):
+            # Resize the full canvas; the result is stored untrimmed
+            image = QImage.fromData(payloads[index])
+            if trims[index] is not None:
+                image = untrim_image(image, trims[index])
+            return image_to_png_bytes(resize_image(image, new_width, new_height, resample, fit))
+        
+        try:
+            results = self.run_frame_job("Resizing frames...", resize_frame, indices)
+        except Exception as e:
+            QMessageBox.critical(self, "Error", f"Failed to resize frames: {str(e)}")
+            return
+        if results is None:
+            self.status_bar.showMessage("Resize cancelled")
+            return
+            
+        # Commit header and all frames together as one undo step
+        step = self.begin_edit("Resize Frames", [self.frames[i] for i in results])
+        step.capture_header(self.header)
+        self.header.width = new_width
+        self.header.height = new_height
+        for index, image_data in results.items():
+            self.frames[index].image_data = image_data
+            self.frames[index].trim = None
+        self.end_edit(step)
+        self.frame_model.frames_changed()
+        
+        # Update display
+        self.display_frame(self.current_frame)
+        self.status_bar.showMessage(f"Resized {len(results)} frames to {new_width}x{new_height}")
+    
+    def selected_frame_indices(self):
+        """Return sorted indices of the frames selected in the frame list"""
+        return sorted(index.row() for index in self.frame_list.selectionModel().selectedRows())
+    
+    def run_frame_job(self, title, func, indices):
+        """Run func(index) for every index on a worker pool with a progress dialog
+        
+        Returns {index: result}, or None if the user cancelled. func runs on worker
+        threads, so it must only touch data captured before the job started.
+        """
+        progress = QProgressDialog(title, "Cancel", 0, len(indices), self)
+        progress.setWindowModality(Qt.WindowModal)
+        progress.setMinimumDuration(300)
+        
+        results = {}
+        cancelled = False
+        with PROFILER.span("frame_job", title=title, frames=len(indices)), \
+                ThreadPoolExecutor(max_workers=os.cpu_count() or 4) as pool:
+            futures = {pool.submit(func, index): index for index in indices}
+            pending = set(futures)
+            while pending:
+                done, pending = wait(pending, timeout=0.05, return_when=FIRST_COMPLETED)
+                for future in done:
+                    results[futures[future]] = future.result()
+                progress.setValue(len(results))
+                QApplication.processEvents()
+                if progress.wasCanceled():
+                    cancelled = True
+                    for future in pending:
+                        future.cancel()
+                    break
+        progress.close()
+        
+        return None if cancelled else results
+    
+    def begin_edit(self, description, frames=()):
+        """Start an undo step, snapshotting the frames about to change"""
+        step = UndoStep(description)
+        step.capture(frames)
+        return step
+    
+    def end_edit(self, step, merge_key=None):
+        """Record a finished edit in the undo history
+        
+        Edits pushed back to back with the same merge_key (spin box steps on
+        one frame) are folded into a single step.
+        """
+        if self.history.push(step, self.header, merge_key):
+            self.update_history_actions()
+        self.refresh_direction_preview()
+    
+    def update_history_actions(self):
+        """Refresh the Undo/Redo menu entries"""
+        undo_text = self.history.undo_text()
+        redo_text = self.history.redo_text()
+        self.undo_action.setText(f"Undo {undo_text}" if undo_text else "Undo")
+        self.redo_action.setText(f"Redo {redo_text}" if redo_text else "Redo")
+        self.undo_action.setEnabled(bool(undo_text))
+        self.redo_action.setEnabled(bool(redo_text))
+    
+    def undo(self):
+        """Revert the last edit"""
+        if self.is_playing:
+            self.toggle_play()
+        step = self.history.undo(self.frame_model, self.header)
+        if step is not None:
+            self.after_history_change(step)
+            self.status_bar.showMessage(f"Undone: {step.description}")
+    
+    def redo(self):
+        """Reapply the last undone edit"""
+        if self.is_playing:
+            self.toggle_play()
+        step = self.history.redo(self.frame_model, self.header)
+        if step is not None:
+            self.after_history_change(step)
+            self.status_bar.showMessage(f"Redone: {step.description}")
+    
+    def after_history_change(self, step):
+        """Bring the widgets back in line with frames and header after undo/redo"""
+        if step.header_before is not None:
+            for spin, value in ((self.width_input, self.header.width),
+                                (self.height_input, self.header.height)):
+                spin.blockSignals(True)
+                spin.setValue(value)
+                spin.blockSignals(False)
+        
+        self.frame_model.frames_changed()
+        self.playback.invalidate()
+        self.onion_skin.clear()
+        self.refresh_direction_preview()
+        if self.frames:
+            row = min(max(self.current_frame, 0), len(self.frames) - 1)
+            self.current_frame = row
+            self.frame_list.setCurrentRow(row)
+            self.update_controls_from_frame(self.frames[row])
+            self.display_frame(row)
+        else:
+            self.current_frame = -1
+            self.image_view.clear()
+        self.update_history_actions()
+        self.update_ui_state()
+    
+    def compact_timeline(self):
+        """Merge runs of identical consecutive frames into one frame with their summed delay"""
+        if len(self.frames) < 2:
+            return
+        if self.current_file and self.current_file.lower().endswith('.spr'):
+            reply = QMessageBox.question(self, "Compact Timeline",
+                                         "SPR files do not store frame delays, so a compacted timeline "
+                                         "saved as SPR will play faster.\n\nContinue?",
+                                         QMessageBox.Yes | QMessageBox.No)
+            if reply != QMessageBox.Yes:
+                return
+        
+        frames = list(self.frames)
+        frame_cache = self.frame_cache
+        hashes = self.run_frame_job("Comparing frames...",
+                                    lambda i: frame_content_hash(frames[i], frame_cache),
+                                    compaction_candidates(frames))
+        if hashes is None:
+            self.status_bar.showMessage("Compaction cancelled")
+            return
+        
+        runs = compaction_runs(frames, hashes)
+        if not runs:
+            self.status_bar.showMessage("No identical consecutive frames to merge")
+            return
+        
+        step = self.begin_edit("Compact Timeline", [frames[start] for start, _ in runs])
+        removed_frames = removed_bytes = 0
+        # Back to front, so earlier rows keep their positions
+        for start, end in reversed(runs):
+            frames[start].delay = merged_delay(frames[start:end])
+            removed = step.remove_frames(self.frame_model, start + 1, end - start - 1)
+            removed_frames += len(removed)
+            removed_bytes += sum(frame.resident_bytes() for frame in removed)
+        self.end_edit(step)
+        
+        # Keep the current image selected
+        if 0 <= self.current_frame < len(frames):
+            current = frames[self.current_frame]
+            for start, end in runs:
+                if start <= self.current_frame < end:
+                    current = frames[start]
+            self.current_frame = self.frames.index(current)
+        self.after_history_change(step)
+        self.status_bar.showMessage(f"Compacted timeline: removed {removed_frames} frames "
+                                    f"({removed_bytes / 1024:.1f} KB)")
+    
+    def show_colour_key_dialog(self):
+        """Apply a colour key and/or alpha threshold to all or selected frames"""
+        if not self.frames:
+            QMessageBox.warning(self, "Warning", "No frames to process")
+            return
+            
+        selection = self.selected_frame_indices()
+        self.ensure_edit_tab()  # The alpha threshold lives on the Edit tab
+        dialog = ColourKeyDialog(self, self.transparency_threshold.value(), len(selection) > 1)
+        dialog.settings_changed()
+        accepted = dialog.exec_()
+        
+        # Drop the preview
+        self.display_frame(self.current_frame)
+        if not accepted:
+            return
+            
+        key_color, tolerance, alpha_threshold = dialog.settings()
+        self.transparency_threshold.setValue(alpha_threshold)
+        if key_color is None and alpha_threshold == 0:
+            return
+            
+        if dialog.selected_frames_radio.isChecked():
+            indices = selection
+        else:
+            indices = [i for i, frame in enumerate(self.frames) if frame.image_data]
+        payloads = {i: self.frames[i].image_data for i in indices}
+        
+        def key_frame(index):
+            pixels = qimage_to_array(QImage.fromData(payloads[index]))
+            if not apply_colour_key(pixels, key_color, tolerance, alpha_threshold):
+                return None
+            return image_to_png_bytes(array_to_qimage(pixels))
+        
+        try:
+            results = self.run_frame_job("Applying colour key...", key_frame, indices)
+        except Exception as e:
+            QMessageBox.critical(self, "Error", f"Failed to apply colour key: {str(e)}")
+            return
+        if results is None:
+            self.status_bar.showMessage("Colour key cancelled")
+            return
+            
+        # Commit all changed frames at once
+        changed = [index for index, image_data in results.items() if image_data is not None]
+        step = self.begin_edit("Colour Key", [self.frames[i] for i in changed])
+        for index in changed:
+            self.frames[index].image_data = results[index]
+        
+        if changed:
+            self.end_edit(step)
+            self.frame_model.frames_changed()
+        self.display_frame(self.current_frame)
+        self.status_bar.showMessage(f"Colour key changed {len(changed)} of {len(indices)} frames")
+    
+    def preview_colour_key(self, key_color, tolerance, alpha_threshold):
+        """Show the colour key result on the current frame without committing it"""
+        if not self.frames or self.current_frame < 0:
+            return
+            
+        frame = self.frames[self.current_frame]
+        if not frame.image_data:
+            return
+            
+        pixels = qimage_to_array(QImage.fromData(frame.image_data))
+        apply_colour_key(pixels, key_color, tolerance, alpha_threshold)
+        self.display_frame(self.current_frame, array_to_qimage(pixels))
     
     def update_shadow_settings(self, button):
         """Update shadow settings based on radio button selection"""
@@ -681,9 +5691,11 @@ class EnhancedPyAsfTool(QMainWindow):
             return
             
         frame = self.frames[self.current_frame]
+        step = self.begin_edit("Change Shadow", [frame])
         
         # Set shadow enabled based on radio button
         frame.shadow_enabled = (button.text() != "No Shadow")
+        self.end_edit(step)
         
         # Update display
         self.display_frame(self.current_frame)
@@ -694,7 +5706,9 @@ class EnhancedPyAsfTool(QMainWindow):
             return
             
         frame = self.frames[self.current_frame]
+        step = self.begin_edit("Change Shadow Offset", [frame])
         frame.shadow_x_offset = value
+        self.end_edit(step, ("shadow_x_offset", self.current_frame))
         
         # Update display
         self.display_frame(self.current_frame)
@@ -723,11 +5737,13 @@ class EnhancedPyAsfTool(QMainWindow):
             return
             
         frame = self.frames[self.current_frame]
+        step = self.begin_edit("Change Shadow Transparency", [frame])
         frame.shadow_transparency = value
         
         # Update shadow color with new transparency
         color = frame.shadow_color
         frame.shadow_color = QColor(color.red(), color.green(), color.blue(), value)
+        self.end_edit(step, ("shadow_transparency", self.current_frame))
         
         # Update display
         self.display_frame(self.current_frame)
@@ -738,6 +5754,7 @@ class EnhancedPyAsfTool(QMainWindow):
         if color.isValid():
             self.background_color = color
             self.bg_color_btn.setStyleSheet(f"background-color: {color.name()}")
+            self.playback.invalidate()
             
             # Update display
             self.display_frame(self.current_frame)
@@ -747,21 +5764,30 @@ class EnhancedPyAsfTool(QMainWindow):
         if not self.frames or self.current_frame < 0:
             return
             
-        self.frames[self.current_frame].direction = value
+        frame = self.frames[self.current_frame]
+        step = self.begin_edit("Change Direction", [frame])
+        frame.direction = value
+        self.end_edit(step, ("direction", self.current_frame))
     
     def update_frame_delay(self, value):
         """Update delay for current frame"""
         if not self.frames or self.current_frame < 0:
             return
             
-        self.frames[self.current_frame].delay = value
+        frame = self.frames[self.current_frame]
+        step = self.begin_edit("Change Delay", [frame])
+        frame.delay = value
+        self.end_edit(step, ("delay", self.current_frame))
     
     def update_frame_x_offset(self, value):
         """Update X offset for current frame"""
         if not self.frames or self.current_frame < 0:
             return
             
-        self.frames[self.current_frame].x_offset = value
+        frame = self.frames[self.current_frame]
+        step = self.begin_edit("Change X Offset", [frame])
+        frame.x_offset = value
+        self.end_edit(step, ("x_offset", False, self.current_frame))
         
         # Update display offset spinner to match
         self.frame_x_offset.blockSignals(True)
@@ -776,7 +5802,10 @@ class EnhancedPyAsfTool(QMainWindow):
         if not self.frames or self.current_frame < 0:
             return
             
-        self.frames[self.current_frame].y_offset = value
+        frame = self.frames[self.current_frame]
+        step = self.begin_edit("Change Y Offset", [frame])
+        frame.y_offset = value
+        self.end_edit(step, ("y_offset", False, self.current_frame))
         
         # Update display offset spinner to match
         self.frame_y_offset.blockSignals(True)
@@ -792,20 +5821,27 @@ class EnhancedPyAsfTool(QMainWindow):
         if self.frames and self.check_unsaved_changes():
             return
             
+        # Stop playback before the frames go away
+        if self.is_playing:
+            self.toggle_play()
+            
         # Reset to default state
         self.current_file = None
         self.current_file_type = None
-        self.frames = []
+        self.frame_model.set_frames([])
+        self.memory_manager.reset()
         self.header = ASFHeader()
+        self.refresh_direction_preview()
         self.current_frame = -1
         
         # Update UI with default values
         self.width_input.setValue(100)
         self.height_input.setValue(100)
         self.direction_input.setValue(1)
-        self.frame_list.clear()
-        self.image_label.clear()
-        self.filename_input.clear()
+        self.history.clear()
+        self.update_history_actions()
+        self.image_view.clear()
+        self.show_file_name()
         
         # Update UI state
         self.update_ui_state()
@@ -839,11 +5875,9 @@ class EnhancedPyAsfTool(QMainWindow):
             return
             
         try:
-            self.load_asf_file(file_path)
-            self.current_file = file_path
-            self.current_file_type = "ASF"
-            self.status_bar.showMessage(f"Opened ASF file: {file_path}")
-            self.filename_input.setText(os.path.basename(file_path))
+            offset = self.read_offset_input.value()
+            self.load_asf_file(file_path, offset)
+            self.set_opened_document(file_path, "ASF", offset)
         except Exception as e:
             QMessageBox.critical(self, "Error", f"Failed to open ASF file: {str(e)}")
     
@@ -858,14 +5892,95 @@ class EnhancedPyAsfTool(QMainWindow):
             return
             
         try:
-            self.load_spr_file(file_path)
-            self.current_file = file_path
-            self.current_file_type = "SPR"
-            self.status_bar.showMessage(f"Opened SPR file: {file_path}")
-            self.filename_input.setText(os.path.basename(file_path))
+            offset = self.read_offset_input.value()
+            self.load_spr_file(file_path, offset)
+            self.set_opened_document(file_path, "SPR", offset)
         except Exception as e:
             QMessageBox.critical(self, "Error", f"Failed to open SPR file: {str(e)}")
+    
+    def set_opened_document(self, file_path, file_type, offset=0):
+        """Record where the loaded document came from"""
+        self.current_file_type = file_type
+        if offset:
+            # Saving over the containing file would destroy it, so Save asks for a new name
+            self.current_file = None
+            self.status_bar.showMessage(f"Opened {file_type} embedded in {file_path} at offset {offset:#x}")
+        else:
+            self.current_file = file_path
+            self.status_bar.showMessage(f"Opened {file_type} file: {file_path}")
+        self.show_file_name()
+    
+    def ensure_catalogue(self):
+        """Open the asset catalogue database if needed; returns False on failure"""
+        if self.catalogue is None:
+            try:
+                self.catalogue = AssetCatalogue()
+            except Exception as e:
+                QMessageBox.critical(self, "Error", f"Failed to open catalogue: {str(e)}")
+                return False
+        return True
+    
+    def open_catalogue(self):
+        """Show the asset catalogue search window"""
+        if not self.ensure_catalogue():
+            return
+        if self.catalogue_dialog is None:
+            self.catalogue_dialog = CatalogueDialog(self, self.catalogue)
+        self.catalogue_dialog.show()
+        self.catalogue_dialog.raise_()
+    
+    def find_similar_frames(self):
+        """Search the catalogue for frames that look like the current one"""
+        if not self.frames or self.current_frame < 0:
+            QMessageBox.warning(self, "Warning", "No frame selected")
+            return
+        image = decode_frame(self.frames[self.current_frame], self.frame_cache)
+        if image is None or image.isNull():
+            QMessageBox.warning(self, "Warning", "The current frame has no image")
+            return
+        if not self.ensure_catalogue():
+            return
+        if self.catalogue.hashed_frame_count() == 0:
+            QMessageBox.information(self, "Similar Frames",
+                                    "No frames have been hashed yet. Index folders in the catalogue, "
+                                    "then use Hash Catalogue.")
+        dialog = SimilarFramesDialog(self, self.catalogue, image)
+        dialog.show()
+    
+    def compare_files(self):
+        """Show the file comparison window, starting from the open file"""
+        dialog = DiffDialog(self, self.current_file or "")
+        dialog.show()
+    
+    def scan_archive(self):
+        """Show the window for finding sprites embedded in other files"""
+        dialog = ArchiveScanDialog(self)
+        dialog.show()
+    
+    def open_path(self, file_path, offset=0, file_type=None):
+        """Open an ASF, SPR or TGA file by name, e.g. one given on the command line
+        
+        file_type ("ASF" or "SPR") overrides the extension, for documents
+        embedded at offset in some other file.
+        """
+        extension = os.path.splitext(file_path)[1].lower()
+        if file_type is None and extension == ".tga":
+            self.open_tga(file_path)
+            return
+            
+        if file_type is None:
+            file_type = "SPR" if extension == ".spr" else "ASF"
+        try:
+            if file_type == "SPR":
+                self.load_spr_file(file_path, offset)
+            else:
+                self.load_asf_file(file_path, offset)
+            self.set_opened_document(file_path, file_type, offset)
+        except Exception as e:
+            QMessageBox.critical(self, "Error", f"Failed to open {file_type} file: {str(e)}")
+    
     def open_tga(self, file_path):
+        from PIL import Image
         try:
             print(f"Opening TGA file: {file_path}")
             
@@ -933,197 +6048,68 @@ class EnhancedPyAsfTool(QMainWindow):
             QMessageBox.warning(self, "Error", f"Cannot load TGA file: {e}")
 
     def decode_tga(self, image_data, width, height, bits_per_pixel=32, image_descriptor=0):
-        """Decode TGA image data"""
-        try:
-            bytes_per_pixel = bits_per_pixel // 8
-            expected_size = width * height * bytes_per_pixel
-            
-            print(f"Decode TGA: {width}x{height}, {bits_per_pixel}bpp")
-            print(f"Expected data size: {expected_size}, actual: {len(image_data)}")
-            
-            if len(image_data) < expected_size:
-                print(f"Warning: Data size mismatch, using available data")
-            
-            if bits_per_pixel == 32:
-                # 32-bit BGRA
-                qimage = QImage(width, height, QImage.Format_ARGB32)
-                
-                for y in range(height):
-                    for x in range(width):
-                        pixel_idx = (y * width + x) * 4
-                        if pixel_idx + 3 < len(image_data):
-                            b = image_data[pixel_idx]
-                            g = image_data[pixel_idx + 1]
-                            r = image_data[pixel_idx + 2]
-                            a = image_data[pixel_idx + 3]
-                            
-                            # Kiểm tra origin (TGA có thể có origin ở dưới)
-                            actual_y = height - 1 - y if (image_descriptor & 0x20) == 0 else y
-                            qimage.setPixel(x, actual_y, qRgba(r, g, b, a))
-                            
-            elif bits_per_pixel == 24:
-                # 24-bit BGR
-                qimage = QImage(width, height, QImage.Format_RGB888)
-                
-                for y in range(height):
-                    for x in range(width):
-                        pixel_idx = (y * width + x) * 3
-                        if pixel_idx + 2 < len(image_data):
-                            b = image_data[pixel_idx]
-                            g = image_data[pixel_idx + 1]
-                            r = image_data[pixel_idx + 2]
-                            
-                            actual_y = height - 1 - y if (image_descriptor & 0x20) == 0 else y
-                            qimage.setPixel(x, actual_y, qRgb(r, g, b))
-            else:
-                print(f"Unsupported bit depth: {bits_per_pixel}")
-                return None
-                
-            return qimage
-            
-        except Exception as e:
-            print(f"Decode error: {e}")
-            return None
-
-    def decode_rle_tga(self, image_data, width, height, bits_per_pixel, image_descriptor):
-        """Decode RLE compressed TGA"""
-        try:
-            bytes_per_pixel = bits_per_pixel // 8
-            pixels = []
-            i = 0
-            
-            print(f"Decoding RLE TGA: {width}x{height}, {bits_per_pixel}bpp")
-            
-            while i < len(image_data) and len(pixels) < width * height * bytes_per_pixel:
-                if i >= len(image_data):
-                    break
-                    
-                packet_header = image_data[i]
-                i += 1
-                
-                if packet_header & 0x80:  # RLE packet
-                    count = (packet_header & 0x7F) + 1
-                    if i + bytes_per_pixel <= len(image_data):
-                        pixel_data = image_data[i:i + bytes_per_pixel]
-                        i += bytes_per_pixel
-                        
-                        # Repeat pixel
-                        for _ in range(count):
-                            pixels.extend(pixel_data)
-                            if len(pixels) >= width * height * bytes_per_pixel:
-                                break
-                else:  # Raw packet
-                    count = (packet_header & 0x7F) + 1
-                    for _ in range(count):
-                        if i + bytes_per_pixel <= len(image_data):
-                            pixels.extend(image_data[i:i + bytes_per_pixel])
-                            i += bytes_per_pixel
-                        if len(pixels) >= width * height * bytes_per_pixel:
-                            break
-            
-            print(f"RLE decoded {len(pixels)} bytes")
-            
-            # Tạo QImage từ decoded pixels
-            if bits_per_pixel == 32:
-                qimage = QImage(width, height, QImage.Format_ARGB32)
-                
-                for y in range(height):
-                    for x in range(width):
-                        pixel_idx = (y * width + x) * 4
-                        if pixel_idx + 3 < len(pixels):
-                            b = pixels[pixel_idx]
-                            g = pixels[pixel_idx + 1]
-                            r = pixels[pixel_idx + 2]
-                            a = pixels[pixel_idx + 3]
-                            
-                            actual_y = height - 1 - y if (image_descriptor & 0x20) == 0 else y
-                            qimage.setPixel(x, actual_y, qRgba(r, g, b, a))
-                            
-            elif bits_per_pixel == 24:
-                qimage = QImage(width, height, QImage.Format_RGB888)
-                
-                for y in range(height):
-                    for x in range(width):
-                        pixel_idx = (y * width + x) * 3
-                        if pixel_idx + 2 < len(pixels):
-                            b = pixels[pixel_idx]
-                            g = pixels[pixel_idx + 1]
-                            r = pixels[pixel_idx + 2]
-                            
-                            actual_y = height - 1 - y if (image_descriptor & 0x20) == 0 else y
-                            qimage.setPixel(x, actual_y, qRgb(r, g, b))
-            else:
-                return None
-                
-            return qimage
-            
-        except Exception as e:
-            print(f"RLE decode error: {e}")
-            return None
+        """Decode TGA image data"""
+        return decode_tga(image_data, width, height, bits_per_pixel, image_descriptor)
+
+    def decode_rle_tga(self, image_data, width, height, bits_per_pixel, image_descriptor):
+        """Decode RLE compressed TGA"""
+        return decode_rle_tga(image_data, width, height, bits_per_pixel, image_descriptor)
     
-    def load_spr_file(self, file_path):
+    def load_spr_file(self, file_path, offset=0):
         """Load SPR file data including TGA images"""
-        try:
-            with open(file_path, "rb") as f:
-                # Read and validate header
-                signature = f.read(3).decode('ascii')
-                if signature != "SPR":
-                    raise ValueError("Invalid SPR file signature")
-
-                # Read header data    
-                version = struct.unpack("<f", f.read(4))[0]
-                frame_count = struct.unpack("<I", f.read(4))[0]
-                width = struct.unpack("<I", f.read(4))[0]
-                height = struct.unpack("<I", f.read(4))[0]
-                direction_count = struct.unpack("<I", f.read(4))[0]
-
-                # Create header
-                self.header = SPRHeader()
-                self.header.version = version
-                self.header.frame_count = frame_count
-                self.header.width = width
-                self.header.height = height
-                self.header.direction_count = direction_count
-
-                # Update UI
-                self.width_input.setValue(width)
-                self.height_input.setValue(height)
-                self.direction_input.setValue(direction_count)
-
-                # Clear existing frames
-                self.frames = []
-                self.frame_list.clear()
-
-                # Read frame data
-                for i in range(frame_count):
-                    frame = ASFFrame()
-                    frame.direction = struct.unpack("<I", f.read(4))[0]
-                    data_size = struct.unpack("<I", f.read(4))[0]
-                    raw_data = f.read(data_size)
-
-                    # Always use manual decode for SPR (do not try QImage.loadFromData with TGA)
-                    image = self.decode_tga(raw_data, width, height)
-                    if image:
-                        ba = QByteArray()
-                        buffer = QBuffer(ba)
-                        buffer.open(QIODevice.WriteOnly)
-                        image.save(buffer, 'PNG')
-                        frame.image_data = ba.data()
-                        self.frames.append(frame)
-                        self.frame_list.addItem(f"Frame {len(self.frames)}")
-                    else:
-                        print(f"Failed to decode frame {i}")
+        with PROFILER.span("load_spr_file") as span:
+            if span:
+                span.set(bytes=os.path.getsize(file_path))
+            try:
+                header, frames = read_spr_document(file_path, self.disk_cache, self.trim_frames, offset)
+            except Exception as e:
+                raise Exception(f"Failed to load SPR file: {str(e)}")
+            self.show_document(header, frames)
 
-            # Select first frame if available
-            if self.frames:
-                self.current_frame = 0
-                self.frame_list.setCurrentRow(0)
-                self.display_frame(0)
+    def load_asf_file(self, file_path, offset=0):
+        """Load ASF file data"""
+        with PROFILER.span("load_asf_file") as span:
+            if span:
+                span.set(bytes=os.path.getsize(file_path))
+            try:
+                header, frames = read_asf_document(file_path, self.trim_frames, self.frame_cache, offset,
+                                                   self.disk_cache)
+            except Exception as e:
+                raise Exception(f"Failed to load ASF file: {str(e)}")
+            self.show_document(header, frames)
 
-            self.update_ui_state()
+    def show_document(self, header, frames):
+        """Replace the current document with a loaded header and frames"""
+        if self.is_playing:
+            self.toggle_play()
+            
+        self.header = header
+        
+        # Update UI without offering to resize the outgoing frames
+        for spin, value in ((self.width_input, header.width),
+                            (self.height_input, header.height),
+                            (self.direction_input, header.direction_count)):
+            spin.blockSignals(True)
+            spin.setValue(value)
+            spin.blockSignals(False)
+        
+        # Show all frames in one list update
+        self.history.clear()
+        self.update_history_actions()
+        self.frame_model.set_frames(frames)
+        self.memory_manager.reset()
+        self.refresh_direction_preview()
+        
+        # Select first frame if available
+        self.current_frame = -1
+        if self.frames:
+            self.current_frame = 0
+            self.frame_list.setCurrentRow(0)
+            self.display_frame(0)
+        else:
+            self.image_view.clear()
 
-        except Exception as e:
-            raise Exception(f"Failed to load SPR file: {str(e)}")
+        self.update_ui_state()
 
     def save_file(self):
         """Save current file"""
@@ -1154,7 +6140,7 @@ class EnhancedPyAsfTool(QMainWindow):
                     self.current_file = file_path
                     self.current_file_type = "ASF"
                     self.status_bar.showMessage(f"Saved ASF file: {file_path}")
-                    self.filename_input.setText(os.path.basename(file_path))
+                    self.show_file_name()
                 except Exception as e:
                     QMessageBox.critical(self, "Error", f"Failed to save ASF file: {str(e)}")
         elif self.current_file_type == "SPR":
@@ -1165,7 +6151,7 @@ class EnhancedPyAsfTool(QMainWindow):
                     self.current_file = file_path
                     self.current_file_type = "SPR"
                     self.status_bar.showMessage(f"Saved SPR file: {file_path}")
-                    self.filename_input.setText(os.path.basename(file_path))
+                    self.show_file_name()
                 except Exception as e:
                     QMessageBox.critical(self, "Error", f"Failed to save SPR file: {str(e)}")
     
@@ -1175,31 +6161,10 @@ class EnhancedPyAsfTool(QMainWindow):
             QMessageBox.warning(self, "Warning", "No frames to save")
             return
             
-        with open(file_path, "wb") as f:
-            # Write signature
-            f.write("ASF".encode('ascii'))
-            
-            # Write header
-            f.write(struct.pack("<f", self.header.version))
-            f.write(struct.pack("<I", len(self.frames)))
-            f.write(struct.pack("<I", self.header.width))
-            f.write(struct.pack("<I", self.header.height))
-            f.write(struct.pack("<I", self.direction_input.value()))
-            
-            # Write frame data
-            for frame in self.frames:
-                # Write frame header
-                f.write(struct.pack("<I", frame.direction))
-                f.write(struct.pack("<i", frame.x_offset))
-                f.write(struct.pack("<i", frame.y_offset))
-                f.write(struct.pack("<I", frame.delay))
-                
-                # Write frame data size and data
-                if frame.image_data:
-                    f.write(struct.pack("<I", len(frame.image_data)))
-                    f.write(frame.image_data)
-                else:
-                    f.write(struct.pack("<I", 0))
+        with PROFILER.span("save_asf_file") as span:
+            span.set(bytes=write_asf_document(file_path, self.header, self.frames,
+                                              self.direction_input.value(),
+                                              self.delta_keyframe_interval, self.frame_cache))
     
     def save_spr_file(self, file_path):
         """Save data to SPR file"""
@@ -1207,28 +6172,9 @@ class EnhancedPyAsfTool(QMainWindow):
             QMessageBox.warning(self, "Warning", "No frames to save")
             return
             
-        with open(file_path, "wb") as f:
-            # Write signature
-            f.write("SPR".encode('ascii'))
-            
-            # Write header
-            f.write(struct.pack("<f", 1.0))  # Version
-            f.write(struct.pack("<I", len(self.frames)))
-            f.write(struct.pack("<I", self.header.width))
-            f.write(struct.pack("<I", self.header.height))
-            f.write(struct.pack("<I", self.direction_input.value()))
-            
-            # Write frame data
-            for frame in self.frames:
-                # Write direction
-                f.write(struct.pack("<I", frame.direction))
-                
-                # Write frame data size and data
-                if frame.image_data:
-                    f.write(struct.pack("<I", len(frame.image_data)))
-                    f.write(frame.image_data)
-                else:
-                    f.write(struct.pack("<I", 0))
+        with PROFILER.span("save_spr_file") as span:
+            span.set(bytes=write_spr_document(file_path, self.header, self.frames,
+                                              self.direction_input.value()))
     
     def convert_to_spr(self):
         """Convert current ASF file to SPR format"""
@@ -1267,6 +6213,7 @@ class EnhancedPyAsfTool(QMainWindow):
         try:
             # Load image
             image = QImage(file_path)
+            header_size = (self.header.width, self.header.height)
             
             # Resize image to match header dimensions if needed
             if self.header.width > 0 and self.header.height > 0:
@@ -1279,6 +6226,11 @@ class EnhancedPyAsfTool(QMainWindow):
                 self.width_input.setValue(image.width())
                 self.height_input.setValue(image.height())
             
+            # Store only the visible part if trimming is on
+            trim = None
+            if self.trim_frames:
+                image, trim = trim_image(image)
+            
             # Convert to byte array
             ba = QByteArray()
             buffer = QBuffer(ba)
@@ -1286,14 +6238,17 @@ class EnhancedPyAsfTool(QMainWindow):
             image.save(buffer, "PNG")
             
             # Create new frame
+            step = UndoStep("Add Frame")
+            step.header_before = header_size
             frame = ASFFrame()
             frame.image_data = ba.data()
+            frame.trim = trim
             frame.direction = 0  # Default direction
             frame.delay = 100    # Default delay
             
             # Add to frame list
-            self.frames.append(frame)
-            self.frame_list.addItem(f"Frame {len(self.frames)}")
+            step.insert_frames(self.frame_model, len(self.frames), [frame])
+            self.end_edit(step)
             
             # Select new frame
             self.frame_list.setCurrentRow(len(self.frames) - 1)
@@ -1304,6 +6259,83 @@ class EnhancedPyAsfTool(QMainWindow):
         except Exception as e:
             QMessageBox.critical(self, "Error", f"Failed to add frame: {str(e)}")
     
+    def import_frames(self):
+        """Import files, folders, sprite sheets and animations as new frames in one batch"""
+        dialog = ImportFramesDialog(self, (self.header.width, self.header.height))
+        if dialog.exec_() != QDialog.Accepted:
+            return
+        sources = dialog.sources()
+        if not sources:
+            return
+        try:
+            options = dialog.settings()
+        except re.error as e:
+            QMessageBox.critical(self, "Error", f"Invalid file name pattern: {str(e)}")
+            return
+            
+        # Without a document size the first imported image sets it
+        width, height = self.header.width, self.header.height
+        if width <= 0 or height <= 0:
+            if options["grid"]:
+                width, height = options["grid"]
+            else:
+                try:
+                    first = import_frames_from_file(sources[0], dict(options, width=0, height=0,
+                                                                     trim=False))
+                except Exception as e:
+                    QMessageBox.critical(self, "Error", f"Failed to import {sources[0]}: {str(e)}")
+                    return
+                image = QImage.fromData(first[0][0]) if first else QImage()
+                width, height = image.width(), image.height()
+        options.update(width=width, height=height, trim=self.trim_frames)
+        
+        def import_source(index):
+            try:
+                return import_frames_from_file(sources[index], options)
+            except Exception as e:
+                raise IOError(f"{os.path.basename(sources[index])}: {e}") from e
+        
+        try:
+            results = self.run_frame_job(f"Importing {len(sources)} files...", import_source,
+                                         range(len(sources)))
+        except Exception as e:
+            QMessageBox.critical(self, "Error", f"Failed to import frames: {str(e)}")
+            return
+        if results is None:
+            self.status_bar.showMessage("Import cancelled")
+            return
+            
+        new_frames = []
+        for index in range(len(sources)):
+            for image_data, direction, delay, x_offset, y_offset, trim in results[index]:
+                frame = ASFFrame()
+                frame.image_data = image_data
+                frame.trim = trim
+                frame.direction = direction
+                frame.delay = delay
+                frame.x_offset = x_offset
+                frame.y_offset = y_offset
+                new_frames.append(frame)
+        if not new_frames:
+            self.status_bar.showMessage("No frames were imported")
+            return
+            
+        # One undo step, one header update and one list insert for the whole batch
+        step = UndoStep("Import Frames")
+        step.capture_header(self.header)
+        self.header.width, self.header.height = width, height
+        for spin, value in ((self.width_input, width), (self.height_input, height)):
+            spin.blockSignals(True)
+            spin.setValue(value)
+            spin.blockSignals(False)
+        first_row = len(self.frames)
+        step.insert_frames(self.frame_model, first_row, new_frames)
+        self.end_edit(step)
+        
+        self.frame_list.setCurrentRow(first_row)
+        self.update_ui_state()
+        self.status_bar.showMessage(f"Imported {len(new_frames)} frames from {len(sources)} files")
+    
     def remove_frame(self):
         """Remove selected frame"""
         if not self.frames or self.current_frame < 0:
@@ -1315,15 +6347,12 @@ class EnhancedPyAsfTool(QMainWindow):
                                     QMessageBox.Yes | QMessageBox.No)
                                     
         if reply == QMessageBox.Yes:
-            # Remove frame
-            self.frames.pop(self.current_frame)
-            
-            # Update list
-            self.frame_list.takeItem(self.current_frame)
-            
-            # Renumber remaining frames
-            for i in range(self.frame_list.count()):
-                self.frame_list.item(i).setText(f"Frame {i+1}")
+            # Remove frame (list labels follow row numbers, no renumbering needed)
+            removed_row = self.current_frame
+            step = UndoStep("Remove Frame")
+            step.remove_frames(self.frame_model, removed_row)
+            self.end_edit(step)
+            self.current_frame = removed_row
             
             # Update current frame
             if self.frames:
@@ -1333,7 +6362,7 @@ class EnhancedPyAsfTool(QMainWindow):
                 self.display_frame(self.current_frame)
             else:
                 self.current_frame = -1
-                self.image_label.clear()
+                self.image_view.clear()
             
             # Update UI state
             self.update_ui_state()
@@ -1345,15 +6374,9 @@ class EnhancedPyAsfTool(QMainWindow):
             return
             
         # Swap frames
-        self.frames[self.current_frame], self.frames[self.current_frame - 1] = \
-            self.frames[self.current_frame - 1], self.frames[self.current_frame]
-        
-        # Update list
-        current_text = self.frame_list.item(self.current_frame).text()
-        prev_text = self.frame_list.item(self.current_frame - 1).text()
-        
-        self.frame_list.item(self.current_frame).setText(prev_text)
-        self.frame_list.item(self.current_frame - 1).setText(current_text)
+        step = UndoStep("Move Frame")
+        step.swap_frames(self.frame_model, self.current_frame, self.current_frame - 1)
+        self.end_edit(step)
         
         # Update selection
         self.current_frame -= 1
@@ -1367,15 +6390,9 @@ class EnhancedPyAsfTool(QMainWindow):
             return
             
         # Swap frames
-        self.frames[self.current_frame], self.frames[self.current_frame + 1] = \
-            self.frames[self.current_frame + 1], self.frames[self.current_frame]
-        
-        # Update list
-        current_text = self.frame_list.item(self.current_frame).text()
-        next_text = self.frame_list.item(self.current_frame + 1).text()
-        
-        self.frame_list.item(self.current_frame).setText(next_text)
-        self.frame_list.item(self.current_frame + 1).setText(current_text)
+        step = UndoStep("Move Frame")
+        step.swap_frames(self.frame_model, self.current_frame, self.current_frame + 1)
+        self.end_edit(step)
         
         # Update selection
         self.current_frame += 1
@@ -1394,73 +6411,69 @@ class EnhancedPyAsfTool(QMainWindow):
             # Display frame
             self.display_frame(index)
     
-    def display_frame(self, index):
-        """Display frame with given index"""
+    def display_frame(self, index, image=None):
+        """Display frame with given index
+
+        image optionally replaces the frame's stored image, e.g. for previews.
+        """
         if not self.frames or index < 0 or index >= len(self.frames):
-            self.image_label.clear()
+            self.image_view.clear()
             return
             
         frame = self.frames[index]
         
-        # Create pixmap from image data
-        if frame.image_data:
-            # Create base image
-            pixmap = QPixmap()
-            pixmap.loadFromData(frame.image_data)
-            
-            # Create final image with background color
-            final_image = QImage(pixmap.width(), pixmap.height(), QImage.Format_ARGB32)
-            final_image.fill(self.background_color)
-            
-            # Draw shadow if enabled
-            painter = QPainter(final_image)
+        with PROFILER.span("display_frame", frame=index) as span:
+            # Get decoded image from cache
+            if image is None and frame.image_data:
+                image, cache_hit = self.frame_cache.lookup(frame.image_data)
+                span.set(cache_hit=cache_hit)
             
-            if frame.shadow_enabled:
-                # Create shadow image
-                shadow_pixmap = QPixmap()
-                shadow_pixmap.loadFromData(frame.image_data)
+            if image is not None and not image.isNull():
+                # Display final image, with neighbouring frames as ghosts if enabled
+                ghosts = self.onion_skin.ghost_stack(self.frames, index, frame_canvas_size(frame, image))
+                final_image = self.render_frame(frame, image, ghosts)
+                self.image_view.set_image(final_image)
                 
-                # Calculate shadow position with offsets
-                shadow_x = frame.shadow_x_offset
-                shadow_y = frame.shadow_y_offset
-                
-                # Set shadow color and transparency
-                painter.setOpacity(frame.shadow_transparency / 255.0)
-                painter.drawPixmap(shadow_x, shadow_y, shadow_pixmap)
-                painter.setOpacity(1.0)
-            
-            # Draw main image with offsets
-            painter.drawPixmap(frame.x_offset, frame.y_offset, pixmap)
-            painter.end()
-            
-            # Display final image
-            display_pixmap = QPixmap.fromImage(final_image)
-            self.image_label.setPixmap(display_pixmap)
-            
-            # Update UI controls with frame info
-            self.update_controls_from_frame(frame)
-        else:
-            self.image_label.clear()
+                # Update UI controls with frame info
+                self.update_controls_from_frame(frame)
+            else:
+                self.image_view.clear()
+    
+    def render_frame(self, frame, image, ghosts=None):
+        """Composite a frame image over the background with shadow and offsets
+        
+        ghosts is an optional onion skin overlay drawn beneath the frame.
+        """
+        return composite_frame(frame, image, self.background_color, ghosts)
     
     def update_controls_from_frame(self, frame):
         """Update UI controls based on frame data"""
         # Block signals to avoid feedback loops
+        self.frame_x_offset.blockSignals(True)
+        self.frame_y_offset.blockSignals(True)
+        
+        # Update control values
+        self.frame_x_offset.setValue(frame.x_offset)
+        self.frame_y_offset.setValue(frame.y_offset)
+        
+        # Re-enable signals
+        self.frame_x_offset.blockSignals(False)
+        self.frame_y_offset.blockSignals(False) 
+        
+        # The Edit tab catches up when it is built
+        if not self.edit_tab_built:
+            return
         self.direction_spin.blockSignals(True)
         self.delay_spin.blockSignals(True)
         self.x_offset_spin.blockSignals(True)
         self.y_offset_spin.blockSignals(True)
-        self.frame_x_offset.blockSignals(True)
-        self.frame_y_offset.blockSignals(True)
         self.shadow_x_offset.blockSignals(True)
         self.transparency_slider.blockSignals(True)
         
-        # Update control values
         self.direction_spin.setValue(frame.direction)
         self.delay_spin.setValue(frame.delay)
         self.x_offset_spin.setValue(frame.x_offset)
         self.y_offset_spin.setValue(frame.y_offset)
-        self.frame_x_offset.setValue(frame.x_offset)
-        self.frame_y_offset.setValue(frame.y_offset)
         self.shadow_x_offset.setValue(frame.shadow_x_offset)
         self.transparency_slider.setValue(frame.shadow_transparency)
         
@@ -1470,13 +6483,10 @@ class EnhancedPyAsfTool(QMainWindow):
         else:
             self.no_shadow_radio.setChecked(True)
         
-        # Re-enable signals
         self.direction_spin.blockSignals(False)
         self.delay_spin.blockSignals(False)
         self.x_offset_spin.blockSignals(False)
         self.y_offset_spin.blockSignals(False)
-        self.frame_x_offset.blockSignals(False)
-        self.frame_y_offset.blockSignals(False) 
         self.shadow_x_offset.blockSignals(False)
         self.transparency_slider.blockSignals(False)
     
@@ -1487,15 +6497,145 @@ class EnhancedPyAsfTool(QMainWindow):
             
         if self.is_playing:
             # Stop animation
-            self.animation_timer.stop()
+            self.playback.stop()
             self.is_playing = False
             self.play_btn.setText("Play")
+            self.update_playback_stats(force=True)
         else:
             # Start animation
-            current_frame = self.frames[self.current_frame]
-            self.animation_timer.start(current_frame.delay)
             self.is_playing = True
             self.play_btn.setText("Stop")
+            self.playback.start(self.frames, max(0, self.current_frame))
+    
+    def on_playback_frame(self, index, image):
+        """Show a frame composited by the playback engine"""
+        if index >= len(self.frames):
+            return
+            
+        self.current_frame = index
+        
+        # Update list selection without re-rendering through on_frame_selected
+        self.playback_selecting = True
+        self.frame_list.setCurrentRow(index)
+        self.playback_selecting = False
+        
+        if image is not None:
+            self.image_view.set_image(image)
+        else:
+            self.image_view.clear()
+        self.update_controls_from_frame(self.frames[index])
+        self.update_playback_stats()
+    
+    def set_memory_budget(self):
+        """Ask for a new memory budget and apply it"""
+        budget_mb, ok = QInputDialog.getInt(self, "Memory Budget", "Budget (MB):",
+                                            self.memory_manager.budget_bytes // (1024 * 1024), 64, 1024 * 1024)
+        if ok:
+            self.memory_manager.budget_bytes = budget_mb * 1024 * 1024
+            self.enforce_memory_budget()
+    
+    def enforce_memory_budget(self):
+        """Evict or spill cold frame data and show usage in the status bar"""
+        keep = []
+        if 0 <= self.current_frame < len(self.frames):
+            keep.append(self.frames[self.current_frame])
+        self.memory_manager.enforce(self.frames, keep)
+        
+        encoded, decoded = self.memory_manager.usage(self.frames)
+        megabyte = 1024 * 1024
+        self.memory_label.setText(
+            f"Memory: {(encoded + decoded) / megabyte:.0f} / "
+            f"{self.memory_manager.budget_bytes / megabyte:.0f} MB "
+            f"(spilled {self.memory_manager.spill_store.size / megabyte:.0f} MB)")
+        self.memory_label.setToolTip(f"Encoded frame data {encoded / megabyte:.1f} MB, "
+                                     f"decoded images {decoded / megabyte:.1f} MB")
+    
+    def toggle_profiler(self, enabled):
+        """Start or stop recording profiler spans, showing the profiler panel while on"""
+        PROFILER.enabled = enabled
+        if enabled and self.profiler_panel is None:
+            self.profiler_panel = ProfilerPanel(self, PROFILER, self.frame_cache)
+            self.addDockWidget(Qt.BottomDockWidgetArea, self.profiler_panel)
+            self.profiler_panel.visibilityChanged.connect(self.profiler_panel_visibility)
+        if self.profiler_panel is not None:
+            self.profiler_panel.setVisible(enabled)
+        self.profiler_label.setVisible(enabled)
+        if enabled:
+            self.profiler_timer.start(500)
+            self.update_profiler_views()
+        else:
+            self.profiler_timer.stop()
+    
+    def profiler_panel_visibility(self, visible):
+        """Closing the profiler panel turns profiling off again"""
+        if not visible and not self.isMinimized():
+            self.profiler_action.setChecked(False)
+    
+    def update_profiler_views(self):
+        """Refresh the profiler panel and the status bar timing overlay"""
+        summary = PROFILER.summary()
+        self.profiler_panel.refresh(summary)
+        parts = [f"{name.replace('_', ' ')} {summary[name]['last'] * 1000:.1f} ms"
+                 for name in ("display_frame", "decode") if name in summary]
+        hit_rate = self.profiler_panel.cache_stats()["frame_cache_hit_rate"]
+        self.profiler_label.setText(" | ".join(parts + [f"cache {hit_rate:.0%}"]))
+    
+    def update_zoom_label(self, zoom):
+        """Show the viewer zoom factor"""
+        self.zoom_label.setText(f"{zoom * 100:g}%")
+    
+    def toggle_disk_cache(self, enabled):
+        """Enable or disable the persistent frame and thumbnail cache"""
+        self.disk_cache.enabled = enabled
+    
+    def toggle_trim_frames(self, enabled):
+        """Trim frames loaded or imported from now on"""
+        self.trim_frames = enabled
+    
+    def set_delta_encoding(self):
+        """Ask for the keyframe interval used when saving ASF files (0 turns deltas off)"""
+        interval, ok = QInputDialog.getInt(
+            self, "Delta Encoding",
+            "Keyframe interval (frames), 0 to store every frame whole.\n"
+            "Delta-encoded ASF files need this version of the tool to open.",
+            self.delta_keyframe_interval, 0, 1000)
+        if ok:
+            self.delta_keyframe_interval = interval
+    
+    def clear_disk_cache(self):
+        """Delete all persistent cache entries"""
+        self.disk_cache.clear()
+        self.status_bar.showMessage(f"Cleared disk cache: {self.disk_cache.directory}")
+    
+    def show_direction_preview(self):
+        """Open a window playing every direction side by side"""
+        if not self.frames:
+            QMessageBox.warning(self, "Warning", "No frames to preview")
+            return
+            
+        if self.direction_preview is None:
+            self.direction_preview = DirectionPreviewDialog(self)
+        if self.direction_preview.isVisible():
+            self.direction_preview.grid.start()
+        self.direction_preview.show()
+        self.direction_preview.raise_()
+    
+    def refresh_direction_preview(self):
+        """Have an open direction preview pick up edited or replaced frames"""
+        if self.direction_preview is not None:
+            self.direction_preview.grid.invalidate()
+    
+    def update_playback_stats(self, force=False):
+        """Show achieved frame rate and timing problems in the status bar"""
+        now = time.monotonic()
+        if not force and now - self.last_stats_update < 0.25:
+            return
+        self.last_stats_update = now
+        
+        stats = self.playback.stats()
+        self.playback_stats_label.setText(
+            f"{stats['fps']:.1f} fps | late {stats['late']} | dropped {stats['dropped']} | "
+            f"decode {stats['decode_ms']:.1f} ms")
     
     def next_frame(self):
         """Show next frame"""
@@ -1510,11 +6650,6 @@ class EnhancedPyAsfTool(QMainWindow):
         
         # Display frame
         self.display_frame(self.current_frame)
-        
-        # Update timer interval if playing
-        if self.is_playing:
-            current_frame = self.frames[self.current_frame]
-            self.animation_timer.setInterval(current_frame.delay)
     
     def prev_frame(self):
         """Show previous frame"""
@@ -1542,9 +6677,8 @@ class EnhancedPyAsfTool(QMainWindow):
         file_path, _ = QFileDialog.getSaveFileName(self, "Export Frame", "", "PNG Files (*.png);;JPG Files (*.jpg);;All Files (*)")
         if file_path:
             try:
-                # Create image from frame data
-                image = QImage()
-                image.loadFromData(frame.image_data)
+                # Create image from frame data, on its full canvas
+                image = decode_frame(frame)
                 
                 # Save image
                 image.save(file_path)
@@ -1552,134 +6686,369 @@ class EnhancedPyAsfTool(QMainWindow):
             except Exception as e:
                 QMessageBox.critical(self, "Error", f"Failed to export frame: {str(e)}")
     def export_all_frames(self):
-        """Export all frames as individual images"""
+        """Export all frames as individual images, encoded in parallel"""
         if not self.frames:
             QMessageBox.warning(self, "Warning", "No frames to export")
             return
-			
+            
         directory = QFileDialog.getExistingDirectory(self, "Select Export Directory")
         if not directory:
             return
-			
-		# Ask for export format
-        formats = ["PNG (*.png)", "JPG (*.jpg)", "BMP (*.bmp)","TGA (*.tga)", "All Supported (*.png *.jpg *.bmp *.tga)"]
-        format_dialog = QDialog(self)
-        format_dialog.setWindowTitle("Select Export Format")
-        format_layout = QVBoxLayout(format_dialog)
-		
-        format_group = QButtonGroup(format_dialog)
-        for i, fmt in enumerate(formats):
-            radio = QRadioButton(fmt)
-            if i == 0:  # Default to PNG
-                radio.setChecked(True)
-            format_group.addButton(radio, i)
-            format_layout.addWidget(radio)
-		
-		# Add buttons
-        buttons = QHBoxLayout()
-        ok_btn = QPushButton("OK")
-        ok_btn.clicked.connect(format_dialog.accept)
-        cancel_btn = QPushButton("Cancel")
-        cancel_btn.clicked.connect(format_dialog.reject)
-        buttons.addWidget(ok_btn)
-        buttons.addWidget(cancel_btn)
-        format_layout.addLayout(buttons)
-        
-        if format_dialog.exec_() != QDialog.Accepted:
-            return
-		
-		# Get selected format
-        selected_format_id = format_group.checkedId()
-        if selected_format_id == 0:
-            ext = "png"
-        elif selected_format_id == 1:
-            ext = "jpg"
-        elif selected_format_id == 2:
-            ext = "bmp"
-        else:
-            ext = "png"  # Default to PNG
-		
+            
+        selection = self.selected_frame_indices()
+        dialog = ExportFramesDialog(self, len(selection) > 1)
+        if dialog.exec_() != QDialog.Accepted:
+            return
+            
+        format_name, compression, quality, template, subfolders, selected_only = dialog.settings()
+        extension = EXPORT_FORMATS[format_name][0]
+        name = os.path.splitext(os.path.basename(self.current_file))[0] if self.current_file else "frame"
+        indices = selection if selected_only else range(len(self.frames))
+        frames = {i: self.frames[i] for i in indices}
+        
+        # Resolve every path up front so template errors surface before any work starts
         try:
-            export_count = 0
-            for i, frame in enumerate(self.frames):
-                if not frame.image_data:
-                    continue
-                    
-                # Create image from frame data
-                image = QImage()
-                if not image.loadFromData(frame.image_data):
-                    self.status_bar.showMessage(f"Failed to load frame {i}")
-                    continue
-                
-                # Generate filename based on frame index and direction
-                file_path = f"{directory}/frame_{i:04d}_dir_{frame.direction}.{ext}"
-                
-                # Save image
-                if image.save(file_path):
-                    export_count += 1
-                else:
-                    self.status_bar.showMessage(f"Failed to save frame {i}")
-                    
-            if export_count > 0:
-                self.status_bar.showMessage(f"Exported {export_count} frames to: {directory}")
-            else:
-                self.status_bar.showMessage("No frames were exported")
-                
+            paths = {}
+            for i, frame in frames.items():
+                folder = os.path.join(directory, f"dir_{frame.direction}") if subfolders else directory
+                file_name = f"{export_file_name(template, frame, i, name)}.{extension}"
+                if os.path.dirname(os.path.normpath(os.path.join(folder, file_name))) != os.path.normpath(folder):
+                    raise ValueError(f"{file_name!r} is not a file name inside the export folder")
+                paths[i] = os.path.join(folder, file_name)
+        except Exception as e:
+            QMessageBox.critical(self, "Error", f"Invalid file name template: {str(e)}")
+            return
+        if len({os.path.normcase(path) for path in paths.values()}) != len(paths):
+            QMessageBox.critical(self, "Error", "Invalid file name template: frames would overwrite each "
+                                 "other's files; include {index} or {number}")
+            return
+        try:
+            for folder in {os.path.dirname(path) for path in paths.values()}:
+                os.makedirs(folder, exist_ok=True)
+        except OSError as e:
+            QMessageBox.critical(self, "Error", f"Failed to export frames: {str(e)}")
+            return
+        
+        def export_frame(index):
+            # Workers decode, encode and write their own file, so nothing is held
+            # in memory longer than one frame per thread
+            image = decode_frame(frames[index])
+            if image is None or image.isNull():
+                return False
+            with PROFILER.span("export_frame", format=format_name) as span, open(paths[index], "wb") as f:
+                data = encode_image(image, format_name, compression, quality)
+                span.set(bytes=len(data))
+                f.write(data)
+            return True
+        
+        try:
+            results = self.run_frame_job(f"Exporting {len(frames)} frames...", export_frame, list(frames))
         except Exception as e:
             QMessageBox.critical(self, "Error", f"Failed to export frames: {str(e)}")
+            return
+        if results is None:
+            self.status_bar.showMessage("Export cancelled")
+            return
+            
+        export_count = sum(results.values())
+        if export_count > 0:
+            self.status_bar.showMessage(f"Exported {export_count} frames as {format_name} to: {directory}")
+        else:
+            self.status_bar.showMessage("No frames were exported")
 
     def export_sprite_sheet(self):
-        """Export all frames as a single sprite sheet image"""
+        """Export all frames as a single sprite sheet image
+        
+        PNG and TGA sheets are streamed to disk one grid row at a time, so only
+        a band of decoded frames is ever held in memory.
+        """
+        import numpy as np
         if not self.frames:
             QMessageBox.warning(self, "Warning", "No frames to export")
             return
-		
-		# Get export path
+            
+        # Get export path
         file_path, _ = QFileDialog.getSaveFileName(self, "Save Sprite Sheet", "", 
-											"PNG Files (*.png);;JPG Files (*.jpg);;All Files (*)")
+                                                   "PNG Files (*.png);;TGA Files (*.tga);;"
+                                                   "JPG Files (*.jpg);;All Files (*)")
         if not file_path:
             return
-		
+            
+        # Calculate rows and columns for the sprite sheet
+        frames = list(self.frames)
+        cell_width, cell_height = self.header.width, self.header.height
+        cols = min(8, len(frames))  # Maximum 8 columns
+        rows = (len(frames) + cols - 1) // cols  # Ceiling division
+        if cell_width <= 0 or cell_height <= 0:
+            QMessageBox.warning(self, "Warning", "Set the frame size before exporting a sprite sheet")
+            return
+            
+        extension = os.path.splitext(file_path)[1].lower()
+        temp_path = file_path + ".part"
+        progress = QProgressDialog("Writing sprite sheet...", "Cancel", 0, rows, self)
+        progress.setWindowModality(Qt.WindowModal)
+        progress.setMinimumDuration(300)
+        
+        cancelled = False
         try:
-            # Calculate rows and columns for the sprite sheet
-            frame_count = len(self.frames)
-            cols = min(8, frame_count)  # Maximum 8 columns
-            rows = (frame_count + cols - 1) // cols  # Ceiling division
-            
-            # Create image big enough for all frames
-            sprite_sheet = QImage(cols * self.header.width, rows * self.header.height, 
-                                QImage.Format_ARGB32)
-            sprite_sheet.fill(Qt.transparent)
-            
-            # Create painter for drawing frames
-            painter = QPainter(sprite_sheet)
-            
-            # Draw each frame onto the sprite sheet
-            for i, frame in enumerate(self.frames):
-                if not frame.image_data:
-                    continue
+            bands = []  # Only used by the in-memory (JPG/other) path
+            with PROFILER.span("export_sprite_sheet", frames=len(frames)) as span, \
+                    open(temp_path, "wb") as f, ThreadPoolExecutor(max_workers=os.cpu_count() or 4) as pool:
+                if extension == ".tga":
+                    writer = TgaStreamWriter(f, cols * cell_width, rows * cell_height)
+                elif extension in (".png", ""):
+                    writer = PngStreamWriter(f, cols * cell_width, rows * cell_height)
+                else:
+                    writer = None
                     
-                # Calculate position in the grid
-                row = i // cols
-                col = i % cols
-                
-                # Create image from frame data
-                image = QImage()
-                if image.loadFromData(frame.image_data):
-                    # Draw frame at position
-                    painter.drawImage(col * self.header.width, row * self.header.height, image)
-                
-            painter.end()
+                # Decode the next band while the current one is compressed
+                pending = pool.map(decode_frame, frames[:cols])
+                for row in range(rows):
+                    images = list(pending)
+                    if row + 1 < rows:
+                        pending = pool.map(decode_frame, frames[(row + 1) * cols:(row + 2) * cols])
+                    band = sprite_sheet_band(images, cols, cell_width, cell_height)
+                    if writer is not None:
+                        writer.write_rows(band)
+                    else:
+                        bands.append(band)
+                    
+                    progress.setValue(row + 1)
+                    QApplication.processEvents()
+                    if progress.wasCanceled():
+                        cancelled = True
+                        break
+                else:
+                    if writer is not None:
+                        writer.close()
+                        span.set(bytes=f.tell())
+            progress.close()
             
-            # Save sprite sheet
-            if sprite_sheet.save(file_path):
-                self.status_bar.showMessage(f"Exported sprite sheet to: {file_path}")
+            if cancelled:
+                os.remove(temp_path)
+                self.status_bar.showMessage("Sprite sheet export cancelled")
+                return
+                
+            if writer is None:
+                os.remove(temp_path)
+                if not array_to_qimage(np.concatenate(bands)).save(file_path):
+                    self.status_bar.showMessage("Failed to save sprite sheet")
+                    return
             else:
-                self.status_bar.showMessage("Failed to save sprite sheet")
+                os.replace(temp_path, file_path)
+            self.status_bar.showMessage(f"Exported sprite sheet to: {file_path}")
         
         except Exception as e:
+            progress.close()
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
             QMessageBox.critical(self, "Error", f"Failed to export sprite sheet: {str(e)}")
 
+    def export_atlas(self):
+        """Export trimmed, deduplicated frames packed into atlas pages plus JSON metadata"""
+        import numpy as np
+        if not self.frames:
+            QMessageBox.warning(self, "Warning", "No frames to export")
+            return
+            
+        file_path, _ = QFileDialog.getSaveFileName(self, "Export Atlas", "", "PNG Files (*.png)")
+        if not file_path:
+            return
+            
+        dialog = AtlasExportDialog(self)
+        if dialog.exec_() != QDialog.Accepted:
+            return
+        max_size, padding, trim, rotation, dedupe, power_of_two = dialog.settings()
+        frames = list(self.frames)
+        
+        def prepare_frame(index):
+            # Decode, trim and fingerprint one frame on a worker
+            image = decode_frame(frames[index]) or QImage()
+            if image.isNull():
+                image = QImage(max(1, self.header.width), max(1, self.header.height),
+                               QImage.Format_ARGB32)
+                image.fill(Qt.transparent)
+            pixels = qimage_to_array(image)
+            bounds = (0, 0, image.width(), image.height())
+            if trim:
+                # Fully transparent frames keep a single pixel
+                bounds = alpha_bounds(pixels) or (0, 0, 1, 1)
+            x, y, w, h = bounds
+            sprite = np.ascontiguousarray(pixels[y:y + h, x:x + w])
+            digest = hashlib.blake2b(struct.pack("<II", w, h) + sprite.tobytes(), digest_size=16).digest()
+            return (image.width(), image.height()), bounds, digest, sprite
+        
+        try:
+            results = self.run_frame_job("Trimming frames...", prepare_frame, range(len(frames)))
+            if results is None:
+                self.status_bar.showMessage("Atlas export cancelled")
+                return
+                
+            # One atlas sprite per distinct image
+            sprites, sprite_of_frame, first_frame = {}, {}, {}
+            for index in range(len(frames)):
+                source_size, bounds, digest, sprite = results[index]
+                key = digest if dedupe else index
+                if key not in sprites:
+                    sprites[key] = sprite
+                    first_frame[key] = index
+                sprite_of_frame[index] = key
+            sizes = {key: (sprite.shape[1] + padding, sprite.shape[0] + padding)
+                     for key, sprite in sprites.items()}
+            with PROFILER.span("pack_atlas", sprites=len(sizes)):
+                pages = pack_atlas(sizes, max_size, max_size, power_of_two, rotation)
+            
+            # Compose and write each page
+            base, _ = os.path.splitext(file_path)
+            page_names, location = [], {}
+            for page_index, (width, height, placed) in enumerate(pages):
+                canvas = np.zeros((height, width, 4), np.uint8)
+                for key, (x, y, rotated) in placed.items():
+                    # Rotated sprites are stored turned 90° clockwise
+                    sprite = np.rot90(sprites[key], -1) if rotated else sprites[key]
+                    canvas[y:y + sprite.shape[0], x:x + sprite.shape[1]] = sprite
+                    location[key] = (page_index, x, y, rotated)
+                page_path = f"{base}.png" if len(pages) == 1 else f"{base}_{page_index}.png"
+                with PROFILER.span("write_atlas_page", bytes=canvas.nbytes):
+                    saved = array_to_qimage(canvas).save(page_path)
+                if not saved:
+                    raise IOError(f"Could not write {page_path}")
+                page_names.append({"image": os.path.basename(page_path), "size": {"w": width, "h": height}})
+            
+            entries = []
+            for index, frame in enumerate(frames):
+                source_size, (x, y, w, h), _, _ = results[index]
+                key = sprite_of_frame[index]
+                page_index, ax, ay, rotated = location[key]
+                entry = {
+                    "index": index,
+                    "page": page_index,
+                    "frame": {"x": ax, "y": ay, "w": w, "h": h},
+                    "rotated": rotated,
+                    "trimmed": (w, h) != source_size,
+                    "sprite_source_size": {"x": x, "y": y, "w": w, "h": h},
+                    "source_size": {"w": source_size[0], "h": source_size[1]},
+                    "offset": {"x": frame.x_offset, "y": frame.y_offset},
+                    "direction": frame.direction,
+                    "delay": frame.delay,
+                }
+                if first_frame[key] != index:
+                    entry["duplicate_of"] = first_frame[key]
+                entries.append(entry)
+            
+            metadata = {
+                "meta": {"app": "PyAsfTool", "version": 1, "pages": page_names,
+                         "frame_size": {"w": self.header.width, "h": self.header.height},
+                         "direction_count": self.header.direction_count},
+                "frames": entries,
+            }
+            with open(f"{base}.json", "w", encoding="utf-8") as f:
+                json.dump(metadata, f, indent=1)
+        except Exception as e:
+            QMessageBox.critical(self, "Error", f"Failed to export atlas: {str(e)}")
+            return
+            
+        # Compare with the fixed 8-column grid of export_sprite_sheet
+        atlas_area = sum(width * height for width, height, _ in pages)
+        cols = min(8, len(frames))
+        grid_area = cols * self.header.width * -(-len(frames) // cols) * self.header.height
+        saving = f", {atlas_area / grid_area:.0%} of grid area" if grid_area else ""
+        self.status_bar.showMessage(f"Exported atlas: {len(sprites)} sprites for {len(frames)} frames on "
+                                    f"{len(pages)} page(s){saving}")
+
+    def export_animation(self):
+        """Export frames as an animated GIF, APNG or WebP using their delays"""
+        if not self.frames:
+            QMessageBox.warning(self, "Warning", "No frames to export")
+            return
+            
+        direction_index = build_direction_index(self.frames)
+        dialog = AnimationExportDialog(self, sorted(direction_index))
+        if dialog.exec_() != QDialog.Accepted:
+            return
+        format_name, choice, use_background, loop = dialog.settings()
+        extension = ANIMATION_FORMATS[format_name]
+        
+        file_path, _ = QFileDialog.getSaveFileName(self, "Export Animation", "",
+                                                   f"{format_name} Files (*.{extension});;All Files (*)")
+        if not file_path:
+            return
+            
+        # (path, frames) for every file to write
+        frames = list(self.frames)
+        base, _ = os.path.splitext(file_path)
+        if choice is None:
+            jobs = [(file_path, frames)]
+        elif choice == "each":
+            jobs = [(f"{base}_dir{direction}.{extension}", [frames[i] for i in indices])
+                    for direction, indices in sorted(direction_index.items())]
+        else:
+            jobs = [(file_path, [frames[i] for i in direction_index[choice]])]
+            
+        width, height = self.header.width, self.header.height
+        background = None
+        if use_background:
+            background = (self.background_color.red(), self.background_color.green(),
+                          self.background_color.blue())
+        total = sum(len(job_frames) for _, job_frames in jobs)
+        done = [0]
+        cancel = threading.Event()
+        frame_cache = self.frame_cache
+        
+        def decode(frame):
+            image_data = frame.image_data
+            return frame_cache.get(image_data) if image_data else None
+        
+        def encode_all():
+            # Runs on a worker thread; touches only the captured frames and values
+            with PROFILER.span("export_animation", format=format_name, frames=total), \
+                    ThreadPoolExecutor(max_workers=os.cpu_count() or 4) as pool:
+                for path, job_frames in jobs:
+                    images = list(pool.map(decode, job_frames))
+                    sizes = [frame_canvas_size(frame, image)
+                             for frame, image in zip(job_frames, images) if image is not None]
+                    canvas_width = width if width > 0 else max(size.width() for size in sizes)
+                    canvas_height = height if height > 0 else max(size.height() for size in sizes)
+                    pixels = [animation_frame_pixels(frame, image, canvas_width, canvas_height)
+                              for frame, image in zip(job_frames, images)]
+                    first = done[0]
+                    
+                    def progress(count):
+                        done[0] = first + count
+                    
+                    data = encode_animation(pixels, [frame.delay for frame in job_frames], format_name,
+                                            background, loop, progress, cancel.is_set)
+                    if data is None:
+                        return False
+                    with PROFILER.span("write_animation", bytes=len(data)), open(path, "wb") as f:
+                        f.write(data)
+            return True
+        
+        progress = QProgressDialog("Encoding animation...", "Cancel", 0, total, self)
+        progress.setWindowModality(Qt.WindowModal)
+        progress.setMinimumDuration(300)
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            future = pool.submit(encode_all)
+            while not future.done():
+                progress.setValue(min(done[0], total - 1))
+                QApplication.processEvents()
+                if progress.wasCanceled():
+                    cancel.set()
+                wait([future], timeout=0.05)
+        progress.close()
+        
+        try:
+            finished = future.result()
+        except Exception as e:
+            QMessageBox.critical(self, "Error", f"Failed to export animation: {str(e)}")
+            return
+        if not finished:
+            self.status_bar.showMessage("Animation export cancelled")
+            return
+        size = sum(os.path.getsize(path) for path, _ in jobs)
+        self.status_bar.showMessage(f"Exported {len(jobs)} {format_name} animation(s), "
+                                    f"{total} frames, {size / 1024:.0f} KB")
+
     def export_current_frame(self): 
         """Export current frame as image""" 
         if not self.frames or self.current_frame < 0: 
@@ -1693,12 +7062,15 @@ class EnhancedPyAsfTool(QMainWindow):
                                         "PNG Files (*.png);;JPG Files (*.jpg);;BMP Files (*.bmp);; TGA File (*.tga);;All Files (*)") 
         if file_path: 
             try:
-                # Create image from frame data
-                image = QImage()
-                image.loadFromData(frame.image_data)
+                # Create image from frame data, on its full canvas
+                image = decode_frame(frame)
                 
                 # Save image
-                if image.save(file_path):
+                with PROFILER.span("export_current_frame") as span:
+                    saved = image.save(file_path)
+                    if saved and span:
+                        span.set(bytes=os.path.getsize(file_path))
+                if saved:
                     self.status_bar.showMessage(f"Exported frame to: {file_path}")
                 else:
                     self.status_bar.showMessage("Failed to save frame")
@@ -1719,9 +7091,8 @@ class EnhancedPyAsfTool(QMainWindow):
             return
 			
         try:
-            # Create image from frame data
-            image = QImage()
-            image.loadFromData(frame.image_data)
+            # Create image from frame data, on its full canvas
+            image = decode_frame(frame)
             
             # For TGA export, we need to convert to a format suitable for TGA
             # TGA files can be saved directly by QImage in some Qt versions
@@ -1730,7 +7101,11 @@ class EnhancedPyAsfTool(QMainWindow):
                 image = image.convertToFormat(QImage.Format_RGBA8888)
             
             # Save as TGA
-            if image.save(file_path, "TGA"):
+            with PROFILER.span("export_tga") as span:
+                saved = image.save(file_path, "TGA")
+                if saved and span:
+                    span.set(bytes=os.path.getsize(file_path))
+            if saved:
                 self.status_bar.showMessage(f"Exported TGA to: {file_path}")
             else:
                 # Fall back to manual TGA export if direct saving fails
@@ -1746,7 +7121,7 @@ class EnhancedPyAsfTool(QMainWindow):
             height = image.height()
             
             # Open file for binary write
-            with open(file_path, 'wb') as f:
+            with PROFILER.span("export_manual_tga", bytes=width * height * 4), open(file_path, 'wb') as f:
                 # Write TGA header
                 # ID Length (1 byte)
                 f.write(bytes([0]))
@@ -1825,12 +7200,11 @@ class EnhancedPyAsfTool(QMainWindow):
 
     def on_frame_selected(self):
         """Handle frame selection from list"""
-        selected_items = self.frame_list.selectedItems()
-        if not selected_items:
+        if self.playback_selecting:
             return
             
-        # Get selected index
-        index = self.frame_list.row(selected_items[0])
+        # Get current index (several frames may be selected for bulk operations)
+        index = self.frame_list.currentRow()
         if index < 0 or index >= len(self.frames):
             return
             
@@ -1862,11 +7236,21 @@ class EnhancedPyAsfTool(QMainWindow):
         self.export_current_frame_action.setEnabled(current_frame_valid)
         self.export_all_frames_action.setEnabled(has_frames)
         self.export_sprite_sheet_action.setEnabled(has_frames)
+        self.export_atlas_action.setEnabled(has_frames)
+        self.export_animation_action.setEnabled(has_frames)
         self.export_tga_action.setEnabled(current_frame_valid)
+        self.direction_preview_action.setEnabled(has_frames)
+        
+        # Update edit actions
+        self.update_history_actions()
+        self.colour_key_action.setEnabled(has_frames)
+        if self.edit_tab_built:
+            self.colour_key_btn.setEnabled(has_frames)
+        self.compact_timeline_action.setEnabled(len(self.frames) > 1)
 
     def update_frame_controls(self):
         """Update frame control values"""
-        if not self.frames or self.current_frame < 0:
+        if not self.frames or self.current_frame < 0 or not self.edit_tab_built:
             return
             
         frame = self.frames[self.current_frame]
@@ -1897,8 +7281,427 @@ class EnhancedPyAsfTool(QMainWindow):
             "Copyright \n\n"
             "A tool for editing ASF and SPR animation files.")
 
-if __name__ == '__main__':
+def read_document(file_path, frame_cache=None):
+    """Read an ASF or SPR file into (header, frames), choosing the reader by extension"""
+    if file_path.lower().endswith('.spr'):
+        return read_spr_document(file_path)
+    return read_asf_document(file_path, frame_cache=frame_cache)
+
+
+def time_full_decode(file_path):
+    """Seconds to read an ASF file and decode every frame in order"""
+    start = time.perf_counter()
+    _, frames = read_asf_document(file_path, frame_cache=FrameCache())
+    for frame in frames:
+        decode_frame(frame)
+    return time.perf_counter() - start
+
+
+def delta_report(file_path, keyframe_interval):
+    """Compare whole-frame and delta-encoded ASF storage for a document"""
+    header, frames = read_document(file_path)
+    full_bytes = sum(len(frame_file_data(frame) or b"") for frame in frames)
+    records = list(delta_encode_frames(frames, keyframe_interval))
+    delta_bytes = sum(len(record or b"") for record in records)
+    keyframes = sum(1 for record in records if record and not record.startswith(DELTA_MAGIC))
+    
+    with tempfile.TemporaryDirectory() as temp_dir:
+        full_path = os.path.join(temp_dir, "full.asf")
+        delta_path = os.path.join(temp_dir, "delta.asf")
+        write_asf_document(full_path, header, frames)
+        write_asf_document(delta_path, header, frames, keyframe_interval=keyframe_interval)
+        full_time = time_full_decode(full_path)
+        delta_time = time_full_decode(delta_path)
+        
+        # Random access without a warm cache: each delta frame decodes two images
+        _, delta_frames = read_asf_document(delta_path)
+        worst_access = 0.0
+        for frame in delta_frames:
+            start = time.perf_counter()
+            decode_frame(frame)
+            worst_access = max(worst_access, time.perf_counter() - start)
+    
+    return {
+        "file": file_path,
+        "frames": len(frames),
+        "keyframes": keyframes,
+        "keyframe_interval": keyframe_interval,
+        "full_bytes": full_bytes,
+        "delta_bytes": delta_bytes,
+        "ratio": delta_bytes / full_bytes if full_bytes else 1.0,
+        "full_load_seconds": full_time,
+        "delta_load_seconds": delta_time,
+        "worst_access_seconds": worst_access,
+    }
+
+
+def cli_delta_report(args):
+    reports = [delta_report(path, args.interval) for path in args.files]
+    if args.json:
+        print(json.dumps(reports, indent=2))
+        return 0
+    for report in reports:
+        print(f"{report['file']}: {report['frames']} frames, {report['keyframes']} keyframes "
+              f"(interval {report['keyframe_interval']})")
+        print(f"  size   {report['full_bytes']:,} -> {report['delta_bytes']:,} bytes "
+              f"({report['ratio'] * 100:.1f}%)")
+        print(f"  load   {report['full_load_seconds'] * 1000:.1f} -> "
+              f"{report['delta_load_seconds'] * 1000:.1f} ms, "
+              f"worst random access {report['worst_access_seconds'] * 1000:.2f} ms")
+    return 0
+
+
+def compact_file(file_path, output_path=None):
+    """Compact an ASF file's timeline, writing it to output_path if given
+    
+    The output is written to a ".part" file and moved into place only once
+    complete, so a failed write never truncates an existing file (or the
+    input, when compacting in place).
+    """
+    if file_path.lower().endswith('.spr'):
+        raise ValueError("SPR files do not store frame delays")
+    frame_cache = FrameCache()
+    header, frames = read_asf_document(file_path, frame_cache=frame_cache)
+    candidates = compaction_candidates(frames)
+    with ThreadPoolExecutor(max_workers=os.cpu_count() or 4) as pool:
+        hashes = dict(zip(candidates, pool.map(lambda i: frame_content_hash(frames[i], frame_cache),
+                                               candidates)))
+    compacted, removed_frames, removed_bytes = compact_timeline(frames, hashes)
+    if output_path and (removed_frames or output_path != file_path):
+        temp_path = output_path + ".part"
+        try:
+            if removed_frames:
+                write_asf_document(temp_path, header, compacted)
+            else:
+                shutil.copyfile(file_path, temp_path)
+            os.replace(temp_path, output_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+    return {
+        "file": file_path,
+        "output": output_path,
+        "frames": len(frames),
+        "removed_frames": removed_frames,
+        "removed_bytes": removed_bytes,
+        "duration_ms": sum(max(1, frame.delay) for frame in frames),
+    }
+
+
+def cli_compact(args):
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+    reports = []
+    failed = 0
+    for path in args.files:
+        output_path = None
+        if args.in_place:
+            output_path = path
+        elif args.output_dir:
+            output_path = os.path.join(args.output_dir, os.path.basename(path))
+        # One bad file is reported and skipped rather than stopping the batch
+        try:
+            reports.append(compact_file(path, output_path))
+        except (OSError, ValueError, struct.error) as e:
+            print(f"Error: {path}: {e}", file=sys.stderr)
+            failed += 1
+    status = 1 if failed else 0
+    if args.json:
+        print(json.dumps(reports, indent=2))
+        return status
+    for report in reports:
+        action = "removed" if report["output"] else "would remove"
+        print(f"{report['file']}: {action} {report['removed_frames']} of {report['frames']} frames "
+              f"({report['removed_bytes']:,} bytes)")
+    return status
+
+
+def open_cli_catalogue(args):
+    catalogue = AssetCatalogue(args.db)
+    print(f"Catalogue: {catalogue.db_path}", file=sys.stderr)
+    return catalogue
+
+
+def cli_index(args):
+    import sqlite3
+    try:
+        catalogue = open_cli_catalogue(args)
+        start = time.perf_counter()
+        
+        def progress(done, total):
+            print(f"  {done}/{total} files read", file=sys.stderr)
+        
+        stats = catalogue.scan(args.roots, progress, workers=args.workers)
+        catalogue.close()
+    except (sqlite3.Error, OSError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    print(f"{stats['found']} files found, {stats['indexed']} indexed, "
+          f"{stats['found'] - stats['indexed']} unchanged, {stats['removed']} removed, "
+          f"{stats['errors']} unreadable in {time.perf_counter() - start:.2f} s")
+    return 0
+
+
+def cli_query(args):
+    import sqlite3
+    try:
+        catalogue = open_cli_catalogue(args)
+        start = time.perf_counter()
+        rows = catalogue.query(name=args.name, kind=args.kind and args.kind.upper(),
+                               min_width=args.min_width, max_width=args.max_width,
+                               min_height=args.min_height, max_height=args.max_height,
+                               direction_count=args.directions, min_frames=args.min_frames,
+                               max_frames=args.max_frames, delay_below=args.delay_below,
+                               frame_hash=args.frame_hash, limit=args.limit)
+        elapsed = time.perf_counter() - start
+        catalogue.close()
+    except (sqlite3.Error, OSError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    if args.json:
+        print(json.dumps([dict(zip(AssetCatalogue.COLUMNS, row)) for row in rows], indent=2))
+    else:
+        for path, kind, width, height, directions, frames, min_delay, max_delay, size in rows:
+            delays = f", delay {min_delay}-{max_delay} ms" if min_delay is not None else ""
+            print(f"{path}  {kind} {width}x{height}, {directions} directions, {frames} frames{delays}")
+    print(f"{len(rows)} matches in {elapsed * 1000:.1f} ms", file=sys.stderr)
+    return 0
+
+
+def cli_phash(args):
+    import sqlite3
+    try:
+        catalogue = open_cli_catalogue(args)
+        start = time.perf_counter()
+        
+        def progress(done, total):
+            print(f"  {done}/{total} files hashed", file=sys.stderr)
+        
+        stats = catalogue.hash_frames(progress, workers=args.workers)
+        catalogue.close()
+    except (sqlite3.Error, OSError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    print(f"Hashed {stats['frames']} frames in {stats['files']} files ({stats['errors']} unreadable) "
+          f"in {time.perf_counter() - start:.2f} s")
+    return 0
+
+
+def cli_similar(args):
+    import sqlite3
+    _, frames = read_document(args.file)
+    if not 0 <= args.frame < len(frames):
+        raise ValueError(f"{args.file} has no frame {args.frame}")
+    image = decode_frame(frames[args.frame])
+    if image is None or image.isNull():
+        raise ValueError(f"Frame {args.frame} of {args.file} has no image")
+    ahash, dhash = perceptual_hashes(image)
+    try:
+        catalogue = open_cli_catalogue(args)
+        start = time.perf_counter()
+        matches = catalogue.find_similar(dhash if args.method == "dhash" else ahash, args.method,
+                                         args.distance, args.limit)
+        elapsed = time.perf_counter() - start
+        catalogue.close()
+    except (sqlite3.Error, OSError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    if args.json:
+        print(json.dumps([{"distance": distance, "path": path, "frame": index}
+                          for distance, path, index in matches], indent=2))
+    else:
+        for distance, path, index in matches:
+            print(f"{distance:2d}  {path}  frame {index}")
+    print(f"{len(matches)} matches in {elapsed * 1000:.1f} ms", file=sys.stderr)
+    return 0
+
+
+def cli_diff(args):
+    start = time.perf_counter()
+    header_changes, changes = diff_documents(args.old, args.new)
+    elapsed = time.perf_counter() - start
+    
+    heatmaps = []
+    if args.heatmaps:
+        # Only modified frames are decoded
+        modified = [change for change in changes if change.status == "modified"]
+        if modified:
+            os.makedirs(args.heatmaps, exist_ok=True)
+            _, old_frames = read_document(args.old)
+            _, new_frames = read_document(args.new)
+        for change in modified:
+            old_image = decode_frame(old_frames[change.old_index])
+            new_image = decode_frame(new_frames[change.new_index])
+            if old_image is None or new_image is None or old_image.isNull() or new_image.isNull():
+                continue
+            heatmap, changed = pixel_diff_heatmap(old_image, new_image)
+            path = os.path.join(args.heatmaps, f"frame_{change.old_index:04d}_{change.new_index:04d}.png")
+            if not heatmap.save(path, "PNG"):
+                raise OSError(f"Could not write {path}")
+            heatmaps.append({"old_index": change.old_index, "new_index": change.new_index,
+                             "changed_pixels": changed, "path": path})
+    
+    if args.json:
+        print(json.dumps({
+            "old": args.old,
+            "new": args.new,
+            "header": {name: {"old": old, "new": new} for name, (old, new) in header_changes.items()},
+            "frames": [{"status": change.status, "old_index": change.old_index,
+                        "new_index": change.new_index,
+                        "fields": {name: {"old": old, "new": new} for name, (old, new) in change.fields.items()}}
+                       for change in changes if args.all or change.status != "unchanged"],
+            "heatmaps": heatmaps,
+        }, indent=2))
+    else:
+        for name, (old, new) in header_changes.items():
+            print(f"header: {name.replace('_', ' ')} {old} -> {new}")
+        symbols = {"unchanged": " ", "metadata": "*", "moved": ">", "modified": "~", "added": "+",
+                   "removed": "-"}
+        for change in changes:
+            if change.status == "unchanged" and not args.all:
+                continue
+            old = "" if change.old_index is None else change.old_index
+            new = "" if change.new_index is None else change.new_index
+            details = describe_frame_change(change)
+            print(f"{symbols[change.status]} {old!s:>5} {new!s:>5}  {change.status}"
+                  f"{': ' + details if details else ''}")
+        for heatmap in heatmaps:
+            print(f"heat map: {heatmap['path']} ({heatmap['changed_pixels']} pixels differ)")
+    print(f"Compared {args.old} and {args.new} in {elapsed * 1000:.1f} ms", file=sys.stderr)
+    return 0
+
+
+def cli_scan(args):
+    start = time.perf_counter()
+    documents = scan_embedded(args.file)
+    elapsed = time.perf_counter() - start
+    paths = extract_embedded(args.file, documents, args.extract) if args.extract else []
+    
+    if args.json:
+        print(json.dumps([dict(document._asdict(), **({"extracted": path} if paths else {}))
+                          for document, path in itertools.zip_longest(documents, paths)], indent=2))
+    else:
+        for document in documents:
+            print(f"{document.offset:#012x}  {document.kind} {document.width}x{document.height}, "
+                  f"{document.frame_count} frames, {document.direction_count} directions, "
+                  f"{document.length:,} bytes")
+        if paths:
+            print(f"Extracted {len(paths)} documents to {args.extract}")
+    size = os.path.getsize(args.file)
+    print(f"Scanned {size / 1e6:.0f} MB in {elapsed:.2f} s ({size / 1e6 / max(elapsed, 1e-6):.0f} MB/s)",
+          file=sys.stderr)
+    return 0
+
+
+def build_cli_parser():
+    """Command line interface; without a command the editor window opens"""
+    import argparse
+    parser = argparse.ArgumentParser(description="ASF/SPR animation tool")
+    commands = parser.add_subparsers(dest="command")
+    
+    report = commands.add_parser("delta-report",
+                                 help="Compare whole-frame and delta-encoded ASF sizes and load times")
+    report.add_argument("files", nargs="+", help="ASF or SPR files")
+    report.add_argument("--interval", type=int, default=8, help="Keyframe interval (default 8)")
+    report.add_argument("--json", action="store_true", help="Print the results as JSON")
+    report.set_defaults(handler=cli_delta_report)
+    
+    compact = commands.add_parser("compact",
+                                  help="Merge identical consecutive ASF frames into longer delays")
+    compact.add_argument("files", nargs="+", help="ASF files")
+    target = compact.add_mutually_exclusive_group()
+    target.add_argument("--output-dir", help="Write compacted files here")
+    target.add_argument("--in-place", action="store_true", help="Overwrite the input files")
+    compact.add_argument("--json", action="store_true", help="Print the results as JSON")
+    compact.set_defaults(handler=cli_compact)
+    
+    index = commands.add_parser("index", help="Add ASF/SPR files under folders to the asset catalogue")
+    index.add_argument("roots", nargs="+", help="Folders (or files) to index")
+    index.add_argument("--db", help="Catalogue database (default: per-user data folder)")
+    index.add_argument("--workers", type=int, help="Threads reading files")
+    index.set_defaults(handler=cli_index)
+    
+    query = commands.add_parser("query", help="Search the asset catalogue")
+    query.add_argument("--db", help="Catalogue database (default: per-user data folder)")
+    query.add_argument("--name", help="Part of the file path")
+    query.add_argument("--kind", choices=["asf", "spr"], help="File type")
+    for option in ("min-width", "max-width", "min-height", "max-height", "min-frames", "max-frames"):
+        query.add_argument(f"--{option}", type=int)
+    query.add_argument("--directions", type=int, help="Exact direction count")
+    query.add_argument("--delay-below", type=int, help="Files with any frame delay below this (ms)")
+    query.add_argument("--frame-hash", help="Files containing a frame with this payload hash")
+    query.add_argument("--limit", type=int, default=1000, help="Maximum results (default 1000)")
+    query.add_argument("--json", action="store_true", help="Print the results as JSON")
+    query.set_defaults(handler=cli_query)
+    
+    phash = commands.add_parser("phash", help="Compute perceptual hashes for catalogued frames")
+    phash.add_argument("--db", help="Catalogue database (default: per-user data folder)")
+    phash.add_argument("--workers", type=int, help="Worker processes")
+    phash.set_defaults(handler=cli_phash)
+    
+    similar = commands.add_parser("similar", help="Find catalogued frames that look like a frame")
+    similar.add_argument("file", help="ASF or SPR file")
+    similar.add_argument("--frame", type=int, default=0, help="Frame index (default 0)")
+    similar.add_argument("--db", help="Catalogue database (default: per-user data folder)")
+    similar.add_argument("--method", choices=PHASH_METHODS, default="dhash", help="Hash (default dhash)")
+    similar.add_argument("--distance", type=int, default=8, choices=range(PHASH_MAX_DISTANCE + 1),
+                         metavar="BITS", help="Maximum Hamming distance (default 8)")
+    similar.add_argument("--limit", type=int, default=100, help="Maximum results (default 100)")
+    similar.add_argument("--json", action="store_true", help="Print the results as JSON")
+    similar.set_defaults(handler=cli_similar)
+    
+    diff = commands.add_parser("diff", help="Compare two ASF/SPR files frame by frame")
+    diff.add_argument("old", help="Old ASF or SPR file")
+    diff.add_argument("new", help="New ASF or SPR file")
+    diff.add_argument("--all", action="store_true", help="Also list unchanged frames")
+    diff.add_argument("--heatmaps", metavar="DIR", help="Write pixel diff heat maps of modified frames here")
+    diff.add_argument("--json", action="store_true", help="Print the results as JSON")
+    diff.set_defaults(handler=cli_diff)
+    
+    scan = commands.add_parser("scan", help="Find ASF/SPR documents embedded in a larger file")
+    scan.add_argument("file", help="Archive or data file")
+    scan.add_argument("--extract", metavar="DIR", help="Copy every document found into this folder")
+    scan.add_argument("--json", action="store_true", help="Print the results as JSON")
+    scan.set_defaults(handler=cli_scan)
+    return parser
+
+
+def run_cli(argv):
+    """Run a command line command headlessly and return its exit status"""
+    parser = build_cli_parser()
+    args = parser.parse_args(argv)
+    if args.command is None:
+        parser.print_help()
+        return 2
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    # Held for the whole command: image decoding and painting need an application
+    _ = QGuiApplication(sys.argv[:1])
+    try:
+        return args.handler(args)
+    except (OSError, ValueError, struct.error) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+
+
+OPEN_EXTENSIONS = (".asf", ".spr", ".tga")
+
+
+def main():
+    """Run a command line command, or open the editor with any files named on the command line"""
+    paths = sys.argv[1:]
+    if paths and not paths[0].lower().endswith(OPEN_EXTENSIONS):
+        sys.exit(run_cli(paths))
+    if len(paths) > 1:
+        print(f"Only one file can be open at a time; opening {paths[0]}", file=sys.stderr)
     app = QApplication(sys.argv)
     window = EnhancedPyAsfTool()
     window.show()
+    if paths:
+        # Load once the event loop runs, so the window paints first
+        QTimer.singleShot(0, lambda: window.open_path(paths[0]))
     sys.exit(app.exec_())
+
+
+if __name__ == '__main__':
+    main()